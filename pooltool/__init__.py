@@ -7,12 +7,19 @@ __version__ = "0.1"
 
 import pooltool.ani.utils as autils
 import pooltool.utils as utils
+from pooltool.aio import *
 from pooltool.ani.animate import *
+from pooltool.batch import *
+from pooltool.cache import *
 from pooltool.constants import *
+from pooltool.dataset import *
 from pooltool.events import *
 from pooltool.layouts import *
 from pooltool.objects.ball import *
 from pooltool.objects.cue import *
 from pooltool.objects.table import *
+from pooltool.outcomes import *
+from pooltool.parallel import *
+from pooltool.server import *
 from pooltool.system import *
 from pooltool.terminal import *
@@ -0,0 +1,5 @@
+#! /usr/bin/env python
+
+from pooltool.cli import main
+
+main()
@@ -0,0 +1,264 @@
+#! /usr/bin/env python
+"""Simulating shots from asyncio
+
+Simulations run in a thread pool (by default) or in a WorkerPool, so the event loop is
+never blocked. An AsyncSimulator bounds how many simulations run at once. Requests
+beyond that wait for a slot, lowest `priority` value first, which provides
+backpressure to the callers. Cancelling a request, or exceeding its timeout, stops the
+simulation itself rather than abandoning it:
+
+- In a thread, the simulation is halted at its next event (via the `cancel_event` of
+  System.simulate). This applies to the 'event' and 'hybrid' algorithms. Other
+  algorithms run until they finish, while still holding their slot. In particular, a
+  shot simulated with algorithm='compiled' is only stopped once its kernel returns.
+- In a WorkerPool, the simulation is interrupted (see WorkerPool.cancel).
+
+Since the event-based algorithm holds the GIL, threads only simulate in parallel with
+algorithm='compiled' (see EvolveShotCompiled). Otherwise, use a WorkerPool.
+
+Examples
+========
+>>> halt = await pt.asimulate(shot, timeout=1.0)
+>>> halts = await pt.asimulate_many(shots, algorithm='compiled')
+
+With a pool of worker processes:
+
+>>> simulator = pt.AsyncSimulator(pool=pt.WorkerPool(processes=8))
+>>> halts = await simulator.simulate_many(shots, timeout=5.0)
+"""
+
+import asyncio
+import functools
+import heapq
+import itertools
+import os
+import threading
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+
+__all__ = ["AsyncSimulator", "asimulate", "asimulate_many"]
+
+
+class AsyncSimulator(object):
+    def __init__(
+        self, max_concurrency=None, executor=None, pool=None, use_loop_executor=False
+    ):
+        """Simulates systems from an event loop, with bounded concurrency
+
+        An AsyncSimulator must only be used from one event loop.
+
+        Parameters
+        ==========
+        max_concurrency : int, None
+            How many simulations may run at once. If None, the number of workers of
+            `pool`, or otherwise the number of CPUs.
+        executor : concurrent.futures.ThreadPoolExecutor, None
+            The threads that simulate. If None (and no `pool` is given), a thread pool
+            with `max_concurrency` threads is created, which `shutdown` shuts down.
+        pool : pooltool.parallel.WorkerPool, None
+            If given, systems are simulated in the workers of this pool instead of in
+            threads. See WorkerPool.simulate.
+        use_loop_executor : bool, False
+            If True (and neither `executor` nor `pool` is given), systems are simulated
+            in the default executor of the event loop, which is shut down along with
+            the loop, e.g. by asyncio.run. The simulators of asimulate do this.
+        """
+        if sum([executor is not None, pool is not None, use_loop_executor]) > 1:
+            raise ValueError(
+                "AsyncSimulator :: Pass at most one of `executor`, `pool` and "
+                "`use_loop_executor`"
+            )
+
+        if max_concurrency is None:
+            max_concurrency = pool.processes if pool is not None else os.cpu_count()
+
+        self.max_concurrency = max_concurrency or 1
+        self.pool = pool
+        self.executor = executor
+        self.owns_executor = pool is None and executor is None and not use_loop_executor
+        if self.owns_executor:
+            self.executor = ThreadPoolExecutor(max_workers=self.max_concurrency)
+
+        self._active = 0
+        self._waiters = []
+        self._counter = itertools.count()
+
+    async def _acquire(self, priority):
+        """Wait for a free slot. Waiters with the lowest priority value go first"""
+        if self._active < self.max_concurrency and not self._waiters:
+            self._active += 1
+            return
+
+        waiter = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._counter), waiter))
+
+        try:
+            await waiter
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                # The slot was handed over just before the cancellation
+                self._release()
+            raise
+
+    def _release(self):
+        """Hand the slot over to the next waiter, or free it"""
+        while self._waiters:
+            _, _, waiter = heapq.heappop(self._waiters)
+            if not waiter.done():
+                waiter.set_result(None)
+                return
+
+        self._active -= 1
+
+    async def simulate(self, shot, timeout=None, priority=0, **kwargs):
+        """Simulate a system
+
+        Parameters
+        ==========
+        shot : pooltool.system.System
+            The system. Like System.simulate, it is simulated in place. If the request
+            is cancelled or times out, its history is left as it was when the
+            simulation stopped (in a WorkerPool, the system is left unchanged).
+        timeout : float, None
+            If the simulation has not finished after this many seconds (not counting the
+            time spent waiting for a slot), it is stopped and asyncio.TimeoutError is
+            raised
+        priority : float, 0
+            Requests waiting for a slot are served lowest priority value first
+        kwargs : **kwargs
+            Passed to System.simulate. The simulation is always quiet.
+
+        Returns
+        =======
+        output : SimulationHalt or None
+            See System.simulate
+        """
+        await self._acquire(priority)
+
+        try:
+            if self.pool is not None:
+                future, stop = self._submit_to_pool(shot, **kwargs)
+            else:
+                future, stop = self._submit_to_executor(shot, **kwargs)
+        except BaseException:
+            self._release()
+            raise
+
+        def done(future):
+            if not future.cancelled():
+                # Retrieve the exception of abandoned simulations, so it is not logged
+                future.exception()
+            self._release()
+
+        # The slot is held until the simulation has actually stopped
+        future.add_done_callback(done)
+
+        try:
+            result = await asyncio.wait_for(asyncio.shield(future), timeout)
+        except (asyncio.CancelledError, asyncio.TimeoutError):
+            stop()
+            raise
+
+        if self.pool is not None:
+            from pooltool.parallel import load_simulated_shot
+
+            return load_simulated_shot(shot, result)
+
+        return result
+
+    def _submit_to_executor(self, shot, **kwargs):
+        cancel_event = threading.Event()
+
+        func = functools.partial(
+            shot.simulate, quiet=True, cancel_event=cancel_event, **kwargs
+        )
+        future = asyncio.get_running_loop().run_in_executor(self.executor, func)
+
+        return future, cancel_event.set
+
+    def _submit_to_pool(self, shot, **kwargs):
+        from pooltool.parallel import simulate_shot
+
+        remote = self.pool.submit(simulate_shot, shot.as_dict(), **kwargs)
+        future = asyncio.wrap_future(remote)
+
+        return future, functools.partial(self.pool.cancel, remote)
+
+    async def simulate_many(
+        self, shots, timeout=None, priority=0, return_exceptions=False, **kwargs
+    ):
+        """Simulate many systems concurrently
+
+        Parameters
+        ==========
+        shots : iterable of pooltool.system.System
+            The systems
+        return_exceptions : bool, False
+            If True, exceptions (including timeouts) are returned in place of the
+            results of the failed simulations. Otherwise, the first exception is raised,
+            and the remaining simulations are cancelled.
+        timeout, priority, kwargs
+            See `simulate`. The timeout applies to each simulation separately.
+
+        Returns
+        =======
+        output : list
+            The result of each simulation, in order. See `simulate`
+        """
+        tasks = [
+            asyncio.ensure_future(
+                self.simulate(shot, timeout=timeout, priority=priority, **kwargs)
+            )
+            for shot in shots
+        ]
+
+        try:
+            return await asyncio.gather(*tasks, return_exceptions=return_exceptions)
+        except BaseException:
+            for task in tasks:
+                task.cancel()
+            raise
+
+    def shutdown(self, wait=True):
+        """Shut down the thread pool, if it was created by this simulator"""
+        if self.owns_executor:
+            self.executor.shutdown(wait=wait)
+
+
+# The simulators used by asimulate and asimulate_many, one per event loop
+_simulators = weakref.WeakKeyDictionary()
+
+
+def get_default_simulator():
+    """Returns the AsyncSimulator of the running event loop, creating it if needed
+
+    It simulates in the default executor of the loop, so it leaves no threads behind
+    once the loop is closed by asyncio.run.
+    """
+    loop = asyncio.get_running_loop()
+
+    if loop not in _simulators:
+        _simulators[loop] = AsyncSimulator(use_loop_executor=True)
+
+    return _simulators[loop]
+
+
+async def asimulate(shot, timeout=None, priority=0, **kwargs):
+    """Simulate a system without blocking the event loop
+
+    The simulation runs in the thread pool of the event loop's default AsyncSimulator.
+    See AsyncSimulator.simulate
+    """
+    return await get_default_simulator().simulate(
+        shot, timeout=timeout, priority=priority, **kwargs
+    )
+
+
+async def asimulate_many(shots, timeout=None, priority=0, **kwargs):
+    """Simulate many systems concurrently without blocking the event loop
+
+    See AsyncSimulator.simulate_many
+    """
+    return await get_default_simulator().simulate_many(
+        shots, timeout=timeout, priority=priority, **kwargs
+    )
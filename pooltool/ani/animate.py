@@ -126,7 +126,7 @@ class Interface(ShowBase):
             self.help_node.hide()
 
     def close_scene(self):
-        for shot in Global.shots:
+        for shot in Global.shots.get_loaded_systems():
             shot.table.remove_nodes()
             for ball in shot.balls.values():
                 ball.teardown()
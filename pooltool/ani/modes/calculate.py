@@ -11,8 +11,12 @@ from pooltool.ani.globals import Global
 from pooltool.ani.menu import GenericMenu
 from pooltool.ani.modes.datatypes import BaseMode, Mode
 from pooltool.ani.mouse import mouse
+from pooltool.cache import ShotCache
 from pooltool.error import SimulateError
 
+# Replaying a shot (e.g. after undo) restores it from here rather than resimulating
+shot_cache = ShotCache(max_size=32)
+
 
 class CalculateMode(BaseMode):
     name = Mode.calculate
@@ -81,7 +85,10 @@ class CalculateMode(BaseMode):
 
         try:
             Global.shots.active.simulate(
-                continuize=False, quiet=False, raise_simulate_error=True
+                continuize=False,
+                quiet=False,
+                raise_simulate_error=True,
+                cache=shot_cache,
             )
         except SimulateError:
             # Failed to simulate shot. Return to aim mode. Not ideal but better than a
@@ -0,0 +1,117 @@
+#! /usr/bin/env python
+"""Array-driven playback of ball trajectories
+
+Rather than building one Lerp interval per continuized sample of each ball, a single
+BallPlayback interval holds the sampled positions and orientations of every ball as
+arrays. Each frame, the state of each ball is found by a binary search of its sample
+times and an interpolation between the two samples that surround the frame time, and is
+set directly on the ball's nodes. Building the animation of a shot is therefore a matter
+of stacking arrays.
+"""
+
+import numpy as np
+from direct.interval.Interval import Interval
+
+import pooltool.ani as ani
+import pooltool.ani.utils as autils
+
+
+def interpolate_state(t, times, xyzs, quats):
+    """Returns the interpolated state of a trajectory at time t
+
+    Parameters
+    ==========
+    t : float
+        The time. Times outside of the trajectory are clamped to its first or last
+        sample.
+    times : np.array
+        The (T,) sample times, in increasing order
+    xyzs : np.array
+        The (T, 3) sampled positions
+    quats : np.array
+        The (T, 4) sampled unit quaternions, as (r, i, j, k)
+
+    Returns
+    =======
+    output : (int, np.array, np.array)
+        The index of the sample at or before t, the position, and the unit quaternion.
+        Quaternions are interpolated linearly along the shortest arc, then normalized.
+    """
+    if len(times) == 1:
+        return 0, xyzs[0], quats[0]
+
+    i = int(np.searchsorted(times, t, side="right")) - 1
+    i = min(max(i, 0), len(times) - 2)
+
+    dt = times[i + 1] - times[i]
+    alpha = min(max((t - times[i]) / dt, 0), 1) if dt > 0 else 1
+
+    xyz = xyzs[i] + alpha * (xyzs[i + 1] - xyzs[i])
+
+    q0, q1 = quats[i], quats[i + 1]
+    if np.dot(q0, q1) < 0:
+        q1 = -q1
+    quat = q0 + alpha * (q1 - q0)
+    quat = quat / np.linalg.norm(quat)
+
+    return (i + 1 if alpha == 1 else i), xyz, quat
+
+
+class BallPlayback(Interval):
+    playback_num = 1
+
+    def __init__(self, balls, playback_speed=1):
+        """An interval that plays back the continuized histories of balls
+
+        Parameters
+        ==========
+        balls : iterable of pooltool.objects.ball.Ball
+            Rendered balls with continuized histories (see System.continuize). The
+            orientations of their samples are stored as `ball.quats`.
+        playback_speed : float, 1
+            The simulated time played back per second of the interval
+        """
+        self.playback_speed = playback_speed
+        self.angular_vectors = ani.settings["graphics"]["angular_vectors"]
+
+        self.trajectories = []
+        duration = 0
+        for ball in balls:
+            t = np.asarray(ball.history_cts.t, dtype=np.float64)
+            xyzs = ball.history_cts.rvw[:, 0, :]
+            ws = ball.history_cts.rvw[:, 2, :]
+
+            ball.quats = autils.as_quaternion(ws, t)
+
+            # System.continuize labels each sample with the time it was evolved from,
+            # so sample i is reached at t[i+1]. The final sample is reached at t[-1]
+            times = np.append(t[1:], t[-1])
+
+            if (xyzs == xyzs[0, :]).all() and (ws == ws[0, :]).all():
+                # Ball has no motion. There is nothing to play back
+                continue
+
+            quats = np.array([tuple(quat) for quat in ball.quats])
+            self.trajectories.append([ball, t[0], times, xyzs, ws, quats, None])
+            duration = max(duration, (t[-1] - t[0]) / playback_speed)
+
+        name = f"BallPlayback-{BallPlayback.playback_num}"
+        BallPlayback.playback_num += 1
+        Interval.__init__(self, name, duration)
+
+    def privStep(self, t):
+        for trajectory in self.trajectories:
+            ball, t_0, times, xyzs, ws, quats, last_index = trajectory
+
+            i, (x, y, z), quat = interpolate_state(
+                t_0 + t * self.playback_speed, times, xyzs, quats
+            )
+
+            ball.nodes["pos"].setPosQuat((x, y, z), autils.get_quat_from_vector(quat))
+            ball.nodes["shadow"].setPos(x, y, min(0, z - ball.R))
+
+            if self.angular_vectors and i != last_index:
+                ball.get_angular_vector(t, ws[i])
+            trajectory[-1] = i
+
+        Interval.privStep(self, t)
@@ -0,0 +1,277 @@
+#! /usr/bin/env python
+"""Simulating files of shot specifications
+
+Shot specifications (see pooltool.specs) are streamed from a JSON lines file, simulated
+in a WorkerPool, and their results are written to JSON lines shards in an output
+directory as they come in. Each shard holds up to `shard_size` results, one per line,
+in the format of pooltool.specs.simulate_specs.
+
+A run can be resumed: shots whose ids are already in the output directory are skipped.
+A shot without an "id" is identified by its line number in the input file. If a run is
+killed while writing, the partially written last line of its shard is removed when the
+run is resumed.
+
+Examples
+========
+$ pooltool simulate --input shots.jsonl --output results/ --workers 8
+
+Or from Python:
+
+>>> report = pt.simulate_file('shots.jsonl', 'results/', workers=8, t_final=10)
+"""
+
+import collections
+import json
+import os
+import time
+from pathlib import Path
+
+import pooltool.terminal as terminal
+from pooltool.specs import describe_error, load_tables, simulate_specs
+
+__all__ = ["simulate_file"]
+
+shard_prefix = "shard-"
+shard_suffix = ".jsonl"
+
+
+def iter_specs(path):
+    """Yield the shot specifications of a JSON lines file
+
+    Blank lines are skipped. A specification without an "id" is given its line number
+    (starting at 0) as id.
+    """
+    with open(path) as f:
+        for i, line in enumerate(f):
+            if not line.strip():
+                continue
+
+            spec = json.loads(line)
+            if spec.get("id") is None:
+                spec["id"] = i
+
+            yield spec
+
+
+def get_shard_paths(directory):
+    """Returns the shards in a directory, in order"""
+    return sorted(Path(directory).glob(f"{shard_prefix}*{shard_suffix}"))
+
+
+def repair_shard(path):
+    """Remove a partially written last line from a shard"""
+    with open(path, "rb+") as f:
+        data = f.read()
+        if data and not data.endswith(b"\n"):
+            f.truncate(data.rfind(b"\n") + 1)
+
+
+def read_completed_ids(directory):
+    """Returns the ids of the results in the shards of a directory
+
+    Shards are repaired first (see repair_shard).
+    """
+    ids = set()
+    for path in get_shard_paths(directory):
+        repair_shard(path)
+        with open(path) as f:
+            for line in f:
+                ids.add(json.loads(line)["id"])
+
+    return ids
+
+
+class ShardWriter(object):
+    def __init__(self, directory, shard_size=10000):
+        """Appends results to numbered shards, starting after the existing shards
+
+        Parameters
+        ==========
+        directory : str or pathlib.Path
+            The output directory. It is created if needed.
+        shard_size : int, 10000
+            The number of results per shard
+        """
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.shard_size = shard_size
+
+        existing = get_shard_paths(self.directory)
+        self.index = (
+            int(existing[-1].name[len(shard_prefix) : -len(shard_suffix)]) + 1
+            if existing
+            else 0
+        )
+
+        self.file = None
+        self.num_in_shard = 0
+
+    def get_path(self, index):
+        return self.directory / f"{shard_prefix}{index:06d}{shard_suffix}"
+
+    def write(self, results):
+        """Write results, and flush them to disk"""
+        for result in results:
+            if self.file is None or self.num_in_shard == self.shard_size:
+                self.close()
+                self.file = open(self.get_path(self.index), "w")
+                self.index += 1
+
+            self.file.write(json.dumps(result, separators=(",", ":")) + "\n")
+            self.num_in_shard += 1
+
+        if self.file is not None:
+            self.file.flush()
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+            self.num_in_shard = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+def iter_chunks(specs, chunk_size):
+    chunk = []
+    for spec in specs:
+        chunk.append(spec)
+        if len(chunk) == chunk_size:
+            yield chunk
+            chunk = []
+
+    if chunk:
+        yield chunk
+
+
+def simulate_file(
+    input_path,
+    output_dir,
+    workers=None,
+    chunk_size=8,
+    shard_size=10000,
+    trajectories=False,
+    tables=("7_foot",),
+    max_tasks=None,
+    warmup=True,
+    report_interval=5,
+    progress=terminal.Progress(),
+    run=terminal.Run(),
+    quiet=False,
+    **kwargs,
+):
+    """Simulate a JSON lines file of shot specifications
+
+    Parameters
+    ==========
+    input_path : str or pathlib.Path
+        The shot specifications, one per line
+    output_dir : str or pathlib.Path
+        The directory of the result shards. Shots whose results it holds are skipped.
+    workers : int, None
+        The number of worker processes. If None, the number of CPUs is used.
+    chunk_size : int, 8
+        The number of shots sent to a worker at once
+    shard_size : int, 10000
+        The number of results per shard
+    trajectories : bool, False
+        If True, the history of each ball is written with each result
+    tables : iterable of str, ("7_foot",)
+        The preset tables to build before starting the workers (see WorkerPool)
+    max_tasks, warmup
+        See WorkerPool
+    report_interval : float, 5
+        The throughput is reported every this many seconds
+    kwargs : **kwargs
+        Passed to System.simulate
+
+    Returns
+    =======
+    report : dict
+        The number of shots simulated (`shots`), skipped because they were already
+        simulated (`skipped`), and failed (`errors`), the wall time (`time`) and the
+        throughput (`shots_per_s`)
+    """
+    from pooltool.parallel import WorkerPool
+
+    completed = read_completed_ids(output_dir) if os.path.isdir(output_dir) else set()
+
+    def iter_remaining():
+        for spec in iter_specs(input_path):
+            if spec["id"] in completed:
+                report["skipped"] += 1
+            else:
+                yield spec
+
+    report = dict(shots=0, skipped=0, errors=0)
+    pool = WorkerPool(
+        processes=workers,
+        max_tasks=max_tasks,
+        warmup=warmup,
+        initializer=load_tables,
+        initargs=(list(tables),),
+    )
+    max_pending = 4 * pool.processes
+
+    # Results are written in input order, as soon as they, and those before them, are in
+    pending = collections.deque()
+
+    def write_next(writer):
+        chunk, future = pending.popleft()
+        try:
+            results = future.result()
+        except Exception as e:
+            # The worker died. Every shot of the chunk is reported as failed
+            results = [dict(id=spec["id"], error=describe_error(e)) for spec in chunk]
+
+        writer.write(results)
+        report["shots"] += len(results)
+        report["errors"] += sum("error" in result for result in results)
+
+    try:
+        # The throughput is measured once the workers are warmed up
+        pool.wait_until_ready()
+
+        if not quiet:
+            progress.new("Simulating")
+
+        start = last_report = time.perf_counter()
+        with ShardWriter(output_dir, shard_size=shard_size) as writer:
+            for chunk in iter_chunks(iter_remaining(), chunk_size):
+                pending.append(
+                    (chunk, pool.submit(simulate_specs, chunk, trajectories, **kwargs))
+                )
+
+                while pending and (len(pending) >= max_pending or pending[0][1].done()):
+                    write_next(writer)
+
+                if not quiet and time.perf_counter() - last_report > report_interval:
+                    last_report = time.perf_counter()
+                    rate = report["shots"] / (last_report - start)
+                    progress.update(
+                        f"{report['shots']} shots | {rate:.1f} shots/s | "
+                        f"{report['errors']} errors | {report['skipped']} skipped"
+                    )
+
+            while pending:
+                write_next(writer)
+    finally:
+        pool.terminate()
+        if progress.pid is not None:
+            progress.end()
+
+    report["time"] = time.perf_counter() - start
+    report["shots_per_s"] = report["shots"] / report["time"]
+
+    if not quiet:
+        run.info("Shots", report["shots"])
+        run.info("Skipped (already simulated)", report["skipped"])
+        run.info("Failed shots", report["errors"])
+        run.info("Time", f"{report['time']:.3f}s")
+        run.info("Shots per second", f"{report['shots_per_s']:.1f}")
+
+    return report
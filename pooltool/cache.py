@@ -0,0 +1,315 @@
+#! /usr/bin/env python
+"""Memoization of simulated shots
+
+Simulating a shot is deterministic, so a system that has the same balls, table, cue
+and simulation parameters as a previously simulated system leads to the same events
+and histories. A ShotCache stores the simulation results keyed by a canonical hash of
+these inputs, so that repeated shots (e.g. GUI undo/redo, or parameter sweeps that
+revisit the same cue strikes) are restored rather than re-simulated.
+
+Examples
+========
+>>> cache = pt.ShotCache(max_size=256, path='~/.pooltool/shot_cache')
+>>> shot.simulate(cache=cache)
+"""
+
+import hashlib
+import json
+import os
+import pickle
+import tempfile
+from collections import OrderedDict
+from pathlib import Path
+
+import numpy as np
+
+from pooltool.error import ConfigError
+
+__all__ = ["ShotCache", "get_history_checksum", "get_shot_key"]
+
+# Floats are rounded to this many decimals before hashing, so that states differing
+# only by floating point noise share a key
+KEY_DECIMALS = 12
+
+# Simulation results are compared to this many decimals (see get_history_checksum). This
+# tolerates differences in the last bits of floats between machines
+CHECKSUM_DECIMALS = 9
+
+
+def _canonical(x, decimals=KEY_DECIMALS):
+    """Convert x to a JSON-serializable form with quantized floats"""
+    if isinstance(x, dict):
+        return {str(k): _canonical(v, decimals) for k, v in x.items()}
+    if isinstance(x, (list, tuple)):
+        return [_canonical(v, decimals) for v in x]
+    if isinstance(x, np.ndarray):
+        return _canonical(x.tolist(), decimals)
+    if isinstance(x, (bool, np.bool_)):
+        return bool(x)
+    if isinstance(x, (int, np.integer)):
+        return int(x)
+    if isinstance(x, (float, np.floating)):
+        # Adding 0.0 maps -0.0 to 0.0
+        return round(float(x), decimals) + 0.0
+    if x is None or isinstance(x, str):
+        return x
+    return repr(x)
+
+
+def get_shot_key(shot, decimals=KEY_DECIMALS, **kwargs):
+    """Return a hash that uniquely identifies the simulation of a system
+
+    Parameters
+    ==========
+    shot : pooltool.system.System
+        The system, prior to being simulated
+    decimals : int, KEY_DECIMALS
+        Floats are rounded to this many decimals before being hashed
+    **kwargs
+        The keyword arguments that the simulation will be called with. Those that affect
+        the simulation outcome should be passed here.
+
+    Returns
+    =======
+    output : str
+        A hexadecimal sha256 digest
+    """
+    from pooltool import __version__
+
+    balls = [
+        dict(
+            id=ball.id,
+            rvw=ball.rvw,
+            s=ball.s,
+            t=ball.t,
+            m=ball.m,
+            R=ball.R,
+            g=ball.g,
+            u_s=ball.u_s,
+            u_r=ball.u_r,
+            u_sp=ball.u_sp,
+            e_c=ball.e_c,
+            f_c=ball.f_c,
+        )
+        for ball in sorted(shot.balls.values(), key=lambda ball: str(ball.id))
+    ]
+
+    spec = dict(
+        version=__version__,
+        evolver=shot.__class__.__name__,
+        include=getattr(shot, "include", None),
+        balls=balls,
+        table=shot.table.as_dict(),
+        cue=shot.cue.as_dict() if shot.cue is not None else None,
+        kwargs=kwargs,
+    )
+
+    blob = json.dumps(_canonical(spec, decimals), sort_keys=True)
+    return hashlib.sha256(blob.encode()).hexdigest()
+
+
+def get_history_checksum(shot, decimals=CHECKSUM_DECIMALS):
+    """Return a hash of the simulation results of a system
+
+    The events (their types, times and agents) and the history of every ball are
+    hashed, so that two simulations of the same system can be checked to agree.
+
+    Parameters
+    ==========
+    shot : pooltool.system.System
+        The simulated system
+    decimals : int, CHECKSUM_DECIMALS
+        Floats are rounded to this many decimals before being hashed
+
+    Returns
+    =======
+    output : str
+        A hexadecimal sha256 digest
+    """
+    spec = dict(
+        events=[
+            (event.event_type, event.time, [agent.id for agent in event.agents])
+            for event in shot.events
+        ],
+        balls={
+            str(ball.id): dict(
+                rvw=np.asarray(ball.history.rvw),
+                s=np.asarray(ball.history.s),
+                t=np.asarray(ball.history.t),
+            )
+            for ball in shot.balls.values()
+        },
+    )
+
+    blob = json.dumps(_canonical(spec, decimals), sort_keys=True)
+    return hashlib.sha256(blob.encode()).hexdigest()
+
+
+class ShotCache(object):
+    """An LRU cache of simulation results, with an optional on-disk tier
+
+    Parameters
+    ==========
+    max_size : int, 128
+        The maximum number of simulations held in memory. When exceeded, the least
+        recently used simulation is dropped from memory (but not from disk).
+    path : str, pathlib.Path, None
+        If not None, simulations are also stored as pickle files in this directory, so
+        they persist between sessions and can be shared between processes.
+    max_disk_bytes : int, 500_000_000
+        When the total size of the on-disk tier exceeds this, the least recently used
+        files are deleted until it no longer does.
+
+    Notes
+    =====
+    - Entries are the dictionaries returned by `SystemHistory.results_as_dict`. They
+      are restored with `SystemHistory.load_results_from_dict`.
+    - The hit and miss counts are stored in `hits` and `misses`.
+    """
+
+    def __init__(self, max_size=128, path=None, max_disk_bytes=500_000_000):
+        if max_size < 0:
+            raise ConfigError("ShotCache :: max_size must be non-negative")
+
+        self.max_size = max_size
+        self.max_disk_bytes = max_disk_bytes
+        self.path = None if path is None else Path(path).expanduser()
+
+        if self.path is not None:
+            self.path.mkdir(parents=True, exist_ok=True)
+
+        self.memory = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def key(self, shot, **kwargs):
+        """See get_shot_key"""
+        return get_shot_key(shot, **kwargs)
+
+    def get(self, key):
+        """Return the entry stored under key, or None if there is none
+
+        Updates `hits` and `misses`.
+        """
+        if key in self.memory:
+            self.memory.move_to_end(key)
+            self.hits += 1
+            return self.memory[key]
+
+        entry = self._disk_get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+
+        self._memory_put(key, entry)
+        self.hits += 1
+        return entry
+
+    def put(self, key, entry):
+        """Store entry under key"""
+        self._memory_put(key, entry)
+        self._disk_put(key, entry)
+
+    def clear(self, disk=False):
+        """Empty the cache and reset the hit and miss counts
+
+        Parameters
+        ==========
+        disk : bool, False
+            If True, the on-disk tier is also deleted
+        """
+        self.memory.clear()
+        self.hits = 0
+        self.misses = 0
+
+        if disk and self.path is not None:
+            for file in self.path.glob("*.pkl"):
+                file.unlink(missing_ok=True)
+
+    @property
+    def hit_rate(self):
+        total = self.hits + self.misses
+        return self.hits / total if total else 0
+
+    def __contains__(self, key):
+        return key in self.memory or (
+            self.path is not None and self._disk_file(key).exists()
+        )
+
+    def __len__(self):
+        return len(self.memory)
+
+    def __repr__(self):
+        lines = [
+            f"<{self.__class__.__name__} object at {hex(id(self))}>",
+            f" ├── size     : {len(self)}/{self.max_size}",
+            f" ├── path     : {self.path}",
+            f" ├── hits     : {self.hits}",
+            f" └── misses   : {self.misses}",
+        ]
+
+        return "\n".join(lines) + "\n"
+
+    def _memory_put(self, key, entry):
+        if self.max_size == 0:
+            return
+
+        self.memory[key] = entry
+        self.memory.move_to_end(key)
+        while len(self.memory) > self.max_size:
+            self.memory.popitem(last=False)
+
+    def _disk_file(self, key):
+        return self.path / f"{key}.pkl"
+
+    def _disk_get(self, key):
+        if self.path is None:
+            return None
+
+        file = self._disk_file(key)
+        try:
+            with open(file, "rb") as f:
+                entry = pickle.load(f)
+        except (FileNotFoundError, EOFError, pickle.UnpicklingError):
+            return None
+
+        # Mark as recently used for eviction purposes
+        try:
+            os.utime(file)
+        except FileNotFoundError:
+            pass
+
+        return entry
+
+    def _disk_put(self, key, entry):
+        if self.path is None:
+            return
+
+        # Write to a temporary file and move it into place, so that concurrent readers
+        # never see a partially written entry
+        fd, tmp = tempfile.mkstemp(dir=self.path, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                pickle.dump(entry, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp, self._disk_file(key))
+        except BaseException:
+            Path(tmp).unlink(missing_ok=True)
+            raise
+
+        self._evict_disk()
+
+    def _evict_disk(self):
+        files = []
+        for file in self.path.glob("*.pkl"):
+            try:
+                stat = file.stat()
+            except FileNotFoundError:
+                continue
+            files.append((stat.st_mtime, stat.st_size, file))
+
+        total = sum(size for _, size, _ in files)
+        for _, size, file in sorted(files, key=lambda x: x[0]):
+            if total <= self.max_disk_bytes:
+                break
+            file.unlink(missing_ok=True)
+            total -= size
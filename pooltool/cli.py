@@ -0,0 +1,270 @@
+#! /usr/bin/env python
+"""The `pooltool` command line interface
+
+Examples
+========
+$ pooltool warmup
+$ python -m pooltool warmup --cold-start
+$ pooltool serve --address unix:/tmp/pooltool.sock
+$ pooltool loadgen --address unix:/tmp/pooltool.sock --concurrency 8
+$ pooltool simulate --input shots.jsonl --output results/ --workers 8
+"""
+
+import argparse
+
+
+def warmup(args):
+    from pooltool.terminal import Run
+    from pooltool.warmup import measure_cold_start, print_report, warmup
+
+    run = Run()
+    print_report(warmup(), run=run)
+
+    if args.cold_start:
+        run.info("Cold start", f"{measure_cold_start():.3f}s")
+
+
+def serve(args):
+    from pooltool.server import serve
+
+    serve(
+        args.address,
+        workers=args.workers,
+        tables=args.tables,
+        chunk_size=args.chunk_size,
+        max_frame_size=args.max_frame_size * 2**20,
+        max_tasks=args.max_tasks,
+        max_memory=None if args.max_memory is None else args.max_memory * 2**20,
+        warmup=not args.no_warmup,
+    )
+
+
+def loadgen(args):
+    from pooltool.server import load_test
+    from pooltool.terminal import Run
+
+    options = {} if args.algorithm is None else dict(algorithm=args.algorithm)
+    report = load_test(
+        args.address,
+        num_requests=args.requests,
+        batch_size=args.batch_size,
+        concurrency=args.concurrency,
+        codec=args.codec,
+        trajectories=args.trajectories,
+        **options,
+    )
+
+    run = Run()
+    run.info("Requests", report["requests"])
+    run.info("Shots", report["shots"])
+    run.info("Failed shots", report["errors"])
+    run.info("Time", f"{report['time']:.3f}s")
+    run.info("Requests per second", f"{report['requests_per_s']:.1f}")
+    run.info("Shots per second", f"{report['shots_per_s']:.1f}")
+    for p in (50, 95, 99):
+        run.info(f"Latency p{p}", f"{report[f'latency_p{p}'] * 1000:.1f}ms")
+
+
+def simulate(args):
+    from pooltool.batch import simulate_file
+
+    options = dict(
+        algorithm=args.algorithm,
+        t_final=args.t_final,
+        max_events=args.max_events,
+        max_wall_time=args.max_wall_time,
+    )
+
+    simulate_file(
+        args.input,
+        args.output,
+        workers=args.workers,
+        chunk_size=args.chunk_size,
+        shard_size=args.shard_size,
+        trajectories=args.trajectories,
+        tables=args.tables,
+        max_tasks=args.max_tasks,
+        warmup=not args.no_warmup,
+        **{k: v for k, v in options.items() if v is not None},
+    )
+
+
+def get_parser():
+    ap = argparse.ArgumentParser(prog="pooltool")
+    subparsers = ap.add_subparsers(dest="command", required=True)
+
+    warmup_parser = subparsers.add_parser(
+        "warmup",
+        help="Compile every just-in-time compiled function into the numba cache",
+        description=(
+            "Compile every just-in-time compiled function for the argument types used "
+            "in simulations, and report the compile time of each. The compiled "
+            "functions are cached in the directory given by the NUMBA_CACHE_DIR "
+            "environment variable (next to the pooltool sources if unset), so that "
+            "later processes started with the same NUMBA_CACHE_DIR load them rather "
+            "than compile them."
+        ),
+    )
+    warmup_parser.add_argument(
+        "--cold-start",
+        action="store_true",
+        help="Afterwards, time the first simulation of a new process",
+    )
+    warmup_parser.set_defaults(func=warmup)
+
+    address_help = "'host:port' or 'unix:/path/to/socket'"
+
+    serve_parser = subparsers.add_parser(
+        "serve",
+        help="Serve simulation requests on a local socket",
+        description=(
+            "Simulate batches of shot specifications sent over a TCP or Unix socket, "
+            "in pre-warmed worker processes. See pooltool.server for the protocol."
+        ),
+    )
+    serve_parser.add_argument(
+        "--address", default="127.0.0.1:8750", help=f"{address_help} to listen on"
+    )
+    serve_parser.add_argument(
+        "--workers", type=int, help="The number of worker processes (default: CPUs)"
+    )
+    serve_parser.add_argument(
+        "--tables",
+        nargs="+",
+        default=["7_foot"],
+        help="The preset tables to build before starting the workers",
+    )
+    serve_parser.add_argument(
+        "--chunk-size",
+        type=int,
+        default=8,
+        help="Batches are split into chunks of this many shots per worker",
+    )
+    serve_parser.add_argument(
+        "--max-frame-size",
+        type=int,
+        default=64,
+        help="Reject requests larger than this many MiB",
+    )
+    serve_parser.add_argument(
+        "--max-tasks", type=int, help="Replace each worker after this many chunks"
+    )
+    serve_parser.add_argument(
+        "--max-memory",
+        type=int,
+        help="Replace a worker once its resident memory exceeds this many MiB",
+    )
+    serve_parser.add_argument(
+        "--no-warmup",
+        action="store_true",
+        help="Do not compile the simulation code before starting the workers",
+    )
+    serve_parser.set_defaults(func=serve)
+
+    loadgen_parser = subparsers.add_parser(
+        "loadgen",
+        help="Benchmark a simulation server",
+        description=(
+            "Send batches of nine-ball breaks to a simulation server from several "
+            "connections, and report the throughput and latency."
+        ),
+    )
+    loadgen_parser.add_argument(
+        "--address", default="127.0.0.1:8750", help=f"{address_help} of the server"
+    )
+    loadgen_parser.add_argument(
+        "--requests", type=int, default=100, help="The number of requests"
+    )
+    loadgen_parser.add_argument(
+        "--batch-size", type=int, default=16, help="The number of shots per request"
+    )
+    loadgen_parser.add_argument(
+        "--concurrency", type=int, default=4, help="The number of connections"
+    )
+    loadgen_parser.add_argument(
+        "--codec", choices=["json", "msgpack"], default="json", help="The codec"
+    )
+    loadgen_parser.add_argument(
+        "--trajectories",
+        action="store_true",
+        help="Request the trajectories of the balls",
+    )
+    loadgen_parser.add_argument(
+        "--algorithm", help="The simulation algorithm (default: that of the server)"
+    )
+    loadgen_parser.set_defaults(func=loadgen)
+
+    simulate_parser = subparsers.add_parser(
+        "simulate",
+        help="Simulate a file of shot specifications",
+        description=(
+            "Simulate the shot specifications of a JSON lines file in parallel, and "
+            "write the results to JSON lines shards in the output directory as they "
+            "come in. Shots whose results are already in the output directory are "
+            "skipped, so an interrupted run is resumed by running it again. See "
+            "pooltool.specs for the format of shot specifications and results."
+        ),
+    )
+    simulate_parser.add_argument(
+        "--input", required=True, help="The JSON lines file of shot specifications"
+    )
+    simulate_parser.add_argument(
+        "--output", required=True, help="The directory of the result shards"
+    )
+    simulate_parser.add_argument(
+        "--workers", type=int, help="The number of worker processes (default: CPUs)"
+    )
+    simulate_parser.add_argument(
+        "--chunk-size",
+        type=int,
+        default=8,
+        help="The number of shots sent to a worker at once",
+    )
+    simulate_parser.add_argument(
+        "--shard-size", type=int, default=10000, help="The number of results per shard"
+    )
+    simulate_parser.add_argument(
+        "--trajectories",
+        action="store_true",
+        help="Write the trajectories of the balls with the results",
+    )
+    simulate_parser.add_argument(
+        "--algorithm", help="The simulation algorithm (default: event)"
+    )
+    simulate_parser.add_argument(
+        "--t-final", type=float, help="Stop each simulation at this time"
+    )
+    simulate_parser.add_argument(
+        "--max-events", type=int, help="Halt each simulation after this many events"
+    )
+    simulate_parser.add_argument(
+        "--max-wall-time",
+        type=float,
+        help="Halt each simulation after this many seconds",
+    )
+    simulate_parser.add_argument(
+        "--tables",
+        nargs="+",
+        default=["7_foot"],
+        help="The preset tables to build before starting the workers",
+    )
+    simulate_parser.add_argument(
+        "--max-tasks", type=int, help="Replace each worker after this many chunks"
+    )
+    simulate_parser.add_argument(
+        "--no-warmup",
+        action="store_true",
+        help="Do not compile the simulation code before starting the workers",
+    )
+    simulate_parser.set_defaults(func=simulate)
+
+    return ap
+
+
+def main(argv=None):
+    args = get_parser().parse_args(argv)
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
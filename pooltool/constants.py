@@ -4,9 +4,14 @@
 All units are SI unless otherwise stated.
 """
 
+import os
+
 import numpy as np
 
-numba_cache = True
+# Whether compiled functions are cached on disk. Set the environment variable
+# POOLTOOL_NUMBA_CACHE=0 to disable (e.g. for profiling). See pooltool.warmup
+numba_cache = os.environ.get("POOLTOOL_NUMBA_CACHE", "1") != "0"
+
 np.set_printoptions(precision=10, suppress=True)
 # tol = np.finfo(np.float).eps * 100
 tol = 1e-12
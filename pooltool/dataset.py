@@ -0,0 +1,506 @@
+#! /usr/bin/env python
+"""Sharded, append-only datasets of shots
+
+A ShotDataset is a directory of simulated systems (see System.as_dict) and compact
+outcomes (see pooltool.outcomes.get_outcome). Records are appended to shards of bounded
+size, and described in an index of per-shot metadata: the id, the cue parameters, a
+summary of the outcome, and where the record is stored. The features of outcomes are
+also added to a queryable OutcomeIndex (see pooltool.outcomes) as they are written.
+
+Each writer (one per process) appends to its own shards and its own index file, so
+that any number of processes can write to a dataset at once, without locking. A
+record is written and flushed before its index entry, so the index never refers to a
+missing record. A partially written last index entry, left by a killed writer, is
+ignored.
+
+Layout
+======
+- shards/<writer>-<n>.pkl: pickled records, back to back
+- index/<writer>.jsonl: one index entry per line
+- outcomes.sqlite: the OutcomeIndex
+
+Examples
+========
+>>> dataset = pt.ShotDataset('breaks/')
+>>> with dataset.writer() as writer:
+>>>     for shot in shots:
+>>>         shot.simulate()
+>>>         writer.append(shot)
+
+Then, from any process:
+
+>>> dataset = pt.ShotDataset('breaks/')
+>>> shot = dataset.get(42)          # random access, by id
+>>> for shot in dataset:            # streaming, shard by shard
+>>>     ...
+>>> for shot_id in dataset.outcomes.query(num_pocketed=2):
+>>>     shot = dataset.get(shot_id)
+"""
+
+import itertools
+import json
+import os
+import pickle
+import socket
+import uuid
+from pathlib import Path
+
+from pooltool.error import ConfigError
+from pooltool.outcomes import OutcomeIndex, get_outcome
+
+__all__ = ["ShotDataset"]
+
+kind_system = "system"
+kind_outcome = "outcome"
+
+
+def get_cue_params(cue):
+    return dict(
+        V0=float(cue.V0),
+        phi=float(cue.phi),
+        theta=float(cue.theta),
+        a=float(cue.a),
+        b=float(cue.b),
+        cueing_ball=cue.cueing_ball.id if cue.cueing_ball is not None else None,
+    )
+
+
+def summarize(outcome):
+    """Returns the summary of a compact outcome stored in the index
+
+    This is the outcome without the final ball states and trajectories.
+    """
+    return {
+        k: v for k, v in outcome.items() if k not in ("balls", "trajectories", "id")
+    }
+
+
+def read_index_file(path):
+    """Returns the entries of an index file
+
+    A partially written last line is ignored.
+    """
+    entries = []
+    with open(path) as f:
+        for line in f:
+            if not line.endswith("\n"):
+                break
+            entries.append(json.loads(line))
+
+    return entries
+
+
+class DatasetWriter(object):
+    def __init__(self, path, shard_size, outcomes=None, compress=False, recipe=False):
+        """Appends records to the shards and index file of one writer
+
+        Use ShotDataset.writer to create one.
+
+        Parameters
+        ==========
+        outcomes : pooltool.outcomes.OutcomeIndex, None
+            If given, the outcomes of appended shots are added to it
+        compress, recipe : bool, False
+            See ShotDataset
+        """
+        self.path = Path(path)
+        self.shard_size = shard_size
+        self.outcomes = outcomes
+        self.compress = compress
+        self.recipe = recipe
+
+        # Unique across processes and hosts sharing the directory
+        self.name = f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        self.shard_number = 0
+        self.shard_file = None
+        self.counter = itertools.count()
+
+        self.index_file = open(self.path / "index" / f"{self.name}.jsonl", "a")
+
+    def next_shard(self):
+        if self.shard_file is not None:
+            self.shard_file.close()
+
+        shard = f"{self.name}-{self.shard_number:06d}.pkl"
+        self.shard_number += 1
+        self.shard_file = open(self.path / "shards" / shard, "ab")
+        self.shard = shard
+
+    def write(self, record, entry):
+        data = pickle.dumps(record, protocol=pickle.HIGHEST_PROTOCOL)
+
+        if self.shard_file is None or (
+            self.shard_file.tell()
+            and self.shard_file.tell() + len(data) > self.shard_size
+        ):
+            self.next_shard()
+
+        entry.update(shard=self.shard, offset=self.shard_file.tell(), size=len(data))
+
+        self.shard_file.write(data)
+        self.shard_file.flush()
+
+        self.index_file.write(json.dumps(entry, separators=(",", ":")) + "\n")
+        self.index_file.flush()
+
+        return entry
+
+    def add_outcome(self, outcome, entry):
+        # A shot is in the OutcomeIndex only once it is stored. A writer killed in
+        # between leaves it out, see ShotDataset.build_outcome_index
+        if self.outcomes is not None and outcome is not None:
+            self.outcomes.add(outcome, entry["id"])
+
+    def get_id(self, shot_id):
+        return f"{self.name}-{next(self.counter)}" if shot_id is None else shot_id
+
+    def append(self, shot, shot_id=None, outcome=None):
+        """Append a system
+
+        Parameters
+        ==========
+        shot : pooltool.system.System
+            The system, as is. It is stored with System.as_dict, without its continuous
+            histories, which are rebuilt when needed (see System.continuize), or with
+            System.as_recipe.
+        shot_id : str or int, None
+            The id of the shot. Ids should be unique within a dataset. If None, a unique
+            id is generated.
+        outcome : dict, None
+            The compact outcome of the shot. If None and the shot was simulated, it is
+            computed with pooltool.outcomes.get_outcome.
+
+        Returns
+        =======
+        output : dict
+            The index entry
+        """
+        if outcome is None and len(shot.events):
+            outcome = get_outcome(shot)
+
+        entry = dict(
+            id=self.get_id(shot_id),
+            kind=kind_system,
+            cue=get_cue_params(shot.cue) if shot.cue is not None else None,
+            outcome=summarize(outcome) if outcome is not None else None,
+        )
+
+        if self.recipe:
+            record = shot.as_recipe()
+        else:
+            record = shot.as_dict(history_cts=False, compress=self.compress)
+
+        self.write(record, entry)
+        self.add_outcome(outcome, entry)
+
+        return entry
+
+    def append_outcome(self, outcome, shot_id=None, cue=None):
+        """Append a compact outcome
+
+        Parameters
+        ==========
+        outcome : dict
+            The outcome, e.g. a result of pooltool.specs.simulate_specs
+        shot_id : str or int, None
+            The id of the shot. If None, the id of the outcome is used, if any,
+            otherwise a unique id is generated.
+        cue : dict, None
+            The cue parameters of the shot, e.g. the "cue" of its shot specification
+
+        Returns
+        =======
+        output : dict
+            The index entry
+        """
+        if shot_id is None:
+            shot_id = outcome.get("id")
+
+        entry = dict(
+            id=self.get_id(shot_id),
+            kind=kind_outcome,
+            cue=cue,
+            outcome=summarize(outcome),
+        )
+
+        self.write(outcome, entry)
+        self.add_outcome(outcome, entry)
+
+        return entry
+
+    def extend(self, shots):
+        """Append systems, e.g. those of a SystemCollection"""
+        return [self.append(shot) for shot in shots]
+
+    def close(self):
+        if self.shard_file is not None:
+            self.shard_file.close()
+            self.shard_file = None
+
+        self.index_file.close()
+
+        if self.outcomes is not None:
+            self.outcomes.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+class ShotDataset(object):
+    def __init__(
+        self,
+        path,
+        shard_size=256 * 2**20,
+        index_outcomes=True,
+        compress=False,
+        recipe=False,
+    ):
+        """A sharded, append-only dataset of shots
+
+        Parameters
+        ==========
+        path : str or pathlib.Path
+            The directory of the dataset. It is created if needed.
+        shard_size : int, 256 MiB
+            Writers start a new shard once a shard would exceed this many bytes
+        index_outcomes : bool, True
+            If True, writers add the outcomes of the shots they append to the
+            OutcomeIndex of the dataset (see `outcomes`)
+        compress : bool, False
+            If True, writers losslessly compress the ball histories of the systems they
+            append (see System.as_dict). Datasets may mix compressed and uncompressed
+            systems.
+        recipe : bool, False
+            If True, writers only store what is needed to replay the simulations of the
+            systems they append (see System.as_recipe). The systems are re-simulated
+            when their histories are first accessed.
+        """
+        self.path = Path(path)
+        self.shard_size = shard_size
+        self.index_outcomes = index_outcomes
+        self.compress = compress
+        self.recipe = recipe
+
+        (self.path / "shards").mkdir(parents=True, exist_ok=True)
+        (self.path / "index").mkdir(exist_ok=True)
+
+        self._writer = None
+        self._writer_pid = None
+        self._entries = None
+        self._positions = None
+        self._outcomes = None
+
+    def writer(self):
+        """Returns a new writer. Each process writing to the dataset needs its own"""
+        return DatasetWriter(
+            self.path,
+            self.shard_size,
+            outcomes=self.get_outcome_index() if self.index_outcomes else None,
+            compress=self.compress,
+            recipe=self.recipe,
+        )
+
+    def get_outcome_index(self):
+        """Returns a new connection to the OutcomeIndex of the dataset"""
+        return OutcomeIndex(self.path / "outcomes.sqlite")
+
+    @property
+    def outcomes(self):
+        """The OutcomeIndex of the dataset, to find shots by their outcome
+
+        See pooltool.outcomes.OutcomeIndex.query
+        """
+        if self._outcomes is None:
+            self._outcomes = self.get_outcome_index()
+
+        return self._outcomes
+
+    def build_outcome_index(self):
+        """Add the shots missing from the OutcomeIndex to it
+
+        This indexes datasets written with `index_outcomes=False`, and shots whose
+        writer was killed before indexing them. Shots without outcomes (systems that
+        were not simulated) are skipped.
+
+        Returns
+        =======
+        output : int
+            The number of shots added
+        """
+        missing = [
+            entry
+            for entry in self.index
+            if entry["outcome"] is not None and entry["id"] not in self.outcomes
+        ]
+
+        outcomes, shot_ids = [], []
+        for entry, shot in self.iter_entries(missing):
+            outcomes.append(
+                shot if entry["kind"] == kind_outcome else get_outcome(shot)
+            )
+            shot_ids.append(entry["id"])
+
+        self.outcomes.add_many(outcomes, shot_ids)
+
+        return len(outcomes)
+
+    def append(self, shot, **kwargs):
+        """Append a system with the writer of this process. See DatasetWriter.append"""
+        return self._get_writer().append(shot, **kwargs)
+
+    def append_outcome(self, outcome, **kwargs):
+        """Append an outcome with the writer of this process
+
+        See DatasetWriter.append_outcome
+        """
+        return self._get_writer().append_outcome(outcome, **kwargs)
+
+    def _get_writer(self):
+        # A forked process must not share the writer of its parent
+        if self._writer is None or self._writer_pid != os.getpid():
+            self._writer = self.writer()
+            self._writer_pid = os.getpid()
+
+        return self._writer
+
+    def close(self):
+        """Close the writer of this process, if any, and the OutcomeIndex"""
+        if self._writer is not None and self._writer_pid == os.getpid():
+            self._writer.close()
+
+        self._writer = None
+
+        if self._outcomes is not None:
+            self._outcomes.close()
+            self._outcomes = None
+
+    def reload(self):
+        """Read the index again, to see the records appended since it was read"""
+        entries = []
+        for path in sorted((self.path / "index").glob("*.jsonl")):
+            entries.extend(read_index_file(path))
+
+        self._entries = entries
+        self._positions = {entry["id"]: i for i, entry in enumerate(entries)}
+
+    @property
+    def index(self):
+        """The index entries, read once (see reload)"""
+        if self._entries is None:
+            self.reload()
+
+        return self._entries
+
+    def _get_positions(self):
+        if self._entries is None:
+            self.reload()
+
+        return self._positions
+
+    def ids(self):
+        return [entry["id"] for entry in self.index]
+
+    def __len__(self):
+        return len(self.index)
+
+    def __contains__(self, shot_id):
+        return shot_id in self._get_positions()
+
+    def read_record(self, entry, f=None):
+        """Returns the stored record of an index entry
+
+        Parameters
+        ==========
+        f : file, None
+            The open shard of the entry. If None, the shard is opened.
+        """
+        if f is None:
+            with open(self.path / "shards" / entry["shard"], "rb") as f:
+                return self.read_record(entry, f)
+
+        f.seek(entry["offset"])
+        data = f.read(entry["size"])
+        if len(data) != entry["size"]:
+            raise ConfigError(f"ShotDataset :: Record '{entry['id']}' is truncated")
+
+        return pickle.loads(data)
+
+    def load(self, entry, f=None, as_dict=False):
+        """Returns the shot of an index entry
+
+        Parameters
+        ==========
+        as_dict : bool, False
+            If True, systems are returned as dictionaries (see System.as_dict), which
+            is faster than building a System
+
+        Returns
+        =======
+        output : pooltool.system.System or dict
+            The system, or the outcome for outcome entries
+        """
+        record = self.read_record(entry, f)
+        if entry["kind"] == kind_outcome or as_dict:
+            return record
+
+        from pooltool.system import System
+
+        return System(d=record)
+
+    def get_entry(self, shot_id):
+        """Returns the index entry of the shot with an id"""
+        positions = self._get_positions()
+        if shot_id not in positions:
+            raise KeyError(shot_id)
+
+        return self.index[positions[shot_id]]
+
+    def get(self, shot_id, as_dict=False):
+        """Returns the shot with an id. See `load`"""
+        return self.load(self.get_entry(shot_id), as_dict=as_dict)
+
+    def __getitem__(self, i):
+        return self.load(self.index[i])
+
+    def iter_entries(self, entries=None, as_dict=False):
+        """Yield (entry, shot) pairs, reading each shard once, sequentially
+
+        Parameters
+        ==========
+        entries : list of dict, None
+            The index entries to read, e.g. a selection of `index`. If None, all of
+            them. They are read in order of shard and offset.
+        as_dict : bool, False
+            See `load`
+        """
+        if entries is None:
+            entries = self.index
+
+        entries = sorted(entries, key=lambda entry: (entry["shard"], entry["offset"]))
+
+        f, shard = None, None
+        try:
+            for entry in entries:
+                if entry["shard"] != shard:
+                    if f is not None:
+                        f.close()
+                    shard = entry["shard"]
+                    f = open(self.path / "shards" / shard, "rb")
+
+                yield entry, self.load(entry, f, as_dict=as_dict)
+        finally:
+            if f is not None:
+                f.close()
+
+    def __iter__(self):
+        for _, shot in self.iter_entries():
+            yield shot
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
@@ -65,3 +65,10 @@ class SimulateError(PoolToolError):
         self.e = remove_spaces(e)
         self.error_type = "Simulate Error"
         PoolToolError.__init__(self)
+
+
+class WorkerError(PoolToolError):
+    def __init__(self, e=None):
+        self.e = remove_spaces(e)
+        self.error_type = "Worker Error"
+        PoolToolError.__init__(self)
@@ -104,7 +104,7 @@ class BallBallCollision(Collision):
         self.agent1_state_initial = (np.copy(ball1.rvw), ball1.s)
         self.agent2_state_initial = (np.copy(ball2.rvw), ball2.s)
 
-        rvw1, rvw2 = physics.resolve_ball_ball_collision(ball1.rvw, ball2.rvw)
+        rvw1, rvw2 = physics.resolve_ball_ball_collision_fast(ball1.rvw, ball2.rvw)
         s1, s2 = c.sliding, c.sliding
 
         ball1.set(rvw1, s1, t=self.time)
@@ -154,7 +154,7 @@ class BallCushionCollision(Collision):
 
         self.agent1_state_initial = (np.copy(ball.rvw), ball.s)
 
-        rvw = physics.resolve_ball_cushion_collision(
+        rvw = physics.resolve_ball_cushion_collision_fast(
             rvw=ball.rvw,
             normal=normal,
             R=ball.R,
@@ -183,7 +183,7 @@ class StickBallCollision(Collision):
 
         self.agent1_state_initial = (np.copy(ball.rvw), ball.s)
 
-        v, w = physics.cue_strike(
+        v, w = physics.cue_strike_fast(
             ball.m,
             cue_stick.M,
             ball.R,
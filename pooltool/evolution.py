@@ -1,30 +1,231 @@
 #! /usr/bin/env python
 
+import heapq
+import time
 from abc import ABC, abstractmethod
+from collections import Counter, deque
 
 import numpy as np
 
 import pooltool.constants as c
+import pooltool.kernel as kernel
 import pooltool.physics as physics
 import pooltool.terminal as terminal
 import pooltool.utils as utils
-from pooltool.error import SimulateError
+from pooltool.error import ConfigError, SimulateError
 from pooltool.events import (
     BallBallCollision,
     BallCushionCollision,
     BallPocketCollision,
     NonEvent,
+    RollingSpinningTransition,
+    RollingStationaryTransition,
+    SlidingRollingTransition,
+    SpinningStationaryTransition,
     type_ball_ball,
     type_ball_cushion,
     type_ball_pocket,
+    type_none,
 )
-from pooltool.objects import DummyBall, NonObject
+from pooltool.objects.ball import BallHistory
+
+# The kinds of events in the records returned by
+# EvolveShotEventBased.get_next_event_record
+kind_none = 0
+kind_transition = 1
+kind_ball_ball = 2
+kind_linear_cushion = 3
+kind_circular_cushion = 4
+kind_pocket = 5
+
+
+class SimulationHalt(object):
+    """Diagnostics of a simulation that was halted before running to completion
+
+    Attributes
+    ==========
+    reason : str
+        Why the simulation was halted. One of 'max_events', 'max_sim_time',
+        'max_wall_time', 'zeno', or 'cancelled'
+    t : float
+        The simulation time at which the simulation was halted
+    num_events : int
+        The number of events simulated before halting
+    wall_time : float
+        The wall-clock time in seconds spent simulating before halting
+    last_events : list of class with base events.Event
+        The most recently resolved events, in chronological order
+    agent_ids : list
+        The ids of the agents held responsible. For 'zeno' halts, these are the agents
+        of the repeating event. Otherwise, these are the agents most frequently involved
+        in `last_events`.
+    """
+
+    def __init__(self, reason, t, num_events, wall_time, last_events, agent_ids):
+        self.reason = reason
+        self.t = t
+        self.num_events = num_events
+        self.wall_time = wall_time
+        self.last_events = last_events
+        self.agent_ids = agent_ids
+
+    def __repr__(self):
+        lines = [
+            f"<{self.__class__.__name__} object at {hex(id(self))}>",
+            f" ├── reason     : {self.reason}",
+            f" ├── time       : {self.t}",
+            f" ├── num events : {self.num_events}",
+            f" ├── wall time  : {self.wall_time}",
+            f" └── agents     : {self.agent_ids}",
+        ]
+
+        return "\n".join(lines) + "\n"
+
+    def as_dict(self, events):
+        """Return a pickleable dictionary of the halt
+
+        Parameters
+        ==========
+        events : pooltool.events.Events
+            The events of the halted system. The last events are stored as their
+            indices in `events`. See halt_from_dict
+        """
+        positions = {id(event): i for i, event in enumerate(events)}
+
+        return dict(
+            reason=self.reason,
+            t=self.t,
+            num_events=self.num_events,
+            wall_time=self.wall_time,
+            last_events=[positions[id(event)] for event in self.last_events],
+            agent_ids=list(self.agent_ids),
+        )
+
+
+def halt_from_dict(d, events):
+    """Return a SimulationHalt from a dictionary. See SimulationHalt.as_dict"""
+    d = dict(d)
+    d["last_events"] = [events[i] for i in d["last_events"]]
+
+    return SimulationHalt(**d)
+
+
+class Watchdog(object):
+    def __init__(
+        self,
+        max_events=None,
+        max_sim_time=None,
+        max_wall_time=None,
+        max_zeno_repeats=50,
+        zeno_dt=1e-9,
+        num_last_events=10,
+    ):
+        """Enforces event, simulation time, and wall-clock budgets on a simulation
+
+        Parameters
+        ==========
+        max_events : int, None
+            Halt once more than this many events have been resolved
+        max_sim_time : float, None
+            Halt once the simulation time exceeds this many seconds
+        max_wall_time : float, None
+            Halt once this many seconds of wall-clock time have been spent simulating
+        max_zeno_repeats : int, 50
+            Halt once the same event (same event type and agents) has occurred this
+            many times within `zeno_dt` seconds of simulation time. This detects
+            Zeno-like loops, such as repeated zero-time collisions between touching
+            balls. If None, Zeno detection is disabled.
+        zeno_dt : float, 1e-9
+            See `max_zeno_repeats`
+        num_last_events : int, 10
+            How many of the most recent events are reported in a SimulationHalt
+        """
+        self.max_events = max_events
+        self.max_sim_time = max_sim_time
+        self.max_wall_time = max_wall_time
+        self.max_zeno_repeats = max_zeno_repeats
+        self.zeno_dt = zeno_dt
+        self.num_last_events = num_last_events
+
+        self.start()
+
+    def start(self):
+        self.wall_start = time.time()
+        self.num_events = 0
+        self.zeno_counts = {}
+
+    def check(self, events, t, history):
+        """Returns a SimulationHalt if any budget is exceeded, otherwise None
+
+        Parameters
+        ==========
+        events : list of class with base events.Event
+            The events resolved in the most recent step
+        t : float
+            The current simulation time
+        history : pooltool.events.Events
+            All events resolved so far
+        """
+        self.num_events += len(events)
+
+        for event in events:
+            key = (event.event_type, tuple(agent.id for agent in event.agents))
+            t_first, count = self.zeno_counts.get(key, (event.time, 0))
+            if event.time - t_first > self.zeno_dt:
+                t_first, count = event.time, 0
+            self.zeno_counts[key] = (t_first, count + 1)
+
+            if self.max_zeno_repeats is None:
+                continue
+
+            if count + 1 >= self.max_zeno_repeats:
+                return self.halt("zeno", t, history, agent_ids=list(key[1]))
+
+        if self.max_events is not None and self.num_events > self.max_events:
+            return self.halt("max_events", t, history)
+
+        if self.max_sim_time is not None and t > self.max_sim_time:
+            return self.halt("max_sim_time", t, history)
+
+        if (
+            self.max_wall_time is not None
+            and time.time() - self.wall_start > self.max_wall_time
+        ):
+            return self.halt("max_wall_time", t, history)
+
+        return None
+
+    def halt(self, reason, t, history, agent_ids=None):
+        last_events = list(history[-self.num_last_events :])
+
+        if agent_ids is None:
+            counts = Counter(
+                agent.id
+                for event in last_events
+                for agent in event.agents
+                if agent.object_type == "ball"
+            )
+            agent_ids = [agent_id for agent_id, _ in counts.most_common(2)]
+
+        return SimulationHalt(
+            reason=reason,
+            t=t,
+            num_events=self.num_events,
+            wall_time=time.time() - self.wall_start,
+            last_events=last_events,
+            agent_ids=agent_ids,
+        )
 
 
 class EvolveShot(ABC):
     def __init__(self, run=terminal.Run(), progress=terminal.Progress()):
         self.run = run
         self.progress = progress
+        self.halt = None
+
+        # The keyword arguments of the last call to `simulate`, with which it can be
+        # replayed (see System.as_recipe). None if the history did not come from one call
+        self.simulate_kwargs = None
 
         # What kinds of events should be considered?
         self.include = {
@@ -33,25 +234,143 @@ class EvolveShot(ABC):
             type_ball_pocket: True,
         }
 
-    def simulate(self, name="NA", quiet=False, raise_simulate_error=False, **kwargs):
+    def simulate(
+        self,
+        name="NA",
+        quiet=False,
+        raise_simulate_error=False,
+        cache=None,
+        cancel_event=None,
+        **kwargs,
+    ):
         """Run a simulation
 
         Parameters
         ==========
+        algorithm : str, 'event'
+            The shot evolution algorithm. Either 'event' (EvolveShotEventBased),
+            'discrete' (EvolveShotDiscreteTime), a fast but approximate algorithm,
+            'hybrid' (EvolveShotHybrid), which steps dense clusters in discrete time, or
+            'compiled' (EvolveShotCompiled), which releases the GIL so that systems can
+            be simulated in parallel threads
         t_final : float, None
             The simulation will run until the time is greater than this value. If None,
             simulation is ran until the next event occurs at np.inf
+        batch_tol : float, None
+            If not None, independent events occurring within this many seconds of each
+            other are resolved together. See EvolveShotEventBased.iter_evolution
+        stop_when : callable, None
+            Called with each resolved event. The simulation stops as soon as it returns
+            True. See EvolveShotEventBased.evolution_algorithm
+        max_events, max_sim_time, max_wall_time, max_zeno_repeats : None
+            Budgets that halt a runaway simulation. See Watchdog
         raise_simulate_error : bool, False
             If true, a SimulateError is raised upon failure, so it may be caught and
             handled. This is to avoid errors when simulating shots in the GUI.
+        cache : pooltool.cache.ShotCache, None
+            If not None, the simulation results are looked up in this cache, and are
+            restored rather than simulated if found. Completed simulations are added to
+            the cache. Simulations with `stop_when` bypass the cache.
+        cancel_event : threading.Event, None
+            If not None, the simulation is halted with reason 'cancelled' at the first
+            event resolved after this is set, e.g. from another thread. Like
+            `stop_when`, this only applies to the 'event' and 'hybrid' algorithms, and
+            to 'compiled' only after its kernel has returned. It is not recorded in
+            `simulate_kwargs`.
 
         name : str, 'NA'
             A name for the simulated shot
+
+        Returns
+        =======
+        output : SimulationHalt or None
+            If a budget was exceeded, the simulation is halted and a SimulationHalt
+            describing why is returned (it is also stored as `self.halt`). The
+            history up until the halt is kept. Otherwise, None is returned.
         """
 
+        self.simulate_kwargs = dict(kwargs)
+
+        if cache is not None and kwargs.get("stop_when") is None:
+            key = cache.key(self, **kwargs)
+            entry = cache.get(key)
+            if entry is not None:
+                self.halt = None
+                self.load_results_from_dict(entry)
+                return None
+        else:
+            key = None
+
         self.reset_history()
         self.init_history()
 
+        halt = self.run_evolution_algorithm(
+            name=name, quiet=quiet, cancel_event=cancel_event, **kwargs
+        )
+
+        if key is not None and halt is None:
+            cache.put(key, self.results_as_dict())
+
+        return halt
+
+    def resume(self, name="NA", quiet=False, **kwargs):
+        """Continue a simulation from the current state of the system
+
+        The existing history is kept and extended. This continues a simulation that was
+        stopped early, e.g. because it reached `t_final`, was stopped by `stop_when`, or
+        was halted by the watchdog. If the history was ended (see
+        SystemHistory.end_history), the final NonEvent is removed before continuing.
+
+        The balls are evolved from their current states, which are assumed to be the
+        states at the time of the last event. If the balls have since been reset, e.g.
+        by `reset_balls`, call `set_from_history(-1)` first.
+
+        Parameters
+        ==========
+        kwargs : **kwargs
+            Accepts the same keyword arguments as `simulate`, e.g. t_final
+
+        Returns
+        =======
+        output : SimulationHalt or None
+            See `simulate`
+        """
+        if not len(self.events):
+            raise ConfigError(
+                "EvolveShot.resume :: There is no history to resume from. Call "
+                "`simulate` first."
+            )
+
+        if len(self.events) > 1 and self.events[-1].event_type == type_none:
+            self.truncate_history(len(self.events) - 1)
+
+        self.reset_history_cts()
+        self.t = self.events[-1].time
+        self.simulate_kwargs = None
+
+        return self.run_evolution_algorithm(name=name, quiet=quiet, **kwargs)
+
+    def run_evolution_algorithm(
+        self, name="NA", quiet=False, cancel_event=None, **kwargs
+    ):
+        """Run the evolution algorithm from the current state, reporting progress"""
+
+        self.halt = None
+
+        cancelled = False
+        if cancel_event is not None:
+            stop_when = kwargs.get("stop_when")
+            watchdog = Watchdog()
+
+            def stop_when_or_cancelled(event):
+                nonlocal cancelled
+                if cancel_event.is_set():
+                    cancelled = True
+                    return True
+                return stop_when is not None and stop_when(event)
+
+            kwargs["stop_when"] = stop_when_or_cancelled
+
         if not quiet:
 
             def progress_update():
@@ -68,14 +387,37 @@ class EvolveShot(ABC):
 
         self.progress_update = progress_update
 
+        evolver = get_shot_evolver(kwargs.pop("algorithm", "event"))
+        if not isinstance(self, evolver):
+            raise ConfigError(
+                f"EvolveShot :: {self.__class__.__name__} does not support the "
+                f"{evolver.__name__} algorithm"
+            )
+
         try:
-            self.evolution_algorithm(**kwargs)
-        except:
-            raise SimulateError()
+            evolver.evolution_algorithm(self, **kwargs)
+        except ConfigError:
+            raise
+        except Exception as e:
+            raise SimulateError(
+                f"Simulation '{name}' failed at time {self.t} after "
+                f"{len(self.events)} events with {e.__class__.__name__}: {e}"
+            ) from e
+
+        if cancelled and self.halt is None:
+            watchdog.num_events = len(self.events)
+            self.halt = watchdog.halt("cancelled", self.t, self.events)
 
         if not quiet:
             self.progress.end()
             self.run.info("Finished after", self.progress.t.time_elapsed_precise())
+            if self.halt is not None:
+                self.run.warning(
+                    f"Simulation halted ({self.halt.reason}). Involved agents: "
+                    f"{self.halt.agent_ids}"
+                )
+
+        return self.halt
 
     def evolve(self, dt):
         """Evolves current ball an amount of time dt
@@ -108,249 +450,673 @@ class EvolveShotEventBased(EvolveShot):
     def __init__(self, *args, **kwargs):
         EvolveShot.__init__(self, *args, **kwargs)
 
-    def evolution_algorithm(self, t_final=None, continuize=False, dt=None):
-        """The event-based evolution algorithm"""
+    def evolution_algorithm(
+        self,
+        t_final=None,
+        continuize=False,
+        dt=None,
+        stop_when=None,
+        **kwargs,
+    ):
+        """The event-based evolution algorithm
+
+        Parameters
+        ==========
+        stop_when : callable, None
+            A function that is called with each event as soon as it is resolved. If it
+            returns True, the simulation stops, leaving the history consistent up to
+            and including that event. Useful for questions that only need the start of
+            a shot, e.g. `lambda event: event.event_type == 'ball-ball'` to find the
+            first ball hit by the cue ball.
+        kwargs : **kwargs
+            Passed to EvolveShotEventBased.iter_evolution
+        """
 
         if dt is None:
             dt = 0.01
 
+        for event in self.iter_evolution(t_final=t_final, **kwargs):
+            if stop_when is not None and stop_when(event):
+                break
+
+        if continuize:
+            self.continuize(dt=dt)
+
+    def iter_events(self, **kwargs):
+        """Simulate the shot, yielding each event as soon as it is resolved
+
+        The history is reset and initialized, just like in `simulate`. Whenever an event
+        is yielded, the history is consistent up to and including that event, so the
+        caller may stop iterating at any time, e.g. as soon as the first ball-ball
+        collision is seen.
+
+        Parameters
+        ==========
+        kwargs : **kwargs
+            Passed to EvolveShotEventBased.iter_evolution
+
+        Examples
+        ========
+        >>> for event in shot.iter_events():
+        >>>     if event.event_type == 'ball-ball':
+        >>>         first_hit = event.agents[1].id
+        >>>         break
+        """
+
+        self.halt = None
+        self.reset_history()
+        self.init_history()
+        self.progress_update = lambda: None
+
+        yield from self.iter_evolution(**kwargs)
+
+    def iter_evolution(
+        self,
+        t_final=None,
+        batch_tol=None,
+        max_events=None,
+        max_sim_time=None,
+        max_wall_time=None,
+        max_zeno_repeats=50,
+    ):
+        """Evolve the system from its current state, yielding each resolved event
+
+        This is the generator that drives the event-based evolution algorithm. Unlike
+        `iter_events`, it does not reset the history.
+
+        Parameters
+        ==========
+        t_final : float, None
+            Stop once the time is greater than this value. If None, the system is
+            evolved until the next event occurs at np.inf
+        max_events, max_sim_time, max_wall_time, max_zeno_repeats : None
+            If any of these budgets are exceeded, the simulation is halted, the history
+            is ended at the current time, and a SimulationHalt is stored as `self.halt`.
+            See Watchdog for details.
+        batch_tol : float, None
+            If None, events are resolved one at a time. Otherwise, all events occurring
+            within `batch_tol` seconds of the next event are resolved in a single step,
+            provided they share no balls with each other (see get_next_events). This
+            speeds up shots with cascades of near-simultaneous collisions, like rack
+            breaks, at the cost of resolving each event of a batch up to `batch_tol`
+            seconds early.
+        """
+
         # Balls may already have energy. Therefore, it is critical to establish their
         # next transition events.
         for ball in self.balls.values():
             ball.update_next_transition_event()
 
+        self.reset_event_arrays()
+
+        watchdog = Watchdog(
+            max_events=max_events,
+            max_sim_time=max_sim_time,
+            max_wall_time=max_wall_time,
+            max_zeno_repeats=max_zeno_repeats,
+        )
+
+        num_steps = 0
         while True:
-            event = self.get_next_event()
+            if batch_tol is None:
+                events = [self.get_next_event()]
+            else:
+                events = self.get_next_events(batch_tol)
 
-            if event.time == np.inf:
+            if events[0].time == np.inf:
                 self.end_history()
                 break
 
-            self.evolve(event.time - self.t)
-            if self.include.get(event.event_type, True):
-                event.resolve()
+            self.evolve(events[0].time - self.t)
+            for event in events:
+                if self.include.get(event.event_type, True):
+                    event.resolve()
 
-            self.update_history(event, update_all=True)
+            if len(events) == 1:
+                self.update_history(events[0], update_all=True)
+            else:
+                self.update_history_batch(events)
 
-            if (len(self.events) % 30) == 0:
+            num_steps += 1
+            if (num_steps % 30) == 0:
                 self.progress_update()
 
-            if t_final is not None and self.t >= t_final:
+            yield from events
+
+            self.halt = watchdog.check(events, self.t, self.events)
+            if self.halt is not None:
+                self.end_history()
                 break
 
-        if continuize:
-            self.continuize(dt=dt)
+            if t_final is not None and self.t >= t_final:
+                break
 
     def get_next_event(self):
+        """Returns the next event
+
+        Only the winning event is instantiated. See get_next_event_record
+        """
+        return self.event_from_record(self.get_next_event_record())
+
+    def get_next_event_record(self):
+        """Returns the next event as a (time, kind, i, j) record
+
+        Candidate events are compared using preallocated scratch arrays, and no Event
+        objects are created. `kind` is one of the kind_* constants of this module, `i`
+        is the index of the ball in the evolver's ball list, and `j` is the index of the
+        other agent in the list of its kind (balls, linear cushion segments, circular
+        cushion segments, or pockets). See event_from_record
+        """
+        self._update_event_arrays()
+        self._sync_ball_states()
+
         # Start by assuming next event doesn't happen
-        event = NonEvent(t=np.inf)
+        record = (np.inf, kind_none, -1, -1)
 
-        transition_event = self.get_min_transition_event_time()
-        if transition_event.time < event.time:
-            event = transition_event
+        transition_record = self.get_min_transition_event_time()
+        if transition_record[0] < record[0]:
+            record = transition_record
 
-        ball_ball_event = self.get_min_ball_ball_event_time()
-        if ball_ball_event.time < event.time:
-            event = ball_ball_event
+        ball_ball_record = self.get_min_ball_ball_event_time()
+        if ball_ball_record[0] < record[0]:
+            record = ball_ball_record
 
-        ball_linear_cushion_event = self.get_min_ball_linear_cushion_event_time()
-        if ball_linear_cushion_event.time < event.time:
-            event = ball_linear_cushion_event
+        ball_linear_cushion_record = self.get_min_ball_linear_cushion_event_time()
+        if ball_linear_cushion_record[0] < record[0]:
+            record = ball_linear_cushion_record
 
-        ball_circular_cushion_event = self.get_min_ball_circular_cushion_event_time()
-        if ball_circular_cushion_event.time < event.time:
-            event = ball_circular_cushion_event
+        ball_circular_cushion_record = self.get_min_ball_circular_cushion_event_time()
+        if ball_circular_cushion_record[0] < record[0]:
+            record = ball_circular_cushion_record
 
-        ball_pocket_event = self.get_min_ball_pocket_event_time()
-        if ball_pocket_event.time < event.time:
-            event = ball_pocket_event
+        ball_pocket_record = self.get_min_ball_pocket_event_time()
+        if ball_pocket_record[0] < record[0]:
+            record = ball_pocket_record
 
-        return event
+        return record
 
-    def get_min_transition_event_time(self):
-        """Returns minimum time until next ball transition event"""
+    def event_from_record(self, record):
+        """Instantiate the event described by a record. See get_next_event_record"""
+        t, kind, i, j = record
 
-        event = NonEvent(t=np.inf)
+        if kind == kind_none:
+            return NonEvent(t=t)
 
-        for ball in self.balls.values():
-            if ball.next_transition_event.time <= event.time:
-                event = ball.next_transition_event
+        ball = self._ball_list[i]
+        if kind == kind_transition:
+            return ball.next_transition_event
+        elif kind == kind_ball_ball:
+            return BallBallCollision(ball, self._ball_list[j], t=t)
+        elif kind == kind_linear_cushion:
+            return BallCushionCollision(ball, self._linear_list[j], t=t)
+        elif kind == kind_circular_cushion:
+            return BallCushionCollision(ball, self._circular_list[j], t=t)
+        elif kind == kind_pocket:
+            return BallPocketCollision(ball, self._pocket_list[j], t=t)
 
-        return event
+        raise ValueError(f"Unknown event kind '{kind}'")
 
-    def get_min_ball_ball_event_time(self):
-        """Returns minimum time until next ball-ball collision"""
-        dtau_E = np.inf
-        ball_ids = []
-        collision_coeffs = []
-
-        for i, ball1 in enumerate(self.balls.values()):
-            for j, ball2 in enumerate(self.balls.values()):
-                if i >= j:
-                    continue
+    def _update_event_arrays(self):
+        """Index the agents and allocate the scratch arrays, if the agents changed
 
-                if ball1.s == c.pocketed or ball2.s == c.pocketed:
-                    continue
+        The balls, cushion segments, and pockets are laid out as arrays that the
+        compiled get_*_array functions of pooltool.physics operate on.
+        """
+        if (
+            getattr(self, "_event_balls", None) is self.balls
+            and getattr(self, "_event_table", None) is self.table
+            and len(self._ball_list) == len(self.balls)
+        ):
+            return
+
+        self._event_balls = self.balls
+        self._event_table = self.table
+
+        def array(values, dtype=np.float64):
+            return np.array(list(values), dtype=dtype)
+
+        balls = self._ball_list = list(self.balls.values())
+        self._event_rvw = np.empty((len(balls), 3, 3), dtype=np.float64)
+        self._event_s = np.empty(len(balls), dtype=np.int64)
+        self._event_mu = np.empty(len(balls), dtype=np.float64)
+        for attr in ("m", "g", "R"):
+            setattr(self, f"_event_{attr}", array(getattr(b, attr) for b in balls))
+
+        linear = self._linear_list = list(
+            self.table.cushion_segments["linear"].values()
+        )
+        self._linear_lx = array(x.lx for x in linear)
+        self._linear_ly = array(x.ly for x in linear)
+        self._linear_l0 = array(x.l0 for x in linear)
+        self._linear_p1 = array((x.p1 for x in linear)).reshape(-1, 3)
+        self._linear_p2 = array((x.p2 for x in linear)).reshape(-1, 3)
+        self._linear_direction = array((x.direction for x in linear), np.int64)
+        self._all_linear = np.arange(len(linear), dtype=np.int64)
+
+        circular = self._circular_list = list(
+            self.table.cushion_segments["circular"].values()
+        )
+        self._circular_a = array(x.a for x in circular)
+        self._circular_b = array(x.b for x in circular)
+        self._circular_r = array(x.radius for x in circular)
+        self._all_circular = np.arange(len(circular), dtype=np.int64)
+
+        pockets = self._pocket_list = list(self.table.pockets.values())
+        self._pocket_a = array(x.a for x in pockets)
+        self._pocket_b = array(x.b for x in pockets)
+        self._pocket_r = array(x.radius for x in pockets)
+
+        n = len(balls)
+        size = max(n * (n - 1) // 2, n * len(circular), n * len(pockets), 1)
+        if getattr(self, "_coeffs", None) is None or len(self._coeffs) < size:
+            self._coeffs = np.empty((size, 5), dtype=np.float64)
+            self._coeff_agents = np.empty((size, 2), dtype=np.int64)
+
+        # The active set holds the translating balls. The states of the other balls
+        # are only copied into the scratch arrays when they change
+        self._rvw_refs = [None] * n
+        self._transition_refs = [None] * n
+        self._transition_t = np.full(n, np.inf)
+        self._near = [None] * n
+        self._is_active = np.zeros(n, dtype=np.bool_)
+        self._active = np.empty(0, dtype=np.int64)
+        self._transition_heap = []
+
+    def reset_event_arrays(self):
+        """Rebuild the scratch arrays and active set on the next event prediction
+
+        Called at the start of each evolution, since balls may have been modified in
+        place (see _sync_ball_states).
+        """
+        self._event_balls = None
 
-                if ball1.s in c.nontranslating and ball2.s in c.nontranslating:
-                    continue
+    def _sync_ball_states(self):
+        """Copy the states of balls that changed into the scratch arrays
 
-                collision_coeffs.append(
-                    physics.get_ball_ball_collision_coeffs_fast(
-                        rvw1=ball1.rvw,
-                        rvw2=ball2.rvw,
-                        s1=ball1.s,
-                        s2=ball2.s,
-                        mu1=(ball1.u_s if ball1.s == c.sliding else ball1.u_r),
-                        mu2=(ball2.u_s if ball2.s == c.sliding else ball2.u_r),
-                        m1=ball1.m,
-                        m2=ball2.m,
-                        g1=ball1.g,
-                        g2=ball2.g,
-                        R=ball1.R,
-                    )
-                )
+        A ball's state is assumed unchanged if its rvw array is the same object as
+        when last copied, and its motion state and next transition event are also
+        unchanged. Events and evolve replace rvw arrays rather than modifying them.
+        For the changed balls only, the active set is updated and the next transition
+        is pushed onto the transition heap.
+        """
+        active_changed = False
+
+        for i, ball in enumerate(self._ball_list):
+            if (
+                ball.rvw is self._rvw_refs[i]
+                and ball.s == self._event_s[i]
+                and ball.next_transition_event is self._transition_refs[i]
+            ):
+                continue
+
+            self._rvw_refs[i] = ball.rvw
+            self._event_rvw[i] = ball.rvw
+            self._event_s[i] = ball.s
+            self._event_mu[i] = ball.u_s if ball.s == c.sliding else ball.u_r
 
-                ball_ids.append((ball1.id, ball2.id))
+            is_active = ball.s not in c.nontranslating
+            if is_active != self._is_active[i]:
+                self._is_active[i] = is_active
+                active_changed = True
 
-        if not len(collision_coeffs):
+            if ball.next_transition_event is not self._transition_refs[i]:
+                self._transition_refs[i] = ball.next_transition_event
+                self._near[i] = None
+                t = self._transition_t[i] = ball.next_transition_event.time
+                if t < np.inf:
+                    # Among equal times, the ball with the highest index is preferred
+                    heapq.heappush(self._transition_heap, (t, -i))
+
+        if active_changed:
+            self._active = np.flatnonzero(self._is_active)
+
+    def _min_record(self, records):
+        """Returns the record of the earliest of some candidate records
+
+        Parameters
+        ==========
+        records : (array, int, array, array)
+            The times until the candidate events, their kind, and the indices of their
+            agents. See get_next_event_record
+        """
+        dtau_E, kind, i, j = records
+        if not len(dtau_E):
             # There are no collisions to test for
-            return BallBallCollision(DummyBall(), DummyBall(), t=(self.t + dtau_E))
+            return np.inf, kind, -1, -1
 
-        dtau_E, index = utils.min_real_root(p=np.array(collision_coeffs), tol=c.tol)
+        index = dtau_E.argmin()
 
-        ball1_id, ball2_id = ball_ids[index]
-        ball1, ball2 = self.balls[ball1_id], self.balls[ball2_id]
+        return self.t + dtau_E[index], kind, int(i[index]), int(j[index])
 
-        return BallBallCollision(ball1, ball2, t=(self.t + dtau_E))
+    def _records_from_coeffs(self, n, kind):
+        """Returns the candidate records of the first n scratch rows"""
+        dtau_E = utils.min_real_roots(p=self._coeffs[:n], tol=c.tol)
+        agents = self._coeff_agents[:n]
 
-    def get_min_ball_circular_cushion_event_time(self):
-        dtau_E = np.inf
-        agent_ids = []
-        collision_coeffs = []
+        return dtau_E, kind, agents[:, 0].copy(), agents[:, 1].copy()
 
-        for ball in self.balls.values():
-            if ball.s in c.nontranslating:
-                continue
+    def get_cushion_segment_indices_near(self, i):
+        """Returns the indices of the cushion segments the i-th ball may hit next
 
-            for cushion in self.table.cushion_segments["circular"].values():
-                collision_coeffs.append(
-                    physics.get_ball_circular_cushion_collision_coeffs_fast(
-                        rvw=ball.rvw,
-                        s=ball.s,
-                        a=cushion.a,
-                        b=cushion.b,
-                        r=cushion.radius,
-                        mu=(ball.u_s if ball.s == c.sliding else ball.u_r),
-                        m=ball.m,
-                        g=ball.g,
-                        R=ball.R,
-                    )
-                )
+        Any collision after the ball's next transition can't be the next event, so only
+        the segments near the ball's path until then are needed. See
+        Table.get_cushion_segment_indices_near.
 
-                agent_ids.append((ball.id, cushion.id))
+        Until its next transition, the ball follows a single path, and the path from any
+        later time is part of it. The indices are therefore looked up once per next
+        transition of the ball, and reused until it changes (see _sync_ball_states).
+        """
+        if self._near[i] is None:
+            ball = self._ball_list[i]
+            linear, circular = self.table.get_cushion_segment_indices_near(
+                ball, ball.next_transition_event.time - self.t
+            )
+            self._near[i] = (
+                self._all_linear if linear is None else linear,
+                self._all_circular if circular is None else circular,
+            )
 
-        if not len(collision_coeffs):
-            # There are no collisions to test for
-            return BallBallCollision(DummyBall(), NonObject(), t=(self.t + dtau_E))
+        return self._near[i]
 
-        dtau_E, index = utils.min_real_root(p=np.array(collision_coeffs), tol=c.tol)
+    def get_next_events(self, batch_tol):
+        """Returns the next event and the independent events that closely follow it
 
-        ball_id, cushion_id = agent_ids[index]
-        ball, cushion = (
-            self.balls[ball_id],
-            self.table.cushion_segments["circular"][cushion_id],
-        )
+        All candidate events that occur within `batch_tol` of the next event are
+        considered in chronological order. A candidate is accepted into the batch only
+        if none of its balls are agents of an already accepted event, so that the
+        events of a batch can be resolved in any order. Rejected candidates are simply
+        predicted again after the batch is resolved.
 
-        return BallCushionCollision(ball, cushion, t=(self.t + dtau_E))
+        The candidates are the records of get_next_event_record, before the earliest is
+        picked. Since a ball takes part in at most one event of a batch, only the
+        earliest transition and linear cushion collision of each ball are candidates.
 
-    def get_min_ball_linear_cushion_event_time(self):
-        dtau_E_min = np.inf
-        involved_agents = tuple([DummyBall(), NonObject()])
+        Returns
+        =======
+        events : list
+            The batch of events. Every event is timestamped with the time of the first
+            event. If no event occurs, a list containing NonEvent(t=np.inf) is returned.
+        """
+        self._update_event_arrays()
+        self._sync_ball_states()
+
+        records = [
+            self.get_transition_event_records(),
+            self.get_ball_ball_event_records(),
+            self.get_ball_linear_cushion_event_records(),
+            self.get_ball_circular_cushion_event_records(),
+            self.get_ball_pocket_event_records(),
+        ]
+        dtau_E = np.concatenate([record[0] for record in records])
+        kinds = np.concatenate([np.full(len(r[0]), r[1]) for r in records])
+        ball_indices = np.concatenate([record[2] for record in records])
+        other_indices = np.concatenate([record[3] for record in records])
+
+        if not len(dtau_E) or dtau_E.min() == np.inf:
+            return [NonEvent(t=np.inf)]
+
+        dtau_batch = dtau_E.min()
+        t_batch = self.t + dtau_batch
+
+        (indices,) = np.nonzero(self.t + dtau_E <= t_batch + batch_tol)
+        indices = indices[np.argsort(dtau_E[indices], kind="stable")]
 
-        for ball in self.balls.values():
-            if ball.s in c.nontranslating:
+        events = []
+        busy = set()
+        for index in indices:
+            kind, i, j = (
+                int(kinds[index]),
+                int(ball_indices[index]),
+                other_indices[index],
+            )
+
+            ball_indices_k = {i, int(j)} if kind == kind_ball_ball else {i}
+            if ball_indices_k & busy:
                 continue
+            busy |= ball_indices_k
 
-            for cushion in self.table.cushion_segments["linear"].values():
-                dtau_E = physics.get_ball_linear_cushion_collision_time_fast(
-                    rvw=ball.rvw,
-                    s=ball.s,
-                    lx=cushion.lx,
-                    ly=cushion.ly,
-                    l0=cushion.l0,
-                    p1=cushion.p1,
-                    p2=cushion.p2,
-                    direction=cushion.direction,
-                    mu=(ball.u_s if ball.s == c.sliding else ball.u_r),
-                    m=ball.m,
-                    g=ball.g,
-                    R=ball.R,
-                )
+            if kind == kind_transition:
+                ball = self._ball_list[i]
+                events.append(ball.next_transition_event.__class__(ball, t=t_batch))
+            else:
+                events.append(self.event_from_record((t_batch, kind, i, int(j))))
 
-                if dtau_E < dtau_E_min:
-                    involved_agents = (ball, cushion)
-                    dtau_E_min = dtau_E
+        return events
 
-        dtau_E = dtau_E_min
+    def get_transition_event_records(self):
+        """Returns the candidate records of the next transition of every ball"""
+        (i,) = np.nonzero(self._transition_t < np.inf)
 
-        return BallCushionCollision(*involved_agents, t=(self.t + dtau_E))
+        return self._transition_t[i] - self.t, kind_transition, i, np.full(len(i), -1)
 
-    def get_min_ball_pocket_event_time(self):
-        """Returns minimum time until next ball-pocket collision"""
-        dtau_E = np.inf
-        agent_ids = []
-        collision_coeffs = []
+    def get_min_transition_event_time(self):
+        """Returns the record of the next ball transition event
 
-        for ball in self.balls.values():
-            if ball.s in c.nontranslating:
-                continue
+        The earliest valid entry of the transition heap. Entries that no longer match a
+        ball's next transition are discarded lazily.
+        """
+        heap = self._transition_heap
+
+        while heap:
+            t, i = heap[0]
+            if self._transition_refs[-i].time == t:
+                return t, kind_transition, -i, -1
+            heapq.heappop(heap)
+
+        return np.inf, kind_transition, -1, -1
+
+    def get_ball_ball_event_records(self):
+        """Returns the candidate records of every pair of balls"""
+        n = physics.get_ball_ball_collision_coeffs_array(
+            self._event_rvw,
+            self._event_s,
+            self._event_mu,
+            self._event_m,
+            self._event_g,
+            self._event_R,
+            self._active,
+            self._is_active,
+            self._coeffs,
+            self._coeff_agents,
+        )
 
-            for pocket in self.table.pockets.values():
-                collision_coeffs.append(
-                    physics.get_ball_pocket_collision_coeffs_fast(
-                        rvw=ball.rvw,
-                        s=ball.s,
-                        a=pocket.a,
-                        b=pocket.b,
-                        r=pocket.radius,
-                        mu=(ball.u_s if ball.s == c.sliding else ball.u_r),
-                        m=ball.m,
-                        g=ball.g,
-                        R=ball.R,
-                    )
-                )
+        return self._records_from_coeffs(n, kind_ball_ball)
 
-                agent_ids.append((ball.id, pocket.id))
+    def get_min_ball_ball_event_time(self):
+        """Returns the record of the next ball-ball collision"""
+        return self._min_record(self.get_ball_ball_event_records())
 
-        if not len(collision_coeffs):
-            # There are no collisions to test for
-            return BallBallCollision(DummyBall(), NonObject(), t=(self.t + dtau_E))
+    def get_ball_circular_cushion_event_records(self):
+        """Returns the candidate records of every active ball and nearby circular
+        cushion segment
+        """
+        n = 0
+
+        for i in self._active:
+            _, circular = self.get_cushion_segment_indices_near(i)
+            n = physics.get_ball_circular_cushion_collision_coeffs_array(
+                self._event_rvw[i],
+                self._event_s[i],
+                self._event_mu[i],
+                self._event_m[i],
+                self._event_g[i],
+                self._event_R[i],
+                self._circular_a,
+                self._circular_b,
+                self._circular_r,
+                circular,
+                i,
+                self._coeffs,
+                self._coeff_agents,
+                n,
+            )
 
-        dtau_E, index = utils.min_real_root(p=np.array(collision_coeffs), tol=c.tol)
+        return self._records_from_coeffs(n, kind_circular_cushion)
 
-        ball_id, pocket_id = agent_ids[index]
-        ball, pocket = self.balls[ball_id], self.table.pockets[pocket_id]
+    def get_min_ball_circular_cushion_event_time(self):
+        """Returns the record of the next ball-circular cushion collision"""
+        return self._min_record(self.get_ball_circular_cushion_event_records())
 
-        return BallPocketCollision(ball, pocket, t=(self.t + dtau_E))
+    def get_ball_linear_cushion_event_records(self):
+        """Returns the candidate records of the next linear cushion collision of every
+        active ball
+        """
+        dtau_E = np.empty(len(self._active), dtype=np.float64)
+        cushion_indices = np.empty(len(self._active), dtype=np.int64)
+
+        for k, i in enumerate(self._active):
+            linear, _ = self.get_cushion_segment_indices_near(i)
+            dtau_E[k], cushion_indices[k] = (
+                physics.get_min_ball_linear_cushion_collision_time_array(
+                    self._event_rvw[i],
+                    self._event_s[i],
+                    self._event_mu[i],
+                    self._event_m[i],
+                    self._event_g[i],
+                    self._event_R[i],
+                    self._linear_lx,
+                    self._linear_ly,
+                    self._linear_l0,
+                    self._linear_p1,
+                    self._linear_p2,
+                    self._linear_direction,
+                    linear,
+                )
+            )
+
+        return dtau_E, kind_linear_cushion, self._active, cushion_indices
+
+    def get_min_ball_linear_cushion_event_time(self):
+        """Returns the record of the next ball-linear cushion collision"""
+        return self._min_record(self.get_ball_linear_cushion_event_records())
+
+    def get_ball_pocket_event_records(self):
+        """Returns the candidate records of every active ball and pocket"""
+        n = physics.get_ball_pocket_collision_coeffs_array(
+            self._event_rvw,
+            self._event_s,
+            self._event_mu,
+            self._event_m,
+            self._event_g,
+            self._event_R,
+            self._active,
+            self._pocket_a,
+            self._pocket_b,
+            self._pocket_r,
+            self._coeffs,
+            self._coeff_agents,
+        )
+
+        return self._records_from_coeffs(n, kind_pocket)
+
+    def get_min_ball_pocket_event_time(self):
+        """Returns the record of the next ball-pocket collision"""
+        return self._min_record(self.get_ball_pocket_event_records())
 
 
 class EvolveShotDiscreteTime(EvolveShot):
+    """A discrete time evolution algorithm, vectorized over all balls
+
+    The balls are stepped forward in time, and collisions are detected as overlaps
+    between balls, or between balls and the table's cushion segments and pockets (read
+    from `table.geometry`). It is much less accurate than the event-based algorithm,
+    but is useful for quick previews and as an independent check of it.
+
+    Notes
+    =====
+    - Only collisions and transitions are recorded as events, along with a final
+      NonEvent that timestamps the final state. Each is timestamped with the end of
+      the step it was detected in. If continuize is True, the state of every ball
+      after each step is stored in its continuous history.
+    """
+
     def __init__(self, *args, **kwargs):
         EvolveShot.__init__(self, *args, **kwargs)
 
-    def evolution_algorithm(self, t_final=None, dt=0.05):
-        """The discrete time algorithm"""
+    def evolution_algorithm(
+        self,
+        t_final=None,
+        dt=None,
+        adaptive=False,
+        max_displacement=None,
+        min_dt=1e-5,
+        continuize=False,
+        **kwargs,
+    ):
+        """The discrete time algorithm
+
+        Parameters
+        ==========
+        t_final : float, None
+            The simulation will run until the time is greater than this value. If None,
+            the simulation runs until all balls are stationary or pocketed
+        dt : float, None
+            The time step. If adaptive, this is the maximum time step. If None, 0.001 is
+            used.
+        adaptive : bool, False
+            If True, the time step is chosen such that two balls close in on each other
+            (or a ball on a cushion) by no more than max_displacement per step. See
+            get_adaptive_step.
+        max_displacement : float, None
+            See adaptive. If None, one tenth of the smallest ball radius is used.
+        min_dt : float, 1e-5
+            The smallest allowed time step, if adaptive.
+        continuize : bool, False
+            If True, the state of each ball after every step is stored in its
+            continuous history.
+        """
+
+        if dt is None:
+            dt = 0.001
+
+        balls = list(self.balls.values())
+        self._init_discrete_arrays(balls)
+
+        if max_displacement is None:
+            max_displacement = 0.1 * np.min(self._R)
+
+        snapshots = []
+        events = []
+        samples = [(self._rvw.copy(), self._s.copy(), self.t)] if continuize else None
 
         steps = 0
         while True:
-            self.evolve(dt)
-            self.t += dt
+            if np.all((self._s == c.stationary) | (self._s == c.pocketed)):
+                break
 
-            events = self.detect_events()
-            for event in events:
-                event.resolve()
-                self.update_history(event, update_all=True)
+            if adaptive:
+                step = self.get_adaptive_step(dt, max_displacement, min_dt)
+            else:
+                step = dt
+
+            s_before = self._s.copy()
+            physics.evolve_ball_motion_array(
+                self._s,
+                self._rvw,
+                self._R,
+                self._m,
+                self._u_s,
+                self._u_sp,
+                self._u_r,
+                self._g,
+                step,
+            )
+            self.t += step
+
+            for event in self.detect_transitions(balls, s_before):
+                snapshots.append((self._rvw.copy(), self._s.copy(), self.t))
+                events.append(event)
+
+            for event in self.detect_events(balls):
+                if event.event_type == type_none:
+                    continue
+
+                self._resolve_discrete_event(event, balls)
+                snapshots.append((self._rvw.copy(), self._s.copy(), self.t))
+                events.append(event)
+
+            if continuize:
+                samples.append((self._rvw.copy(), self._s.copy(), self.t))
 
             if (steps % 1000) == 0:
                 self.progress_update()
@@ -358,15 +1124,157 @@ class EvolveShotDiscreteTime(EvolveShot):
             if t_final is not None and self.t >= t_final:
                 break
 
-            if self.get_system_energy() < c.tol:
-                break
-
             steps += 1
 
-    def detect_events(self):
+        # Timestamp the final state
+        snapshots.append((self._rvw.copy(), self._s.copy(), self.t))
+        events.append(NonEvent(t=self.t))
+
+        self._record_discrete_history(balls, snapshots, events)
+
+        if continuize:
+            rvws, ss, ts = self._stack_snapshots(balls, samples)
+            for i, ball in enumerate(balls):
+                history_cts = BallHistory()
+                history_cts.rvw = rvws[:, i]
+                history_cts.s = ss[:, i]
+                history_cts.t = np.array(ts)
+                history_cts.vectorized = True
+                ball.attach_history_cts(history_cts)
+
+            self.continuized = True
+
+    def get_adaptive_step(self, dt, max_displacement, min_dt):
+        """Returns a time step in which no two balls close in by more than
+        max_displacement
+
+        Two balls moving at speeds up to v, and decelerated or accelerated by friction
+        by up to a, close in by at most 2*v*h + a*h^2 in a step of h seconds. The
+        largest h for which this is at most max_displacement is returned, clipped to
+        [min_dt, dt]. A ball closes in on a cushion by at most half as much.
+        """
+        v = np.max(np.linalg.norm(self._rvw[:, 1, :], axis=1))
+        translating = (self._s == c.sliding) | (self._s == c.rolling)
+        a = np.max(np.where(translating, self._u_s * self._g, 0))
+
+        if a > 0:
+            step = (np.sqrt(v**2 + a * max_displacement) - v) / a
+        elif v > 0:
+            step = max_displacement / (2 * v)
+        else:
+            return dt
+
+        return float(min(dt, max(min_dt, step)))
+
+    def detect_transitions(self, balls, s_before):
+        """Returns the transitions of the balls whose states changed during a step
+
+        A ball can go through several transitions within a step, e.g. from sliding to
+        rolling to stationary. Each of them is returned, in order.
+        """
+        events = []
+
+        for i in np.flatnonzero(self._s != s_before):
+            start, end = int(s_before[i]), int(self._s[i])
+            while start != end:
+                if start == c.sliding:
+                    transition = SlidingRollingTransition
+                elif start == c.rolling and end == c.spinning:
+                    transition = RollingSpinningTransition
+                elif start == c.rolling:
+                    transition = RollingStationaryTransition
+                elif start == c.spinning:
+                    transition = SpinningStationaryTransition
+                else:
+                    break
+
+                event = transition(balls[i], t=self.t)
+                event.agent_state_initial = (self._rvw[i].copy(), event.state_start)
+                event.agent_state_final = (self._rvw[i].copy(), event.state_end)
+                events.append(event)
+                start = event.state_end
+
+        return events
+
+    def _init_discrete_arrays(self, balls):
+        self._index = {ball.id: i for i, ball in enumerate(balls)}
+        self._rvw = np.array([ball.rvw for ball in balls], dtype=np.float64)
+        self._s = np.array([ball.s for ball in balls], dtype=np.int64)
+        for attr in ("R", "m", "u_s", "u_sp", "u_r", "g"):
+            values = [getattr(ball, attr) for ball in balls]
+            setattr(self, f"_{attr}", np.array(values, dtype=np.float64))
+
+        geometry = self.table.geometry
+        segments = geometry.get_cushion_segments()
+        self._linear = [segments["linear"][key] for key in segments["linear"]]
+        self._circular = [segments["circular"][key] for key in segments["circular"]]
+        self._pockets = [self.table.pockets[key] for key in geometry.pocket_ids]
+
+    def _resolve_discrete_event(self, event, balls):
+        """Resolve an event with the ball objects, then copy the result back"""
+
+        agents = [agent for agent in event.agents if agent.object_type == "ball"]
+        for agent in agents:
+            i = self._index[agent.id]
+            agent.set(self._rvw[i].copy(), s=self._s[i], t=self.t)
+
+        event.resolve()
+
+        for agent in agents:
+            i = self._index[agent.id]
+            self._rvw[i] = agent.rvw
+            self._s[i] = agent.s
+
+    def _stack_snapshots(self, balls, snapshots):
+        """Stacks (rvw, s, t) snapshots of the arrays into (rvws, ss, ts)"""
+        if not len(snapshots):
+            return np.empty((0, len(balls), 3, 3)), np.empty((0, len(balls))), []
+
+        rvws = np.array([snapshot[0] for snapshot in snapshots])
+        ss = np.array([snapshot[1] for snapshot in snapshots])
+        ts = [snapshot[2] for snapshot in snapshots]
+
+        return rvws, ss, ts
+
+    def _record_discrete_history(self, balls, snapshots, events):
+        rvws, ss, ts = self._stack_snapshots(balls, snapshots)
+
+        for i, ball in enumerate(balls):
+            if ball.history.vectorized:
+                ball.history.devectorize()
+
+            ball.history.rvw.extend(rvws[:, i])
+            ball.history.s.extend(int(state) for state in ss[:, i])
+            ball.history.t.extend(ts)
+            ball.events.extend(events)
+
+            ball.set(self._rvw[i].copy(), s=int(self._s[i]), t=self.t)
+            ball.update_next_transition_event()
+
+        self.events.extend(events)
+
+    def detect_events(self, balls):
+        """Returns the collisions found at the current time step
+
+        If there are none, a list containing a NonEvent is returned.
+        """
         events = []
-        events.extend(self.detect_ball_ball_collisions())
-        events.extend(self.detect_ball_cushion_collisions())
+
+        if self.include.get(type_ball_ball, True):
+            for i, j in self.detect_ball_ball_collisions():
+                events.append(BallBallCollision(balls[i], balls[j], t=self.t))
+
+        if self.include.get(type_ball_cushion, True):
+            for i, k in self.detect_ball_linear_cushion_collisions():
+                events.append(BallCushionCollision(balls[i], self._linear[k], t=self.t))
+            for i, k in self.detect_ball_circular_cushion_collisions():
+                events.append(
+                    BallCushionCollision(balls[i], self._circular[k], t=self.t)
+                )
+
+        if self.include.get(type_ball_pocket, True):
+            for i, k in self.detect_ball_pocket_collisions():
+                events.append(BallPocketCollision(balls[i], self._pockets[k], t=self.t))
 
         if not len(events):
             events.append(NonEvent(t=self.t))
@@ -374,57 +1282,657 @@ class EvolveShotDiscreteTime(EvolveShot):
         return events
 
     def detect_ball_ball_collisions(self):
-        events = []
-        for i, ball1 in enumerate(self.balls.values()):
-            for j, ball2 in enumerate(self.balls.values()):
-                if i >= j:
-                    continue
+        """Returns index pairs (i, j), i < j, of overlapping balls moving together"""
+
+        r = self._rvw[:, 0, :2]
+        v = self._rvw[:, 1, :2]
+        active = self._s != c.pocketed
+        translating = active & (self._s != c.stationary) & (self._s != c.spinning)
+
+        dr = r[:, None, :] - r[None, :, :]
+        dv = v[:, None, :] - v[None, :, :]
+        contact = self._R[:, None] + self._R[None, :]
+
+        colliding = (
+            (np.sum(dr**2, axis=-1) < contact**2)
+            & (np.sum(dr * dv, axis=-1) < 0)
+            & (translating[:, None] | translating[None, :])
+            & (active[:, None] & active[None, :])
+        )
 
-                if ball1.s in c.nontranslating and ball2.s in c.nontranslating:
-                    continue
+        return np.argwhere(np.triu(colliding, k=1))
 
-                if physics.is_overlapping(ball1.rvw, ball2.rvw, ball1.R, ball2.R):
-                    events.append(BallBallCollision(ball1, ball2, t=self.t))
+    def detect_ball_linear_cushion_collisions(self):
+        """Returns (ball index, segment index) pairs for linear cushion overlaps"""
 
-        return events
+        geometry = self.table.geometry
+        if not len(geometry.linear_ids):
+            return []
 
-    def detect_ball_cushion_collisions(self):
-        """FIXME a complete hack that doesn't work for generalized tables"""
-        events = []
+        r = self._rvw[:, 0, :2]
+        v = self._rvw[:, 1, :2]
+        translating = (self._s == c.sliding) | (self._s == c.rolling)
+
+        lx, ly, l0 = geometry.linear_lx, geometry.linear_ly, geometry.linear_l0
+        norm = np.sqrt(lx**2 + ly**2)
+
+        # Signed distance from each ball center to each line, and its rate of change
+        d = (lx * r[:, 0, None] + ly * r[:, 1, None] + l0) / norm
+        d_dot = (lx * v[:, 0, None] + ly * v[:, 1, None]) / norm
+
+        # Whether the projection of the ball center lies within the segment
+        p1 = geometry.linear_p1[:, :2]
+        p12 = geometry.linear_p2[:, :2] - p1
+        proj = np.sum((r[:, None, :] - p1) * p12, axis=-1) / np.sum(p12**2, axis=-1)
+
+        direction = geometry.linear_direction
+        side = (
+            (direction == 2)
+            | ((direction == 0) & (d < 0))
+            | ((direction == 1) & (d > 0))
+        )
+
+        colliding = (
+            (np.abs(d) < self._R[:, None])
+            & (d * d_dot < 0)
+            & (proj >= 0)
+            & (proj <= 1)
+            & side
+            & translating[:, None]
+        )
+
+        return np.argwhere(colliding)
+
+    def detect_ball_circular_cushion_collisions(self):
+        """Returns (ball index, segment index) pairs for circular cushion overlaps"""
+
+        geometry = self.table.geometry
+        if not len(geometry.circular_ids):
+            return []
+
+        r = self._rvw[:, 0, :2]
+        v = self._rvw[:, 1, :2]
+        translating = (self._s == c.sliding) | (self._s == c.rolling)
+
+        dr = r[:, None, :] - geometry.circular_center[:, :2]
+        contact = self._R[:, None] + geometry.circular_radius
+
+        colliding = (
+            (np.sum(dr**2, axis=-1) < contact**2)
+            & (np.sum(dr * v[:, None, :], axis=-1) < 0)
+            & translating[:, None]
+        )
+
+        return np.argwhere(colliding)
+
+    def detect_ball_pocket_collisions(self):
+        """Returns (ball index, pocket index) pairs for ball centers inside pockets"""
+
+        geometry = self.table.geometry
+        if not len(geometry.pocket_ids):
+            return []
+
+        r = self._rvw[:, 0, :2]
+        translating = (self._s == c.sliding) | (self._s == c.rolling)
+
+        dr = r[:, None, :] - geometry.pocket_center[:, :2]
+        colliding = (
+            np.sum(dr**2, axis=-1) < geometry.pocket_radius**2
+        ) & translating[:, None]
+
+        return np.argwhere(colliding)
+
+
+class EvolveShotHybrid(EvolveShotEventBased, EvolveShotDiscreteTime):
+    """An event-based algorithm that steps dense clusters of balls in discrete time
+
+    Events are resolved one at a time, as in EvolveShotEventBased, while the recent
+    ball-ball collisions are monitored. If they become dense in time (e.g. in a tightly
+    packed rack), the balls involved are grouped into a cluster that is stepped with
+    a small fixed time step for a short window, like in EvolveShotDiscreteTime. The
+    remaining balls are still evolved event by event during the window.
+
+    The cluster is closed under reachability: any ball that could come into contact
+    with the cluster during the window, given bounds on how far each ball can travel,
+    is added to it. The two sets of balls therefore cannot interact during the window,
+    and are reconciled simply by sharing a clock.
+
+    Notes
+    =====
+    - The events and histories have the same format as those of the other algorithms.
+      Every event updates the history of every ball.
+    - Motion transitions of cluster balls are not recorded as events.
+    """
+
+    def __init__(self, *args, **kwargs):
+        EvolveShot.__init__(self, *args, **kwargs)
+
+    def evolution_algorithm(
+        self, t_final=None, continuize=False, dt=None, stop_when=None, **kwargs
+    ):
+        """The hybrid evolution algorithm
+
+        Parameters
+        ==========
+        kwargs : **kwargs
+            Passed to EvolveShotHybrid.iter_hybrid_evolution. See
+            EvolveShotEventBased.evolution_algorithm for the others
+        """
+
+        if dt is None:
+            dt = 0.01
+
+        for event in self.iter_hybrid_evolution(t_final=t_final, **kwargs):
+            if stop_when is not None and stop_when(event):
+                break
+
+        if continuize:
+            self.continuize(dt=dt)
+
+    def iter_hybrid_evolution(
+        self,
+        t_final=None,
+        dense_events=20,
+        dense_time=1e-3,
+        min_cluster_size=3,
+        discrete_dt=1e-4,
+        discrete_window=5e-3,
+        max_events=None,
+        max_sim_time=None,
+        max_wall_time=None,
+        max_zeno_repeats=50,
+    ):
+        """Evolve the system from its current state, yielding each resolved event
+
+        Parameters
+        ==========
+        t_final : float, None
+            Stop once the time is greater than this value
+        dense_events : int, 20
+            The number of most recent ball-ball collisions that are monitored
+        dense_time : float, 1e-3
+            If the `dense_events` most recent ball-ball collisions span less than this
+            many seconds, a cluster is stepped in discrete time
+        min_cluster_size : int, 3
+            Only groups of at least this many colliding balls form a cluster
+        discrete_dt : float, 1e-4
+            The time step used for clusters
+        discrete_window : float, 5e-3
+            How long a cluster is stepped in discrete time before event-based evolution
+            of all balls resumes
+        max_events, max_sim_time, max_wall_time, max_zeno_repeats : None
+            See Watchdog
+        """
 
         for ball in self.balls.values():
-            ball_x, ball_y = ball.rvw[0, :2]
-            if ball_x <= self.table.L + ball.R:
-                events.append(
-                    BallCushionCollision(
-                        ball, self.table.cushion_segments["L"], t=self.t
+            ball.update_next_transition_event()
+
+        self.reset_event_arrays()
+
+        watchdog = Watchdog(
+            max_events=max_events,
+            max_sim_time=max_sim_time,
+            max_wall_time=max_wall_time,
+            max_zeno_repeats=max_zeno_repeats,
+        )
+
+        recent = deque(maxlen=dense_events)
+
+        num_steps = 0
+        while True:
+            if (
+                len(recent) == dense_events
+                and recent[-1][0] - recent[0][0] < dense_time
+            ):
+                cluster = self.get_dense_cluster(recent, min_cluster_size)
+                recent.clear()
+
+                if cluster:
+                    window = self.iter_cluster_window(
+                        self.expand_cluster(cluster, discrete_window),
+                        t_end=self.t + discrete_window,
+                        dt=discrete_dt,
                     )
-                )
-            elif ball_x >= self.table.R - ball.R:
-                events.append(
-                    BallCushionCollision(
-                        ball, self.table.cushion_segments["R"], t=self.t
+                    for events in window:
+                        yield from events
+
+                        self.halt = watchdog.check(events, self.t, self.events)
+                        if self.halt is not None:
+                            break
+
+                    if self.halt is not None:
+                        self.end_history()
+                        break
+
+                    if t_final is not None and self.t >= t_final:
+                        break
+
+                    continue
+
+            event = self.get_next_event()
+
+            if event.time == np.inf:
+                self.end_history()
+                break
+
+            self.evolve(event.time - self.t)
+            if self.include.get(event.event_type, True):
+                event.resolve()
+            self.update_history(event, update_all=True)
+
+            if event.event_type == type_ball_ball:
+                recent.append((event.time, event.agents[0].id, event.agents[1].id))
+
+            num_steps += 1
+            if (num_steps % 30) == 0:
+                self.progress_update()
+
+            yield event
+
+            self.halt = watchdog.check([event], self.t, self.events)
+            if self.halt is not None:
+                self.end_history()
+                break
+
+            if t_final is not None and self.t >= t_final:
+                break
+
+    def get_dense_cluster(self, recent, min_cluster_size):
+        """Returns the ids of balls in large groups of recently colliding balls
+
+        Parameters
+        ==========
+        recent : iterable of (t, ball1_id, ball2_id)
+            Recent ball-ball collisions
+        """
+
+        # Union-find over the collision pairs
+        parent = {}
+
+        def find(x):
+            parent.setdefault(x, x)
+            while parent[x] != x:
+                parent[x] = parent[parent[x]]
+                x = parent[x]
+            return x
+
+        for _, id1, id2 in recent:
+            parent[find(id1)] = find(id2)
+
+        groups = {}
+        for ball_id in list(parent):
+            groups.setdefault(find(ball_id), set()).add(ball_id)
+
+        return set().union(
+            *(group for group in groups.values() if len(group) >= min_cluster_size)
+        )
+
+    def expand_cluster(self, cluster, window):
+        """Grow the cluster until no other ball can reach it within the window
+
+        The translational speed of any cluster ball is bounded by the total energy of
+        the cluster, since energy can only be exchanged within the cluster. A ball
+        outside the cluster can travel no further than its current motion allows.
+        """
+
+        def reach(ball):
+            if ball.s in c.nontranslating:
+                return 0
+            mu = ball.u_s if ball.s == c.sliding else ball.u_r
+            v = np.linalg.norm(ball.rvw[1])
+            return v * window + 0.5 * mu * ball.g * window**2
+
+        cluster = set(cluster)
+        while True:
+            members = [self.balls[ball_id] for ball_id in cluster]
+            energy = sum(physics.get_ball_energy_fast(b.rvw, b.R, b.m) for b in members)
+            v_max = np.sqrt(2 * energy / min(b.m for b in members))
+            positions = np.array([b.rvw[0, :2] for b in members])
+            pad = v_max * window + max(b.R for b in members)
+            lo, hi = positions.min(axis=0) - pad, positions.max(axis=0) + pad
+
+            added = set()
+            for ball in self.balls.values():
+                if ball.id in cluster or ball.s == c.pocketed:
+                    continue
+
+                gap = np.linalg.norm(
+                    np.maximum(
+                        0, np.maximum(lo - ball.rvw[0, :2], ball.rvw[0, :2] - hi)
                     )
                 )
-            elif ball_y <= self.table.B + ball.R:
-                events.append(
-                    BallCushionCollision(
-                        ball, self.table.cushion_segments["B"], t=self.t
-                    )
+                if gap <= reach(ball) + ball.R:
+                    added.add(ball.id)
+
+            if not added:
+                return cluster
+
+            cluster |= added
+
+    def iter_cluster_window(self, cluster, t_end, dt):
+        """Step the cluster in discrete time and the other balls event by event
+
+        Yields the list of events resolved at each time they occur. Balls outside of the
+        cluster are only evolved when a history entry is recorded or one of their
+        events occurs.
+        """
+
+        # Keep the order of self.balls, so the outcome doesn't depend on set ordering
+        cluster_balls = [ball for ball in self.balls.values() if ball.id in cluster]
+        sparse_ids = [ball_id for ball_id in self.balls if ball_id not in cluster]
+        self._init_discrete_arrays(cluster_balls)
+
+        def sync():
+            """Bring every ball object to the current time"""
+            for i, ball in enumerate(cluster_balls):
+                s = int(self._s[i])
+                if s == c.sliding:
+                    # A step can end just as a ball starts rolling. Its sliding
+                    # trajectory is then undefined, so it is set to rolling
+                    u = utils.get_rel_velocity_fast(self._rvw[i], self._R[i])
+                    if np.abs(u).sum() <= c.tol:
+                        s = self._s[i] = c.rolling
+                ball.set(self._rvw[i].copy(), s=s, t=self.t)
+
+            for ball_id in sparse_ids:
+                ball = self.balls[ball_id]
+                rvw, s = physics.evolve_ball_motion(
+                    state=ball.s,
+                    rvw=ball.rvw,
+                    R=ball.R,
+                    m=ball.m,
+                    u_s=ball.u_s,
+                    u_sp=ball.u_sp,
+                    u_r=ball.u_r,
+                    g=ball.g,
+                    t=self.t - ball.t,
                 )
-            elif ball_y >= self.table.T - ball.R:
-                events.append(
-                    BallCushionCollision(
-                        ball, self.table.cushion_segments["T"], t=self.t
+                ball.set(rvw, s=s, t=self.t)
+
+        def step(step_dt):
+            physics.evolve_ball_motion_array(
+                self._s,
+                self._rvw,
+                self._R,
+                self._m,
+                self._u_s,
+                self._u_sp,
+                self._u_r,
+                self._g,
+                step_dt,
+            )
+            self.t += step_dt
+
+        sparse_event = self.get_next_event_among(sparse_ids)
+        while self.t < t_end:
+            t_next = min(self.t + dt, t_end)
+
+            if sparse_event.time <= t_next:
+                step(sparse_event.time - self.t)
+                sync()
+
+                if self.include.get(sparse_event.event_type, True):
+                    sparse_event.resolve()
+                self.update_history(sparse_event, update_all=True)
+
+                yield [sparse_event]
+                sparse_event = self.get_next_event_among(sparse_ids)
+                continue
+
+            step(t_next - self.t)
+
+            events = [
+                event
+                for event in self.detect_events(cluster_balls)
+                if event.event_type != type_none
+            ]
+            if not events:
+                continue
+
+            sync()
+            for event in events:
+                self._resolve_discrete_event(event, cluster_balls)
+                self.update_history(event, update_all=True)
+
+            yield events
+
+        sync()
+        for ball in cluster_balls:
+            ball.update_next_transition_event()
+
+    def get_next_event_among(self, ball_ids):
+        """Returns the next event, considering only the balls with the given ids"""
+
+        balls = self.balls
+        self.balls = {ball_id: balls[ball_id] for ball_id in ball_ids}
+        try:
+            return self.get_next_event()
+        finally:
+            self.balls = balls
+
+
+class EvolveShotCompiled(EvolveShot):
+    """The event-based algorithm, run by a compiled kernel that releases the GIL
+
+    The system is converted to arrays and evolved by pooltool.kernel.evolve_event_based,
+    which predicts and resolves events exactly like EvolveShotEventBased. Afterwards,
+    the events and ball histories are rebuilt from the kernel's output, so the results
+    have the same format as those of the other algorithms.
+
+    Since the kernel holds the GIL only while the arrays are built and the results
+    rebuilt, different systems can be simulated in parallel threads:
+
+    >>> def simulate(shot):
+    >>>     return shot.simulate(algorithm='compiled', quiet=True)
+    >>> with ThreadPoolExecutor() as executor:
+    >>>     halts = list(executor.map(simulate, shots))
+
+    Notes
+    =====
+    - Pass quiet=True when simulating from several threads, since the terminal output
+      objects are shared between systems.
+    - Every cushion segment is checked for every ball, i.e. there is no broadphase.
+      On a single thread, the kernel is therefore slower than EvolveShotEventBased
+      for shots with many events: a rack break takes ~0.4s, compared to ~0.25s with
+      the event-based algorithm. The compiled algorithm pays off only when systems
+      are simulated in as many threads as there are cores. See
+      pooltool/tests/speed/compiled_threads.py.
+    - `max_wall_time`, `max_zeno_repeats` and `batch_tol` are not supported, and
+      raise a ConfigError. `stop_when` is applied only after the kernel has
+      finished. Use `max_events` to bound runaway simulations.
+    """
+
+    def __init__(self, *args, **kwargs):
+        EvolveShot.__init__(self, *args, **kwargs)
+
+    def evolution_algorithm(
+        self,
+        t_final=None,
+        continuize=False,
+        dt=None,
+        stop_when=None,
+        max_events=None,
+        max_sim_time=None,
+        **kwargs,
+    ):
+        """The compiled event-based evolution algorithm
+
+        Parameters
+        ==========
+        kwargs : **kwargs
+            See EvolveShotEventBased.evolution_algorithm and
+            EvolveShotEventBased.iter_evolution. Only `t_final`, `continuize`, `dt`,
+            `stop_when`, `max_events` and `max_sim_time` are supported. A ConfigError
+            is raised for any other keyword argument, e.g. `max_wall_time` or
+            `batch_tol`.
+        """
+
+        if kwargs:
+            raise ConfigError(
+                f"EvolveShotCompiled :: unsupported arguments: {', '.join(kwargs)}"
+            )
+
+        if dt is None:
+            dt = 0.01
+
+        balls = list(self.balls.values())
+        output = kernel.evolve_event_based(
+            *self.get_kernel_arrays(balls),
+            np.inf if t_final is None else float(t_final),
+            -1 if max_events is None else int(max_events),
+            np.inf if max_sim_time is None else float(max_sim_time),
+        )
+        num, status, t, rvw, s = output[:5]
+
+        for event in self.iter_kernel_events(balls, *output[5:], num):
+            if stop_when is not None and stop_when(event):
+                status = kernel.status_t_final
+                break
+        else:
+            for i, ball in enumerate(balls):
+                ball.set(rvw[i], s=int(s[i]), t=t)
+            self.t = t
+
+        for ball in balls:
+            ball.update_next_transition_event()
+
+        if status == kernel.status_done:
+            self.end_history()
+        elif status in (kernel.status_max_events, kernel.status_max_sim_time):
+            reason = (
+                "max_events" if status == kernel.status_max_events else "max_sim_time"
+            )
+            watchdog = Watchdog()
+            watchdog.num_events = num
+            self.halt = watchdog.halt(reason, self.t, self.events)
+            self.end_history()
+
+        if continuize:
+            self.continuize(dt=dt)
+
+    def get_kernel_arrays(self, balls):
+        """Returns the arrays of the system that the kernel operates on
+
+        The order of the returned arrays matches the positional arguments of
+        pooltool.kernel.evolve_event_based, from `rvw` to `include`
+        """
+
+        def array(values, dtype=np.float64):
+            return np.array(list(values), dtype=dtype)
+
+        linear = list(self.table.cushion_segments["linear"].values())
+        circular = list(self.table.cushion_segments["circular"].values())
+        pockets = list(self.table.pockets.values())
+
+        include = np.ones(6, dtype=np.bool_)
+        include[kind_ball_ball] = self.include.get(type_ball_ball, True)
+        include[kind_linear_cushion] = self.include.get(type_ball_cushion, True)
+        include[kind_circular_cushion] = self.include.get(type_ball_cushion, True)
+        include[kind_pocket] = self.include.get(type_ball_pocket, True)
+
+        return (
+            array((ball.rvw for ball in balls)).reshape(-1, 3, 3),
+            array((ball.s for ball in balls), np.int64),
+            float(self.t),
+            *(
+                array(getattr(ball, attr) for ball in balls)
+                for attr in ("R", "m", "u_s", "u_sp", "u_r", "g", "e_c", "f_c")
+            ),
+            array(x.lx for x in linear),
+            array(x.ly for x in linear),
+            array(x.l0 for x in linear),
+            array((x.p1 for x in linear)).reshape(-1, 3),
+            array((x.p2 for x in linear)).reshape(-1, 3),
+            array((x.direction for x in linear), np.int64),
+            array((x.normal for x in linear)).reshape(-1, 3),
+            array((x.center for x in circular)).reshape(-1, 3),
+            array(x.radius for x in circular),
+            array((x.center for x in pockets)).reshape(-1, 3),
+            array(x.radius for x in pockets),
+            array(x.depth for x in pockets),
+            include,
+        )
+
+    def iter_kernel_events(
+        self,
+        balls,
+        times,
+        kinds,
+        agents,
+        initial_rvw,
+        initial_s,
+        history_rvw,
+        history_s,
+        num,
+    ):
+        """Add the events computed by the kernel to the history, yielding each one
+
+        Whenever an event is yielded, the balls are in their states just after it and
+        the history is consistent up to and including it.
+        """
+        linear = list(self.table.cushion_segments["linear"].values())
+        circular = list(self.table.cushion_segments["circular"].values())
+        pockets = list(self.table.pockets.values())
+
+        def state(rvw, s):
+            return np.copy(rvw), int(s)
+
+        for k in range(num):
+            t, kind = float(times[k]), int(kinds[k])
+            i, j = int(agents[k, 0]), int(agents[k, 1])
+            ball = balls[i]
+
+            if kind == kind_transition:
+                start, end = int(initial_s[k, 0]), int(initial_s[k, 1])
+                event = transition_classes[(start, end)](ball, t=t)
+                event.agent_state_initial = state(initial_rvw[k, 0], start)
+                event.agent_state_final = state(history_rvw[k, i], end)
+            else:
+                if kind == kind_ball_ball:
+                    event = BallBallCollision(ball, balls[j], t=t)
+                elif kind == kind_linear_cushion:
+                    event = BallCushionCollision(ball, linear[j], t=t)
+                elif kind == kind_circular_cushion:
+                    event = BallCushionCollision(ball, circular[j], t=t)
+                else:
+                    event = BallPocketCollision(ball, pockets[j], t=t)
+
+                if self.include.get(event.event_type, True):
+                    event.agent1_state_initial = state(
+                        initial_rvw[k, 0], initial_s[k, 0]
                     )
-                )
+                    event.agent1_state_final = state(history_rvw[k, i], history_s[k, i])
+                    if kind == kind_ball_ball:
+                        event.agent2_state_initial = state(
+                            initial_rvw[k, 1], initial_s[k, 1]
+                        )
+                        event.agent2_state_final = state(
+                            history_rvw[k, j], history_s[k, j]
+                        )
+                    elif kind == kind_pocket:
+                        pockets[j].add(ball.id)
+
+            for n, other in enumerate(balls):
+                other.set(history_rvw[k, n], s=int(history_s[k, n]), t=t)
 
-        return events
+            self.update_history(event, update_all=True)
+
+            yield event
+
+
+transition_classes = {
+    (c.spinning, c.stationary): SpinningStationaryTransition,
+    (c.rolling, c.stationary): RollingStationaryTransition,
+    (c.rolling, c.spinning): RollingSpinningTransition,
+    (c.sliding, c.rolling): SlidingRollingTransition,
+}
 
 
 shot_evolver = {
     "event": EvolveShotEventBased,
     "discrete": EvolveShotDiscreteTime,
+    "hybrid": EvolveShotHybrid,
+    "compiled": EvolveShotCompiled,
 }
 
 
@@ -0,0 +1,405 @@
+#! /usr/bin/env python
+"""A compiled event-based simulation kernel that runs without the GIL
+
+The whole event loop of EvolveShotEventBased is implemented here as a single
+just-in-time compiled function operating on arrays. It is compiled with `nogil=True`,
+so simulations of different systems can run in parallel threads of one process (e.g.
+with a concurrent.futures.ThreadPoolExecutor). It holds no Python objects and touches
+no global mutable state.
+
+The kernel is driven by EvolveShotCompiled, which converts a system to arrays, runs the
+kernel, and rebuilds the events and histories from its output.
+"""
+
+import numpy as np
+from numba import jit
+
+import pooltool.constants as c
+import pooltool.physics as physics
+import pooltool.utils as utils
+
+# The kinds of events recorded by the kernel. These match the kind_* constants of
+# pooltool.evolution
+kind_none = 0
+kind_transition = 1
+kind_ball_ball = 2
+kind_linear_cushion = 3
+kind_circular_cushion = 4
+kind_pocket = 5
+
+# Why the kernel returned
+status_done = 0
+status_t_final = 1
+status_max_events = 2
+status_max_sim_time = 3
+
+
+@jit(nopython=True, cache=c.numba_cache)
+def get_next_transition(rvw, s, R, u_s, u_sp, u_r, g):
+    """Returns the time until a ball's next transition and the state it transitions to
+
+    (just-in-time compiled)
+
+    This mirrors Ball.update_next_transition_event
+    """
+    if s == c.stationary or s == c.pocketed:
+        return np.inf, s
+
+    if s == c.spinning:
+        return physics.get_spin_time_fast(rvw, R, u_sp, g), c.stationary
+
+    if s == c.rolling:
+        dtau_E_spin = physics.get_spin_time_fast(rvw, R, u_sp, g)
+        dtau_E_roll = physics.get_roll_time_fast(rvw, u_r, g)
+
+        if dtau_E_spin > dtau_E_roll:
+            return dtau_E_roll, c.spinning
+        else:
+            return dtau_E_roll, c.stationary
+
+    return physics.get_slide_time_fast(rvw, R, u_s, g), c.rolling
+
+
+@jit(nopython=True, cache=c.numba_cache)
+def _grow(a):
+    return np.concatenate((a, np.empty_like(a)))
+
+
+@jit(nopython=True, nogil=True, cache=c.numba_cache)
+def evolve_event_based(
+    rvw,
+    s,
+    t,
+    R,
+    m,
+    u_s,
+    u_sp,
+    u_r,
+    g,
+    e_c,
+    f_c,
+    linear_lx,
+    linear_ly,
+    linear_l0,
+    linear_p1,
+    linear_p2,
+    linear_direction,
+    linear_normal,
+    circular_center,
+    circular_radius,
+    pocket_center,
+    pocket_radius,
+    pocket_depth,
+    include,
+    t_final,
+    max_events,
+    max_sim_time,
+):
+    """Evolve a system of balls with the event-based algorithm
+
+    (just-in-time compiled, releases the GIL)
+
+    Events are predicted and resolved exactly like in EvolveShotEventBased, including
+    the order in which simultaneous candidates are preferred. All cushion segments are
+    considered for every ball, i.e. there is no broadphase.
+
+    Parameters
+    ==========
+    rvw : array, shape (n, 3, 3)
+        The initial ball states. Not modified.
+    s : array, shape (n,)
+        The initial ball motion states. Not modified.
+    t : float
+        The initial time
+    R, m, u_s, u_sp, u_r, g, e_c, f_c : array, shape (n,)
+        The ball parameters
+    linear_lx, linear_ly, linear_l0, linear_p1, linear_p2, linear_direction : array
+        The linear cushion segments. See
+        physics.get_ball_linear_cushion_collision_time_fast
+    linear_normal : array, shape (l, 3)
+        The normals of the linear cushion segments
+    circular_center, circular_radius : array, shape (c, 3) and (c,)
+        The circular cushion segments. The cushion height is the z-component of the
+        center
+    pocket_center, pocket_radius, pocket_depth : array, shape (p, 3), (p,), and (p,)
+        The pockets
+    include : array, shape (6,)
+        Whether events of each kind are resolved, indexed by kind
+    t_final, max_sim_time : float
+        Stop once the time reaches t_final, or halt once it exceeds max_sim_time. Pass
+        np.inf for no limit
+    max_events : int
+        Halt once more than this many events have occurred. Pass -1 for no limit
+
+    Returns
+    =======
+    output : tuple
+        (num, status, t, rvw, s, times, kinds, agents, initial_rvw, initial_s,
+        history_rvw, history_s), where num is the number of events, status is one of
+        the status_* constants of this module, and t, rvw and s are the final time and
+        ball states. The remaining arrays have one row per event (only the first num
+        rows are valid): its time, kind, the indices of its agents (see
+        EvolveShotEventBased.get_next_event_record), the states of the ball agents
+        just before the event, and the states of every ball just after it. For
+        transitions, the two motion states of initial_s are the start and end states
+        of the transition.
+    """
+    n = len(s)
+    rvw = rvw.copy()
+    s = s.copy()
+    mu = np.empty(n, dtype=np.float64)
+
+    # The time of each ball's next transition, and the states it is between
+    t_transition = np.empty(n, dtype=np.float64)
+    s_transition = np.empty((n, 2), dtype=np.int64)
+    for i in range(n):
+        dtau_E, s_transition[i, 1] = get_next_transition(
+            rvw[i], s[i], R[i], u_s[i], u_sp[i], u_r[i], g[i]
+        )
+        t_transition[i], s_transition[i, 0] = t + dtau_E, s[i]
+
+    num_circular, num_pockets = len(circular_radius), len(pocket_radius)
+    size = max(n * (n - 1) // 2, n * num_circular, n * num_pockets, 1)
+    coeffs = np.empty((size, 5), dtype=np.float64)
+    pairs = np.empty((size, 2), dtype=np.int64)
+
+    capacity = 64
+    times = np.empty(capacity, dtype=np.float64)
+    kinds = np.empty(capacity, dtype=np.int64)
+    agents = np.empty((capacity, 2), dtype=np.int64)
+    initial_rvw = np.empty((capacity, 2, 3, 3), dtype=np.float64)
+    initial_s = np.empty((capacity, 2), dtype=np.int64)
+    history_rvw = np.empty((capacity, n, 3, 3), dtype=np.float64)
+    history_s = np.empty((capacity, n), dtype=np.int64)
+
+    num = 0
+    status = status_done
+    while True:
+        for i in range(n):
+            mu[i] = u_s[i] if s[i] == c.sliding else u_r[i]
+
+        # Start by assuming next event doesn't happen
+        t_next, kind, a1, a2 = np.inf, kind_none, -1, -1
+
+        # Transitions. Among equal times, the ball with the highest index is preferred
+        t_min, index = np.inf, -1
+        for i in range(n):
+            if t_transition[i] <= t_min:
+                t_min, index = t_transition[i], i
+        if t_min < t_next:
+            t_next, kind, a1, a2 = t_min, kind_transition, index, -1
+
+        # Ball-ball collisions
+        k = 0
+        for i in range(n):
+            for j in range(i + 1, n):
+                if s[i] == c.pocketed or s[j] == c.pocketed:
+                    continue
+                if (s[i] == c.stationary or s[i] == c.spinning) and (
+                    s[j] == c.stationary or s[j] == c.spinning
+                ):
+                    continue
+
+                A, B, C, D, E = physics.get_ball_ball_collision_coeffs_fast(
+                    rvw[i],
+                    rvw[j],
+                    s[i],
+                    s[j],
+                    mu[i],
+                    mu[j],
+                    m[i],
+                    m[j],
+                    g[i],
+                    g[j],
+                    R[i],
+                )
+                coeffs[k, 0], coeffs[k, 1], coeffs[k, 2] = A, B, C
+                coeffs[k, 3], coeffs[k, 4] = D, E
+                pairs[k, 0], pairs[k, 1] = i, j
+                k += 1
+        if k:
+            dtau_E, index = utils.min_real_root_fast(coeffs[:k], c.tol)
+            if t + dtau_E < t_next:
+                t_next, kind = t + dtau_E, kind_ball_ball
+                a1, a2 = pairs[index, 0], pairs[index, 1]
+
+        # Ball-linear cushion collisions
+        t_min, i_min, j_min = np.inf, -1, -1
+        for i in range(n):
+            if s[i] != c.sliding and s[i] != c.rolling:
+                continue
+            for j in range(len(linear_lx)):
+                dtau_E = physics.get_ball_linear_cushion_collision_time_fast(
+                    rvw[i],
+                    s[i],
+                    linear_lx[j],
+                    linear_ly[j],
+                    linear_l0[j],
+                    linear_p1[j],
+                    linear_p2[j],
+                    linear_direction[j],
+                    mu[i],
+                    m[i],
+                    g[i],
+                    R[i],
+                )
+                if dtau_E < t_min:
+                    t_min, i_min, j_min = dtau_E, i, j
+        if t + t_min < t_next:
+            t_next, kind, a1, a2 = t + t_min, kind_linear_cushion, i_min, j_min
+
+        # Ball-circular cushion collisions
+        k = 0
+        for i in range(n):
+            if s[i] != c.sliding and s[i] != c.rolling:
+                continue
+            for j in range(num_circular):
+                A, B, C, D, E = physics.get_ball_circular_cushion_collision_coeffs_fast(
+                    rvw[i],
+                    s[i],
+                    circular_center[j, 0],
+                    circular_center[j, 1],
+                    circular_radius[j],
+                    mu[i],
+                    m[i],
+                    g[i],
+                    R[i],
+                )
+                coeffs[k, 0], coeffs[k, 1], coeffs[k, 2] = A, B, C
+                coeffs[k, 3], coeffs[k, 4] = D, E
+                pairs[k, 0], pairs[k, 1] = i, j
+                k += 1
+        if k:
+            dtau_E, index = utils.min_real_root_fast(coeffs[:k], c.tol)
+            if t + dtau_E < t_next:
+                t_next, kind = t + dtau_E, kind_circular_cushion
+                a1, a2 = pairs[index, 0], pairs[index, 1]
+
+        # Ball-pocket collisions
+        k = 0
+        for i in range(n):
+            if s[i] != c.sliding and s[i] != c.rolling:
+                continue
+            for j in range(num_pockets):
+                A, B, C, D, E = physics.get_ball_pocket_collision_coeffs_fast(
+                    rvw[i],
+                    s[i],
+                    pocket_center[j, 0],
+                    pocket_center[j, 1],
+                    pocket_radius[j],
+                    mu[i],
+                    m[i],
+                    g[i],
+                    R[i],
+                )
+                coeffs[k, 0], coeffs[k, 1], coeffs[k, 2] = A, B, C
+                coeffs[k, 3], coeffs[k, 4] = D, E
+                pairs[k, 0], pairs[k, 1] = i, j
+                k += 1
+        if k:
+            dtau_E, index = utils.min_real_root_fast(coeffs[:k], c.tol)
+            if t + dtau_E < t_next:
+                t_next, kind = t + dtau_E, kind_pocket
+                a1, a2 = pairs[index, 0], pairs[index, 1]
+
+        if t_next == np.inf:
+            break
+
+        # Evolve all balls to the time of the event
+        for i in range(n):
+            rvw[i], s[i] = physics.evolve_ball_motion(
+                s[i], rvw[i], R[i], m[i], u_s[i], u_sp[i], u_r[i], g[i], t_next - t
+            )
+        t = t_next
+
+        if num == capacity:
+            capacity *= 2
+            times, kinds, agents = _grow(times), _grow(kinds), _grow(agents)
+            initial_rvw, initial_s = _grow(initial_rvw), _grow(initial_s)
+            history_rvw, history_s = _grow(history_rvw), _grow(history_s)
+
+        times[num], kinds[num] = t, kind
+        agents[num, 0], agents[num, 1] = a1, a2
+        initial_rvw[num, 0], initial_s[num, 0] = rvw[a1], s[a1]
+        if kind == kind_transition:
+            # The states the transition was predicted between
+            initial_s[num] = s_transition[a1]
+        elif kind == kind_ball_ball:
+            initial_rvw[num, 1], initial_s[num, 1] = rvw[a2], s[a2]
+
+        # Resolve the event
+        if include[kind]:
+            if kind == kind_transition:
+                s[a1] = s_transition[a1, 1]
+            elif kind == kind_ball_ball:
+                rvw[a1], rvw[a2] = physics.resolve_ball_ball_collision_fast(
+                    rvw[a1], rvw[a2]
+                )
+                s[a1], s[a2] = c.sliding, c.sliding
+            elif kind == kind_linear_cushion:
+                rvw[a1] = physics.resolve_ball_cushion_collision_fast(
+                    rvw[a1],
+                    linear_normal[a2],
+                    R[a1],
+                    m[a1],
+                    linear_p1[a2, 2],
+                    e_c[a1],
+                    f_c[a1],
+                )
+                s[a1] = c.sliding
+            elif kind == kind_circular_cushion:
+                normal = utils.unit_vector_fast(rvw[a1, 0] - circular_center[a2])
+                normal[2] = 0
+                rvw[a1] = physics.resolve_ball_cushion_collision_fast(
+                    rvw[a1],
+                    normal,
+                    R[a1],
+                    m[a1],
+                    circular_center[a2, 2],
+                    e_c[a1],
+                    f_c[a1],
+                )
+                s[a1] = c.sliding
+            elif kind == kind_pocket:
+                rvw[a1] = 0
+                rvw[a1, 0, 0] = pocket_center[a2, 0]
+                rvw[a1, 0, 1] = pocket_center[a2, 1]
+                rvw[a1, 0, 2] = -pocket_depth[a2]
+                s[a1] = c.pocketed
+
+            for i in (a1, a2 if kind == kind_ball_ball else a1):
+                dtau_E, s_transition[i, 1] = get_next_transition(
+                    rvw[i], s[i], R[i], u_s[i], u_sp[i], u_r[i], g[i]
+                )
+                t_transition[i], s_transition[i, 0] = t + dtau_E, s[i]
+
+        history_rvw[num] = rvw
+        history_s[num] = s
+        num += 1
+
+        if t >= t_final:
+            status = status_t_final
+            break
+
+        if max_events >= 0 and num > max_events:
+            status = status_max_events
+            break
+
+        if t > max_sim_time:
+            status = status_max_sim_time
+            break
+
+    return (
+        num,
+        status,
+        t,
+        rvw,
+        s,
+        times,
+        kinds,
+        agents,
+        initial_rvw,
+        initial_s,
+        history_rvw,
+        history_s,
+    )
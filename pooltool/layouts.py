@@ -29,8 +29,10 @@ class Rack(ABC):
 class NineBallRack(Rack):
     """Arrange a list of balls into 9-ball break configuration"""
 
-    def __init__(self, table, spacing_factor=1e-3, ordered=False, **ball_kwargs):
-        self.balls = [Ball(str(i), **ball_kwargs) for i in range(1, 10)]
+    def __init__(
+        self, table, spacing_factor=1e-3, ordered=False, ball_class=Ball, **ball_kwargs
+    ):
+        self.balls = [ball_class(str(i), **ball_kwargs) for i in range(1, 10)]
         self.radius = max([ball.R for ball in self.balls])
         self.spacer = spacing_factor * self.radius
         self.eff_radius = self.radius + self.spacer + c.tol
@@ -40,7 +42,7 @@ class NineBallRack(Rack):
                 np.random.choice(self.balls, replace=False, size=len(self.balls))
             )
 
-        self.balls.append(Ball("cue", **ball_kwargs))
+        self.balls.append(ball_class("cue", **ball_kwargs))
         Rack.__init__(self, table)
 
     def wiggle(self, xyz):
@@ -83,8 +85,10 @@ class NineBallRack(Rack):
 class EightBallRack(Rack):
     """Arrange a list of balls into 8-ball break configuration"""
 
-    def __init__(self, table, spacing_factor=1e-3, ordered=False, **ball_kwargs):
-        self.balls = [Ball(str(i), **ball_kwargs) for i in range(1, 16)]
+    def __init__(
+        self, table, spacing_factor=1e-3, ordered=False, ball_class=Ball, **ball_kwargs
+    ):
+        self.balls = [ball_class(str(i), **ball_kwargs) for i in range(1, 16)]
         self.radius = max([ball.R for ball in self.balls])
         self.spacer = spacing_factor * self.radius
         self.eff_radius = self.radius + self.spacer + c.tol
@@ -94,7 +98,7 @@ class EightBallRack(Rack):
                 np.random.choice(self.balls, replace=False, size=len(self.balls))
             )
 
-        self.balls.append(Ball("cue", **ball_kwargs))
+        self.balls.append(ball_class("cue", **ball_kwargs))
         Rack.__init__(self, table)
 
     def wiggle(self, xyz):
@@ -141,11 +145,11 @@ class EightBallRack(Rack):
 
 
 class ThreeCushionRack(Rack):
-    def __init__(self, table, white_to_break=True, **ball_kwargs):
+    def __init__(self, table, white_to_break=True, ball_class=Ball, **ball_kwargs):
         self.balls = {
-            "white": Ball("white", **ball_kwargs),
-            "yellow": Ball("yellow", **ball_kwargs),
-            "red": Ball("red", **ball_kwargs),
+            "white": ball_class("white", **ball_kwargs),
+            "yellow": ball_class("yellow", **ball_kwargs),
+            "red": ball_class("red", **ball_kwargs),
         }
 
         self.white_to_break = white_to_break
@@ -10,6 +10,9 @@ import pooltool.constants as c
 class Object(object):
     object_type = None
 
+    # Allows subclasses to be defined with __slots__
+    __slots__ = ()
+
     def __init__(self):
         if self.object_type is None:
             raise NotImplementedError(
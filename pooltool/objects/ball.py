@@ -3,13 +3,6 @@
 from pathlib import Path
 
 import numpy as np
-from direct.interval.IntervalGlobal import (
-    LerpFunc,
-    LerpPosInterval,
-    LerpPosQuatInterval,
-    Parallel,
-    Sequence,
-)
 from panda3d.core import (
     CollisionCapsule,
     CollisionNode,
@@ -24,6 +17,7 @@ import pooltool.constants as c
 import pooltool.physics as physics
 import pooltool.utils as utils
 from pooltool.ani.globals import Global
+from pooltool.ani.playback import BallPlayback
 from pooltool.error import ConfigError
 from pooltool.events import (
     Events,
@@ -225,101 +219,12 @@ class BallRender(Render):
         self.set_render_state(rvw[0])
 
     def set_playback_sequence(self, playback_speed=1):
-        """Creates the sequence motions of the ball for a given playback speed"""
-        dts = np.diff(self.history_cts.t)
-        motion_states = self.history_cts.s
-        playback_dts = dts / playback_speed
-
-        # Get the trajectories
-        xyzs = self.history_cts.rvw[:, 0, :]
-        ws = self.history_cts.rvw[:, 2, :]
-
-        if (xyzs == xyzs[0, :]).all() and (ws == ws[0, :]).all():
-            # Ball has no motion. No need to create Lerp intervals
-            self.playback_sequence = Sequence()
-            self.quats = autils.as_quaternion(ws, self.history_cts.t)
-            return
-
-        xyzs = autils.get_list_of_Vec3s_from_array(xyzs)
-        self.quats = autils.as_quaternion(ws, self.history_cts.t)
-
-        # Init the animation sequences
-        ball_sequence = Sequence()
-        shadow_sequence = Sequence()
-        if ani.settings["graphics"]["angular_vectors"]:
-            angular_vector_sequence = Sequence()
-
-        self.set_render_state_from_history(0)
-
-        j = 0
-        energetic = False
-        for i in range(len(playback_dts)):
-            x, y, z = xyzs[i]
-            Qm, Qx, Qy, Qz = self.quats[i]
-
-            if not energetic and motion_states[i] in c.energetic:
-                # The ball wasn't energetic, but now it is
-                energetic = True
-                xi, yi, zi = xyzs[j]
-                Qmi, Qxi, Qyi, Qzi = self.quats[j]
-                dur = playback_dts[j:i].sum()
-
-                ball_sequence.append(
-                    LerpPosQuatInterval(
-                        nodePath=self.nodes["pos"],
-                        duration=dur,
-                        startPos=(xi, yi, zi),
-                        pos=(xi, yi, zi),
-                        startQuat=(Qmi, Qxi, Qyi, Qzi),
-                        quat=(Qmi, Qxi, Qyi, Qzi),
-                    )
-                )
-                shadow_sequence.append(
-                    LerpPosInterval(
-                        nodePath=self.nodes["shadow"],
-                        duration=dur,
-                        startPos=(xi, yi, min(0, zi - self.R)),
-                        pos=(xi, yi, min(0, zi - self.R)),
-                    )
-                )
-
-            if energetic:
-                ball_sequence.append(
-                    LerpPosQuatInterval(
-                        nodePath=self.nodes["pos"],
-                        duration=playback_dts[i],
-                        pos=(x, y, z),
-                        quat=(Qm, Qx, Qy, Qz),
-                    )
-                )
-                shadow_sequence.append(
-                    LerpPosInterval(
-                        nodePath=self.nodes["shadow"],
-                        duration=playback_dts[i],
-                        pos=(x, y, min(0, z - self.R)),
-                    )
-                )
-
-                if motion_states[i] not in c.energetic:
-                    # The ball was energetic, but now it is not
-                    energetic = False
-                    j = i
-
-            if ani.settings["graphics"]["angular_vectors"]:
-                angular_vector_sequence.append(
-                    LerpFunc(
-                        self.get_angular_vector,
-                        duration=playback_dts[i],
-                        extraArgs=[ws[i, :]],
-                    )
-                )
+        """Creates the playback interval of the ball for a given playback speed
 
-        self.playback_sequence = Parallel(
-            ball_sequence,
-            shadow_sequence,
-        )
-        if ani.settings["graphics"]["angular_vectors"]:
-            self.playback_sequence.append(angular_vector_sequence)
+        To play back several balls at once, prefer a single BallPlayback of all of them
+        (see SystemRender.init_shot_animation).
+        """
+        self.playback_sequence = BallPlayback([self], playback_speed=playback_speed)
 
     def set_alpha(self, alpha):
         self.get_node("pos").setTransparency(TransparencyAttrib.MAlpha)
@@ -375,6 +280,8 @@ class BallRender(Render):
 
 
 class BallHistory(object):
+    __slots__ = ("vectorized", "rvw", "s", "t")
+
     def __init__(self):
         self.vectorized = False
         self.reset()
@@ -404,6 +311,12 @@ class BallHistory(object):
         self.s.append(s)
         self.t.append(t)
 
+    def add_repeated(self, rvw, s, t, num):
+        """Add the same timepoint num times, e.g. once per event of a batch"""
+        self.rvw.extend([rvw] * num)
+        self.s.extend([s] * num)
+        self.t.extend([t] * num)
+
     def vectorize(self):
         """Convert all list objects in self.history to array objects
 
@@ -418,10 +331,66 @@ class BallHistory(object):
 
         self.vectorized = True
 
+    def devectorize(self):
+        """Convert all array objects in self.history back to list objects
+
+        Notes
+        =====
+        - Append operations work again
+        """
+
+        self.rvw = list(self.rvw)
+        self.s = list(self.s)
+        self.t = list(self.t)
+
+        self.vectorized = False
+
+    def truncate(self, n):
+        """Keep only the first n timepoints"""
+
+        if self.vectorized:
+            self.devectorize()
+
+        self.rvw = self.rvw[:n]
+        self.s = self.s[:n]
+        self.t = self.t[:n]
+
+
+class PhysicsBall(Object):
+    """A ball without any rendering or configuration concerns
+
+    This is the base class of Ball. It holds the ball's physical properties, state, and
+    history, and everything the shot evolution algorithms need, but skips the random
+    orientation and panda3d initialization of Ball. It is defined with __slots__, so
+    it is cheaper to construct and smaller in memory. Use it when creating many
+    systems that will never be visualized, e.g. in parameter sweeps or multiprocessing
+    workers.
+    """
 
-class Ball(Object, BallRender):
     object_type = "ball"
 
+    __slots__ = (
+        "id",
+        "m",
+        "R",
+        "I",
+        "g",
+        "u_s",
+        "u_r",
+        "u_sp",
+        "e_c",
+        "f_c",
+        "t",
+        "s",
+        "rvw",
+        "next_transition_event",
+        "history",
+        "history_cts",
+        "events",
+        "initial_orientation",
+        "rel_model_path",
+    )
+
     def __init__(
         self,
         ball_id,
@@ -477,11 +446,8 @@ class Ball(Object, BallRender):
 
         self.events = Events()
 
-        if initial_orientation is None:
-            self.initial_orientation = self.get_random_orientation()
-
+        self.initial_orientation = initial_orientation
         self.rel_model_path = rel_model_path
-        BallRender.__init__(self, rel_model_path=self.rel_model_path)
 
     def attach_history(self, history):
         """Sets self.history to an existing BallHistory object"""
@@ -566,9 +532,21 @@ class Ball(Object, BallRender):
         quat2 /= np.linalg.norm(quat2)
         return {"pos": quat1, "sphere": list(quat2)}
 
-    def as_dict(self):
-        """Return a pickle-able dictionary of the ball"""
-        return dict(
+    def as_dict(self, event_indices=None, history_cts=True, compress=False):
+        """Return a pickle-able dictionary of the ball
+
+        Parameters
+        ==========
+        event_indices : list of int, None
+            If given, the events of the ball are stored as these indices into the events
+            of its system, rather than as event dictionaries. See System.as_dict
+        history_cts : bool, True
+            If False, the continuous history is not stored. It can be rebuilt with
+            System.continuize
+        compress : bool, False
+            If True, the histories are losslessly compressed (see history_as_dict)
+        """
+        d = dict(
             id=self.id,
             m=self.m,
             R=self.R,
@@ -577,36 +555,103 @@ class Ball(Object, BallRender):
             u_s=self.u_s,
             u_r=self.u_r,
             u_sp=self.u_sp,
+            e_c=self.e_c,
+            f_c=self.f_c,
             s=self.s,
             t=self.t,
             rvw=np.copy(self.rvw),
-            rel_model_path=None
-            if self.rel_model_path is None
-            else str(self.rel_model_path),
-            history=dict(
-                rvw=self.history.rvw,
-                s=self.history.s,
-                t=self.history.t,
-                vectorized=self.history.vectorized,
-            ),
-            history_cts=dict(
-                rvw=self.history_cts.rvw,
-                s=self.history_cts.s,
-                t=self.history_cts.t,
-                vectorized=self.history_cts.vectorized,
+            rel_model_path=(
+                None if self.rel_model_path is None else str(self.rel_model_path)
             ),
-            events=self.events.as_dict(),
+            history=history_as_dict(self.history, compress=compress),
             initial_orientation=self.initial_orientation,
         )
 
+        if history_cts:
+            d["history_cts"] = history_as_dict(self.history_cts, compress=compress)
+
+        if event_indices is None:
+            d["events"] = self.events.as_dict()
+        else:
+            d["event_indices"] = event_indices
+
+        return d
+
     def save(self, path):
         utils.save_pickle(self.as_dict(), path)
 
 
+class Ball(PhysicsBall, BallRender):
+    def __init__(self, *args, **kwargs):
+        """Initialize a ball
+
+        Parameters
+        ==========
+        See PhysicsBall
+        """
+        PhysicsBall.__init__(self, *args, **kwargs)
+
+        if self.initial_orientation is None:
+            self.initial_orientation = self.get_random_orientation()
+
+        BallRender.__init__(self, rel_model_path=self.rel_model_path)
+
+
+def history_as_dict(history, compress=False):
+    """Return a pickle-able dictionary of a BallHistory
+
+    The states are stored as one array, whether or not the history is vectorized, since
+    a list of small arrays is far larger when pickled. The motion states and times of
+    a history that is not vectorized are stored as lists, which keeps their types.
+
+    Parameters
+    ==========
+    compress : bool, False
+        If True, the arrays are losslessly compressed (see utils.compress_array)
+    """
+    d = dict(vectorized=history.vectorized)
+    for attr in ("rvw", "s", "t"):
+        value = getattr(history, attr)
+        if attr == "rvw" or history.vectorized:
+            value = np.asarray(value)
+            if compress:
+                value = utils.compress_array(value)
+        else:
+            value = list(value)
+
+        d[attr] = value
+
+    return d
+
+
+def history_from_dict(d):
+    """Return a BallHistory from a dictionary
+
+    For dictionary form see return value of history_as_dict. Dictionaries of lists (as
+    stored by older versions) are supported too.
+    """
+    history = BallHistory()
+    history.vectorized = d.get("vectorized", False)
+
+    for attr in ("rvw", "s", "t"):
+        value = d.get(attr)
+        if isinstance(value, dict):
+            value = utils.decompress_array(value)
+
+        if isinstance(value, np.ndarray) and not history.vectorized:
+            value = list(value)
+
+        setattr(history, attr, value)
+
+    return history
+
+
 def ball_from_dict(d):
     """Return a ball object from a dictionary
 
-    For dictionary form see return value of Ball.as_dict
+    For dictionary form see return value of Ball.as_dict. If the events of the ball are
+    stored as indices into the events of its system, the events of the ball are left
+    empty (see System.from_dict).
     """
 
     try:
@@ -627,26 +672,19 @@ def ball_from_dict(d):
     ball.u_s = d["u_s"]
     ball.u_r = d["u_r"]
     ball.u_sp = d["u_sp"]
+    ball.e_c = d.get("e_c", c.e_c)
+    ball.f_c = d.get("f_c", c.f_c)
     ball.s = d["s"]
     ball.t = d["t"]
     ball.rvw = d["rvw"]
 
-    ball_history = BallHistory()
-    ball_history.rvw = d["history"]["rvw"]
-    ball_history.s = d["history"]["s"]
-    ball_history.t = d["history"]["t"]
-    ball_history.vectorized = d["history"]["vectorized"]
-    ball.attach_history(ball_history)
+    ball.attach_history(history_from_dict(d["history"]))
 
-    ball_history_cts = BallHistory()
-    ball_history_cts.rvw = d.get("history_cts", {}).get("rvw")
-    ball_history_cts.s = d.get("history_cts", {}).get("s")
-    ball_history_cts.t = d.get("history_cts", {}).get("t")
-    ball_history_cts.vectorized = d.get("history_cts", {}).get("vectorized", False)
-    ball.attach_history_cts(ball_history_cts)
+    if "history_cts" in d:
+        ball.attach_history_cts(history_from_dict(d["history_cts"]))
 
     events = Events()
-    for event_dict in d["events"]:
+    for event_dict in d.get("events", []):
         events.append(event_from_dict(event_dict))
     ball.events = events
 
@@ -277,9 +277,32 @@ class CueRender(Render):
         self.init_model()
 
 
-class Cue(Object, CueRender):
+class PhysicsCue(Object):
+    """A cue stick without any rendering concerns
+
+    This is the base class of Cue, and holds everything needed to strike a ball. It is
+    defined with __slots__ and skips the panda3d initialization of Cue, so it is
+    cheaper to construct. Use it for systems that will never be visualized.
+    """
+
     object_type = "cue_stick"
 
+    __slots__ = (
+        "id",
+        "M",
+        "length",
+        "tip_radius",
+        "butt_radius",
+        "brand",
+        "V0",
+        "phi",
+        "theta",
+        "a",
+        "b",
+        "cueing_ball",
+        "cueing_ball_id",
+    )
+
     def __init__(
         self,
         M=c.M,
@@ -311,8 +334,6 @@ class Cue(Object, CueRender):
 
         self.cueing_ball = cueing_ball
 
-        CueRender.__init__(self)
-
     def reset_state(self):
         self.set_state(V0=2, phi=0, theta=0, a=0, b=1 / 4)
 
@@ -488,6 +509,12 @@ class Cue(Object, CueRender):
         utils.save_pickle(self.as_dict(), path)
 
 
+class Cue(PhysicsCue, CueRender):
+    def __init__(self, *args, **kwargs):
+        PhysicsCue.__init__(self, *args, **kwargs)
+        CueRender.__init__(self)
+
+
 class CueAvoid:
     def __init__(self):
         """Calculates min elevation required to avoid colliding with balls and cushions
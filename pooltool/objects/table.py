@@ -1,5 +1,7 @@
 #! /usr/bin/env python
 
+from functools import lru_cache
+
 import numpy as np
 from panda3d.core import CollisionNode, CollisionPlane, LineSegs, Plane, Point3, Vec3
 
@@ -80,6 +82,9 @@ class TableRender(Render):
 
                 if ani.settings["graphics"]["debug"]:
                     collision_node.show()
+        elif self.object_type == "custom_table":
+            # Cue collisions are not modeled for arbitrary cushion layouts
+            return
         else:
             raise NotImplementedError(
                 f"TableRender.init_collisions :: has no routine for table type "
@@ -188,14 +193,97 @@ class TableRender(Render):
         )
 
 
+@lru_cache(maxsize=None)
+def _load_table_presets():
+    return ani.load_config("tables")
+
+
+def get_table_preset(model_name):
+    """Return the parameters of a preset table defined in the tables config
+
+    The config is read from disk once per session.
+    """
+    return dict(_load_table_presets()[model_name])
+
+
+# Table geometries are immutable once built, so tables with the same parameters share
+# them. Keyed by table parameters
+_geometry_cache = {}
+
+
 class Table(object):
+    # Allows subclasses to be defined with __slots__
+    __slots__ = ()
+
     def save(self, path):
         utils.save_pickle(self.as_dict(), path)
 
+    def get_geometry_key(self):
+        """Return a hashable key that uniquely identifies the table parameters"""
+        return tuple(self.as_dict().items())
+
+    def get_geometry(self):
+        """Return the TableGeometry of this table, built once per set of parameters"""
+        key = self.get_geometry_key()
+        if key not in _geometry_cache:
+            _geometry_cache[key] = TableGeometry(
+                key, self.get_cushion_segments(), self.get_pockets()
+            )
+
+        return _geometry_cache[key]
+
+    def get_cushion_segment_indices_near(self, ball, dt):
+        """Return the cushion segments that a ball could collide with within dt
+
+        By default all cushion segments are candidates. Tables with many segments
+        override this with a broadphase query (see CustomTable).
+
+        Returns
+        =======
+        output : (array or None, array or None)
+            The indices of the candidate linear cushion segments and circular cushion
+            segments, in the order of `cushion_segments`. None means all segments are
+            candidates.
+        """
+        return None, None
+
+
+class PhysicsPocketTable(Object, Table):
+    """A pocket table without any rendering concerns
+
+    This is the base class of PocketTable. It is defined with __slots__, skips the
+    panda3d initialization of PocketTable, and shares its cushion segments with other
+    tables of the same parameters. Use it for systems that will never be visualized.
+    """
 
-class PocketTable(Object, Table, TableRender):
     object_type = "pocket_table"
 
+    __slots__ = (
+        "w",
+        "l",
+        "cushion_width",
+        "cushion_height",
+        "corner_pocket_width",
+        "corner_pocket_angle",
+        "corner_pocket_depth",
+        "corner_pocket_radius",
+        "corner_jaw_radius",
+        "side_pocket_width",
+        "side_pocket_angle",
+        "side_pocket_depth",
+        "side_pocket_radius",
+        "side_jaw_radius",
+        "height",
+        "lights_height",
+        "has_model",
+        "model_name",
+        "type",
+        "center",
+        "geometry",
+        "cushion_segments",
+        "pockets",
+    )
+
     def __init__(
         self,
         w=None,
@@ -240,15 +328,14 @@ class PocketTable(Object, Table, TableRender):
         if self.model_name != "none":
             # User is passing a table with pre-existing parameters. All params
             # explicitly defined by this preset table will overwrite all other options
-            table_params = ani.load_config("tables")[self.model_name]
+            table_params = get_table_preset(self.model_name)
             for key, val in table_params.items():
                 setattr(self, key, val)
 
         self.center = (self.w / 2, self.l / 2)
-        self.cushion_segments = self.get_cushion_segments()
-        self.pockets = self.get_pockets()
-
-        TableRender.__init__(self, name=self.model_name, has_model=self.has_model)
+        self.geometry = self.get_geometry()
+        self.cushion_segments = self.geometry.get_cushion_segments()
+        self.pockets = self.geometry.get_pockets()
 
     def get_cushion_segments(self):
         # https://ekiefl.github.io/2020/12/20/pooltool-alg/#ball-cushion-collision-times
@@ -527,9 +614,38 @@ class PocketTable(Object, Table, TableRender):
         )
 
 
-class BilliardTable(Object, Table, TableRender):
+class PocketTable(PhysicsPocketTable, TableRender):
+    def __init__(self, *args, **kwargs):
+        PhysicsPocketTable.__init__(self, *args, **kwargs)
+        TableRender.__init__(self, name=self.model_name, has_model=self.has_model)
+
+
+class PhysicsBilliardTable(Object, Table):
+    """A billiard table without any rendering concerns
+
+    This is the base class of BilliardTable. It is defined with __slots__, skips the
+    panda3d initialization of BilliardTable, and shares its cushion segments with other
+    tables of the same parameters. Use it for systems that will never be visualized.
+    """
+
     object_type = "billiard_table"
 
+    __slots__ = (
+        "w",
+        "l",
+        "cushion_width",
+        "cushion_height",
+        "height",
+        "lights_height",
+        "has_model",
+        "model_name",
+        "type",
+        "center",
+        "geometry",
+        "cushion_segments",
+        "pockets",
+    )
+
     def __init__(
         self,
         w=None,
@@ -554,15 +670,14 @@ class BilliardTable(Object, Table, TableRender):
         if self.model_name != "none":
             # User is passing a table with pre-existing parameters. All params
             # explicitly defined by this preset table will overwrite all other options
-            table_params = ani.load_config("tables")[self.model_name]
+            table_params = get_table_preset(self.model_name)
             for key, val in table_params.items():
                 setattr(self, key, val)
 
         self.center = (self.w / 2, self.l / 2)
-        self.cushion_segments = self.get_cushion_segments()
-        self.pockets = {}
-
-        TableRender.__init__(self, name=self.model_name, has_model=self.has_model)
+        self.geometry = self.get_geometry()
+        self.cushion_segments = self.geometry.get_cushion_segments()
+        self.pockets = self.geometry.get_pockets()
 
     def get_cushion_segments(self):
         h = self.cushion_height
@@ -596,6 +711,9 @@ class BilliardTable(Object, Table, TableRender):
 
         return cushion_segments
 
+    def get_pockets(self):
+        return {}
+
     def as_dict(self):
         return dict(
             w=self.w,
@@ -610,6 +728,12 @@ class BilliardTable(Object, Table, TableRender):
         )
 
 
+class BilliardTable(PhysicsBilliardTable, TableRender):
+    def __init__(self, *args, **kwargs):
+        PhysicsBilliardTable.__init__(self, *args, **kwargs)
+        TableRender.__init__(self, name=self.model_name, has_model=self.has_model)
+
+
 class CushionSegment(Object):
     def get_normal(self, *args, **kwargs):
         return self.normal if hasattr(self, "normal") else None
@@ -669,6 +793,14 @@ class LinearCushionSegment(CushionSegment):
 
         self.direction = direction
 
+    def as_dict(self):
+        return dict(
+            cushion_id=self.id,
+            p1=tuple(self.p1),
+            p2=tuple(self.p2),
+            direction=self.direction,
+        )
+
 
 class CircularCushionSegment(CushionSegment):
     object_type = "circular_cushion_segment"
@@ -687,6 +819,13 @@ class CircularCushionSegment(CushionSegment):
         normal[2] = 0  # remove z-component
         return normal
 
+    def as_dict(self):
+        return dict(
+            cushion_id=self.id,
+            center=tuple(self.center),
+            radius=self.radius,
+        )
+
 
 class Pocket(object):
     object_type = "pocket"
@@ -709,10 +848,450 @@ class Pocket(object):
     def remove(self, ball_id):
         self.contains.remove(ball_id)
 
+    def as_dict(self):
+        return dict(
+            pocket_id=self.id,
+            center=tuple(self.center),
+            radius=self.radius,
+            depth=self.depth,
+        )
+
+
+class TableGeometry(object):
+    """The frozen, hashable geometry of a table as contiguous arrays
+
+    Each segment class (linear cushions, circular cushions, and pockets) is stored as a
+    set of arrays, where row i corresponds to the i-th ID in `linear_ids`,
+    `circular_ids`, or `pocket_ids`. This layout can be passed directly to compiled or
+    vectorized routines, rather than looping over segment objects.
+
+    Attributes
+    ==========
+    linear_ids : tuple of str
+        IDs of the linear cushion segments, e.g. '3_edge'
+    linear_p1, linear_p2 : array, shape (n, 3)
+        The start and end points of each linear cushion segment
+    linear_lx, linear_ly, linear_l0 : array, shape (n,)
+        The coefficients of each line, lx*x + ly*y + l0 = 0
+    linear_normal : array, shape (n, 3)
+        The normal of each line
+    linear_direction : array, shape (n,)
+        See LinearCushionSegment
+    circular_ids : tuple of str
+        IDs of the circular cushion segments
+    circular_center : array, shape (n, 3)
+    circular_radius : array, shape (n,)
+    pocket_ids : tuple of str
+        IDs of the pockets
+    pocket_center : array, shape (n, 3)
+    pocket_radius : array, shape (n,)
+    pocket_depth : array, shape (n,)
+
+    Notes
+    =====
+    - Geometries are built with Table.get_geometry, which memoizes them by table
+      parameters. Two tables with equal parameters share the same geometry.
+    - The arrays are read-only, and attributes cannot be set after construction.
+    """
+
+    __slots__ = (
+        "key",
+        "linear_ids",
+        "linear_p1",
+        "linear_p2",
+        "linear_lx",
+        "linear_ly",
+        "linear_l0",
+        "linear_normal",
+        "linear_direction",
+        "circular_ids",
+        "circular_center",
+        "circular_radius",
+        "pocket_ids",
+        "pocket_center",
+        "pocket_radius",
+        "pocket_depth",
+        "_cushion_segments",
+        "_hash",
+    )
+
+    def __init__(self, key, cushion_segments, pockets):
+        """Build the geometry from cushion segment and pocket objects
+
+        Parameters
+        ==========
+        key : tuple
+            The hashable table parameters that uniquely define this geometry
+        cushion_segments : dict
+            See the return value of PocketTable.get_cushion_segments
+        pockets : dict
+            See the return value of PocketTable.get_pockets
+        """
+        linear = list(cushion_segments["linear"].values())
+        circular = list(cushion_segments["circular"].values())
+        pockets = list(pockets.values())
+
+        def array(values, shape, dtype=np.float64):
+            arr = np.array(values, dtype=dtype).reshape(shape)
+            arr.flags.writeable = False
+            return arr
+
+        attrs = dict(
+            key=key,
+            linear_ids=tuple(cushion.id for cushion in linear),
+            linear_p1=array([x.p1 for x in linear], (-1, 3)),
+            linear_p2=array([x.p2 for x in linear], (-1, 3)),
+            linear_lx=array([x.lx for x in linear], (-1,)),
+            linear_ly=array([x.ly for x in linear], (-1,)),
+            linear_l0=array([x.l0 for x in linear], (-1,)),
+            linear_normal=array([x.normal for x in linear], (-1, 3)),
+            linear_direction=array([x.direction for x in linear], (-1,), np.int64),
+            circular_ids=tuple(cushion.id for cushion in circular),
+            circular_center=array([x.center for x in circular], (-1, 3)),
+            circular_radius=array([x.radius for x in circular], (-1,)),
+            pocket_ids=tuple(pocket.id for pocket in pockets),
+            pocket_center=array([x.center for x in pockets], (-1, 3)),
+            pocket_radius=array([x.radius for x in pockets], (-1,)),
+            pocket_depth=array([x.depth for x in pockets], (-1,)),
+            _cushion_segments=cushion_segments,
+            _hash=hash(key),
+        )
+
+        for attr, value in attrs.items():
+            object.__setattr__(self, attr, value)
+
+    def __setattr__(self, name, value):
+        raise AttributeError("TableGeometry is immutable")
+
+    def __hash__(self):
+        return self._hash
+
+    def __eq__(self, other):
+        if not isinstance(other, TableGeometry):
+            return NotImplemented
+        return self is other or self.key == other.key
+
+    def __reduce__(self):
+        return (
+            TableGeometry,
+            (self.key, self._cushion_segments, self.get_pockets()),
+        )
+
+    def get_cushion_segments(self):
+        """Return the cushion segment objects, keyed by segment type and ID
+
+        The segment objects are shared between tables with this geometry, but the
+        containing dictionaries are not, so they can be modified per table.
+        """
+        return {
+            segment_type: dict(segments)
+            for segment_type, segments in self._cushion_segments.items()
+        }
+
+    def get_pockets(self):
+        """Return new Pocket objects, keyed by pocket ID
+
+        Pockets hold state (the balls they contain), so unlike cushion segments they are
+        not shared between tables.
+        """
+        return {
+            pocket_id: Pocket(
+                pocket_id,
+                center=self.pocket_center[i],
+                radius=float(self.pocket_radius[i]),
+                depth=float(self.pocket_depth[i]),
+            )
+            for i, pocket_id in enumerate(self.pocket_ids)
+        }
+
+
+class SegmentGrid(object):
+    """A static uniform grid over the cushion segments of a table
+
+    Each cell stores the indices of the segments whose bounding boxes (expanded by
+    `margin`) overlap it. A ball's swept path over some time interval is then used to
+    look up only the segments near it, so the cost of predicting ball-cushion
+    collisions depends on the local segment density, not on the total segment count.
+
+    The cells are stored in compressed sparse row format, and looked up by
+    utils.query_grid_fast.
+
+    Parameters
+    ==========
+    geometry : TableGeometry
+        The geometry whose cushion segments are indexed
+    cell_size : float
+        The side length of each (square) cell
+    margin : float, 0
+        Segment bounding boxes are expanded by this much
+    """
+
+    def __init__(self, geometry, cell_size, margin=0):
+        if cell_size <= 0:
+            raise ConfigError("SegmentGrid :: cell_size must be positive")
+
+        self.cell_size = cell_size
+        self.num_linear = len(geometry.linear_p1)
+        self.num_circular = len(geometry.circular_radius)
+
+        linear_min = np.minimum(geometry.linear_p1, geometry.linear_p2)[:, :2] - margin
+        linear_max = np.maximum(geometry.linear_p1, geometry.linear_p2)[:, :2] + margin
+        radius = geometry.circular_radius[:, None] + margin
+        circular_min = geometry.circular_center[:, :2] - radius
+        circular_max = geometry.circular_center[:, :2] + radius
+
+        lo = self._cell(np.vstack([linear_min, circular_min, np.zeros((1, 2))]))
+        hi = self._cell(np.vstack([linear_max, circular_max, np.zeros((1, 2))]))
+        self.origin = lo.min(axis=0)
+        self.shape = hi.max(axis=0) - self.origin + 1
+
+        self.linear_cells = self._build(linear_min, linear_max)
+        self.circular_cells = self._build(circular_min, circular_max)
+
+        self._none = np.empty(0, dtype=np.int64)
+        self._all_linear = np.arange(self.num_linear, dtype=np.int64)
+        self._all_circular = np.arange(self.num_circular, dtype=np.int64)
+
+    def _cell(self, points):
+        return np.floor(points / self.cell_size).astype(np.int64)
+
+    def _build(self, bbox_min, bbox_max):
+        """Returns the (indptr, indices) of the segments in each cell"""
+        cells = [[] for _ in range(int(np.prod(self.shape)))]
+        lo = self._cell(bbox_min) - self.origin
+        hi = self._cell(bbox_max) - self.origin
+        for index in range(len(lo)):
+            for i in range(lo[index, 0], hi[index, 0] + 1):
+                for j in range(lo[index, 1], hi[index, 1] + 1):
+                    cells[i * self.shape[1] + j].append(index)
+
+        indptr = np.zeros(len(cells) + 1, dtype=np.int64)
+        indptr[1:] = np.cumsum([len(cell) for cell in cells])
+        indices = np.array([index for cell in cells for index in cell], dtype=np.int64)
+
+        return indptr, indices
+
+    def query_boxes(self, lo, hi):
+        """Return the indices of segments in cells overlapping any of some boxes
+
+        Parameters
+        ==========
+        lo, hi : array, shape (k, 2)
+            The lower and upper corners of the boxes
+
+        Returns
+        =======
+        output : (array, array)
+            The sorted indices of the linear and circular segments, respectively
+        """
+        args = (lo, hi, self.cell_size, self.origin, self.shape)
+
+        return (
+            utils.query_grid_fast(*args, *self.linear_cells, self.num_linear),
+            utils.query_grid_fast(*args, *self.circular_cells, self.num_circular),
+        )
+
+    def query_path_indices(self, rvw, s, mu, g, R, dt):
+        """Return the indices of the segments near the path of a ball
+
+        The path over the next dt seconds is a parabola (constant acceleration, valid
+        until the ball's next transition). It is split into pieces no longer than a
+        cell, and the cells overlapping the bounding box of each piece are queried.
+
+        Returns
+        =======
+        output : (array, array)
+            The sorted indices of the linear and circular cushion segments near the path
+        """
+        if s in c.nontranslating:
+            return self._none, self._none
+
+        if not np.isfinite(dt):
+            return self._all_linear, self._all_circular
+
+        v = rvw[1, :2]
+        if s == c.rolling:
+            u = v
+        else:
+            u = utils.get_rel_velocity_fast(rvw, R)[:2]
+        u_norm = np.linalg.norm(u)
+        a = -mu * g * u / u_norm if u_norm > 0 else np.zeros(2)
+        a_norm = mu * g
+
+        length = np.linalg.norm(v) * dt + 0.5 * a_norm * dt**2
+        num = max(1, int(np.ceil(length / self.cell_size)))
+        ts = np.linspace(0, dt, num + 1)[:, None]
+        positions = rvw[0, :2] + v * ts + 0.5 * a * ts**2
+
+        # The parabola deviates from each chord by at most a*h^2/8
+        h = dt / num
+        pad = R + a_norm * h**2 / 8 + c.tol
+
+        return self.query_boxes(
+            np.minimum(positions[:-1], positions[1:]) - pad,
+            np.maximum(positions[:-1], positions[1:]) + pad,
+        )
+
+
+# Broadphase grids are built once per geometry and cell size
+_grid_cache = {}
+
+
+class PhysicsCustomTable(Object, Table):
+    """A table with an arbitrary layout of cushion segments and pockets
+
+    This is the base class of CustomTable, and has no rendering concerns.
+
+    Parameters
+    ==========
+    linear_segments : list of LinearCushionSegment or dict
+        The linear cushion segments. Each may be passed either as a segment object or as
+        a dictionary of its constructor arguments (see LinearCushionSegment.as_dict)
+    circular_segments : list of CircularCushionSegment or dict
+        The circular cushion segments. See linear_segments
+    pockets : list of Pocket or dict
+        The pockets. See linear_segments
+    w, l : float, None
+        The width and length of the playing surface. If None, they are taken as the
+        maximum x and y coordinates of the segments, respectively
+    cell_size : float, None
+        The cell size of the broadphase grid. If None, 4 ball radii are used.
+
+    Notes
+    =====
+    - Segment IDs are used to rebind the agents of events after serialization, so they
+      must be unique.
+    - Ball-cushion collisions are only predicted for segments near each ball's path,
+      using a SegmentGrid, so tables with hundreds of segments remain fast to simulate.
+    """
+
+    object_type = "custom_table"
+
+    __slots__ = (
+        "w",
+        "l",
+        "height",
+        "lights_height",
+        "has_model",
+        "model_name",
+        "cell_size",
+        "center",
+        "geometry",
+        "grid",
+        "cushion_segments",
+        "pockets",
+        "_linear_segments",
+        "_circular_segments",
+        "_pockets",
+    )
+
+    def __init__(
+        self,
+        linear_segments=(),
+        circular_segments=(),
+        pockets=(),
+        w=None,
+        l=None,
+        height=None,
+        lights_height=None,
+        has_model=False,
+        model_name="none",
+        cell_size=None,
+    ):
+        def build(objs, cls):
+            return tuple(obj if isinstance(obj, cls) else cls(**obj) for obj in objs)
+
+        self._linear_segments = build(linear_segments, LinearCushionSegment)
+        self._circular_segments = build(circular_segments, CircularCushionSegment)
+        self._pockets = build(pockets, Pocket)
+
+        ids = [obj.id for obj in self._linear_segments + self._circular_segments]
+        if len(set(ids)) != len(ids):
+            raise ConfigError("CustomTable :: cushion segment IDs must be unique")
+
+        if w is None or l is None:
+            points = [np.zeros(3)]
+            points += [x.p1 for x in self._linear_segments]
+            points += [x.p2 for x in self._linear_segments]
+            points += [x.center for x in self._circular_segments]
+            max_x, max_y, _ = np.max(points, axis=0)
+
+        self.w = w or max_x
+        self.l = l or max_y
+        self.height = height or c.table_height  # for visualization
+        self.lights_height = lights_height or c.lights_height  # for visualization
+        self.has_model = has_model
+        self.model_name = model_name
+        self.cell_size = cell_size or 4 * c.R
+
+        self.center = (self.w / 2, self.l / 2)
+        self.geometry = self.get_geometry()
+        self.cushion_segments = self.geometry.get_cushion_segments()
+        self.pockets = self.geometry.get_pockets()
+
+        grid_key = (self.geometry, self.cell_size)
+        if grid_key not in _grid_cache:
+            _grid_cache[grid_key] = SegmentGrid(self.geometry, self.cell_size)
+        self.grid = _grid_cache[grid_key]
+
+    def get_cushion_segments(self):
+        return {
+            "linear": {x.id: x for x in self._linear_segments},
+            "circular": {x.id: x for x in self._circular_segments},
+        }
+
+    def get_pockets(self):
+        return {x.id: x for x in self._pockets}
+
+    def get_cushion_segment_indices_near(self, ball, dt):
+        return self.grid.query_path_indices(
+            ball.rvw,
+            ball.s,
+            ball.u_s if ball.s == c.sliding else ball.u_r,
+            ball.g,
+            ball.R,
+            dt,
+        )
+
+    def get_geometry_key(self):
+        d = self.as_dict()
+        for key in ("linear_segments", "circular_segments", "pockets"):
+            d[key] = tuple(tuple(x.items()) for x in d[key])
+        return tuple(d.items())
+
+    def as_dict(self):
+        return dict(
+            linear_segments=[x.as_dict() for x in self._linear_segments],
+            circular_segments=[x.as_dict() for x in self._circular_segments],
+            pockets=[x.as_dict() for x in self._pockets],
+            w=self.w,
+            l=self.l,
+            height=self.height,
+            lights_height=self.lights_height,
+            has_model=self.has_model,
+            model_name=self.model_name,
+            cell_size=self.cell_size,
+            table_type="custom",
+        )
+
+
+class CustomTable(PhysicsCustomTable, TableRender):
+    def __init__(self, *args, **kwargs):
+        PhysicsCustomTable.__init__(self, *args, **kwargs)
+        TableRender.__init__(self, name=self.model_name, has_model=self.has_model)
+
 
 table_types = {
     "pocket": PocketTable,
     "billiard": BilliardTable,
+    "custom": CustomTable,
+}
+
+# The tables of simulations that are never rendered
+physics_table_types = {
+    "pocket": PhysicsPocketTable,
+    "billiard": PhysicsBilliardTable,
+    "custom": PhysicsCustomTable,
 }
 
 
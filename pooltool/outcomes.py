@@ -0,0 +1,439 @@
+#! /usr/bin/env python
+"""Compact shot outcomes, and a queryable index of them
+
+The compact outcome of a simulated system (see get_outcome) is a small map of plain
+values, which can be sent over a socket or stored without the system itself.
+
+An OutcomeIndex stores features of compact outcomes in a SQLite database, so that shots
+can be found without loading them: the first ball hit by the cue ball, the cushions hit
+by each ball, the pocketed balls and their pockets, the final ball positions, the
+duration of the shot and its event counts.
+
+Tables
+======
+- shots: id, cueing_ball, first_hit, num_events, num_ball_ball, num_ball_cushion,
+  num_pocketed, duration, halt
+- balls: shot_id, ball_id, cushions, cushions_before_contact, pocketed, pocket, x, y, s
+
+`first_hit` is the first ball the cue ball hit (NULL if none). `cushions_before_contact`
+counts the cushions a ball hit before it first touched another ball.
+
+Examples
+========
+Shots where the cue ball hit three or more cushions before hitting the red ball first:
+
+>>> index = pt.OutcomeIndex('outcomes.sqlite')
+>>> ids = index.query(
+>>>     first_hit='red', balls={'cue': dict(cushions_before_contact=(3, None))}
+>>> )
+
+Breaks that pocketed exactly 2 balls, with the 8-ball in a corner pocket:
+
+>>> corners = ['lb', 'lt', 'rb', 'rt']
+>>> ids = index.query(num_pocketed=2, balls={'8': dict(pocket=corners)})
+
+Any SQL condition over the shots table can be given as well:
+
+>>> ids = index.query('duration > ? AND halt IS NULL', (10,))
+"""
+
+import collections
+import sqlite3
+from pathlib import Path
+
+import numpy as np
+
+import pooltool.constants as c
+from pooltool.error import ConfigError
+from pooltool.events import type_ball_ball, type_ball_cushion, type_ball_pocket
+
+__all__ = ["OutcomeIndex"]
+
+
+def get_final_state(ball):
+    """Returns the (rvw, s) of a ball at the end of its history
+
+    A ball without history is in its final state already.
+    """
+    if not len(ball.history.t):
+        return ball.rvw, ball.s
+
+    rvw, s, _ = ball.history.get_state(-1)
+    return np.asarray(rvw), s
+
+
+def get_outcome(shot):
+    """Returns the compact outcome of a simulated system
+
+    Besides the final state of each ball, the outcome holds features of the events:
+    the number of events of each type, the balls hit first by the cue ball, and for
+    each ball, the number of cushions it hit (in total, and before its first contact
+    with another ball) and the pocket it fell into.
+    """
+    cueing_ball = shot.cue.cueing_ball.id
+
+    first_hit = None
+    cushions = {ball_id: 0 for ball_id in shot.balls}
+    cushions_before_contact = {}
+    pockets = {}
+    event_counts = collections.Counter()
+
+    for event in shot.events:
+        event_counts[event.event_type] += 1
+
+        if event.event_type == type_ball_cushion:
+            cushions[event.agents[0].id] += 1
+        elif event.event_type == type_ball_pocket:
+            ball, pocket = event.agents
+            pockets[ball.id] = pocket.id
+        elif event.event_type == type_ball_ball:
+            ids = [agent.id for agent in event.agents]
+            for ball_id in ids:
+                cushions_before_contact.setdefault(ball_id, cushions[ball_id])
+            if first_hit is None and cueing_ball in ids:
+                first_hit = [ball_id for ball_id in ids if ball_id != cueing_ball]
+
+    # Loaded systems do not keep their simulation time
+    t = shot.t if shot.t is not None else shot.events[-1].time
+
+    # The balls themselves may have been reset, e.g. by System.save or by loading
+    final_states = {
+        ball_id: get_final_state(ball) for ball_id, ball in shot.balls.items()
+    }
+
+    return dict(
+        num_events=len(shot.events),
+        t=float(t),
+        halt=shot.halt.reason if shot.halt is not None else None,
+        cueing_ball=cueing_ball,
+        first_hit=first_hit or [],
+        pocketed=[
+            ball_id for ball_id, (rvw, s) in final_states.items() if s == c.pocketed
+        ],
+        balls={
+            ball_id: [float(rvw[0, 0]), float(rvw[0, 1]), int(s)]
+            for ball_id, (rvw, s) in final_states.items()
+        },
+        events=dict(event_counts),
+        cushions=cushions,
+        cushions_before_contact={
+            ball_id: cushions_before_contact.get(ball_id, n)
+            for ball_id, n in cushions.items()
+        },
+        pockets=pockets,
+    )
+
+
+def get_trajectories(shot):
+    """Returns the history of each ball of a simulated system, as lists
+
+    If the system was continuized, the continuous history is returned.
+    """
+    trajectories = {}
+    for ball_id, ball in shot.balls.items():
+        history = ball.history_cts if shot.continuized else ball.history
+        trajectories[ball_id] = dict(
+            t=np.asarray(history.t, dtype=np.float64).tolist(),
+            s=np.asarray(history.s, dtype=np.float64).astype(int).tolist(),
+            rvw=np.asarray(history.rvw, dtype=np.float64).tolist(),
+        )
+
+    return trajectories
+
+
+shot_columns = {
+    "cueing_ball": "TEXT",
+    "first_hit": "TEXT",
+    "num_events": "INTEGER",
+    "num_ball_ball": "INTEGER",
+    "num_ball_cushion": "INTEGER",
+    "num_pocketed": "INTEGER",
+    "duration": "REAL",
+    "halt": "TEXT",
+}
+
+ball_columns = {
+    "cushions": "INTEGER",
+    "cushions_before_contact": "INTEGER",
+    "pocketed": "INTEGER",
+    "pocket": "TEXT",
+    "x": "REAL",
+    "y": "REAL",
+    "s": "INTEGER",
+}
+
+schema = f"""
+CREATE TABLE IF NOT EXISTS shots (
+    id PRIMARY KEY,
+    {", ".join(f"{name} {kind}" for name, kind in shot_columns.items())}
+);
+CREATE TABLE IF NOT EXISTS balls (
+    shot_id NOT NULL REFERENCES shots (id) ON DELETE CASCADE,
+    ball_id TEXT NOT NULL,
+    {", ".join(f"{name} {kind}" for name, kind in ball_columns.items())},
+    PRIMARY KEY (shot_id, ball_id)
+);
+CREATE INDEX IF NOT EXISTS shots_first_hit ON shots (first_hit);
+CREATE INDEX IF NOT EXISTS shots_num_pocketed ON shots (num_pocketed);
+CREATE INDEX IF NOT EXISTS balls_cushions ON balls (ball_id, cushions_before_contact);
+CREATE INDEX IF NOT EXISTS balls_pocket ON balls (ball_id, pocket);
+"""
+
+
+def get_features(outcome):
+    """Returns the rows of a compact outcome: (shot row, list of ball rows)
+
+    Outcomes without event features (e.g. made by an older pooltool) leave their
+    columns NULL.
+    """
+    events = outcome.get("events", {})
+    cushions = outcome.get("cushions", {})
+    cushions_before_contact = outcome.get("cushions_before_contact", {})
+    pockets = outcome.get("pockets", {})
+    pocketed = set(outcome.get("pocketed", []))
+
+    first_hit = outcome.get("first_hit")
+    shot = dict(
+        cueing_ball=outcome.get("cueing_ball"),
+        first_hit=str(first_hit[0]) if first_hit else None,
+        num_events=outcome.get("num_events"),
+        num_ball_ball=events.get("ball-ball"),
+        num_ball_cushion=events.get("ball-cushion"),
+        num_pocketed=len(pocketed) if "pocketed" in outcome else None,
+        duration=outcome.get("t"),
+        halt=outcome.get("halt"),
+    )
+
+    balls = []
+    for ball_id, (x, y, s) in outcome.get("balls", {}).items():
+        balls.append(
+            dict(
+                ball_id=str(ball_id),
+                cushions=cushions.get(ball_id),
+                cushions_before_contact=cushions_before_contact.get(ball_id),
+                pocketed=int(ball_id in pocketed),
+                pocket=pockets.get(ball_id),
+                x=x,
+                y=y,
+                s=s,
+            )
+        )
+
+    return shot, balls
+
+
+def get_condition(column, value):
+    """Returns the SQL condition and parameters of a filter on a column
+
+    A value of None matches NULL, a (min, max) tuple matches an inclusive range (either
+    bound may be None), a list or set matches any of its values, and any other value
+    matches itself.
+    """
+    if value is None:
+        return f"{column} IS NULL", []
+
+    if isinstance(value, tuple):
+        if len(value) != 2:
+            raise ConfigError(f"OutcomeIndex :: Range of '{column}' must be (min, max)")
+
+        conditions, params = [], []
+        for operator, bound in zip((">=", "<="), value):
+            if bound is not None:
+                conditions.append(f"{column} {operator} ?")
+                params.append(bound)
+
+        return " AND ".join(conditions) or "1", params
+
+    if isinstance(value, (list, set, frozenset)):
+        value = list(value)
+        return f"{column} IN ({', '.join('?' * len(value))})", value
+
+    return f"{column} = ?", [value]
+
+
+class OutcomeIndex(object):
+    def __init__(self, path):
+        """A SQLite index of shot outcomes
+
+        Several processes may add to the same index at once.
+
+        Parameters
+        ==========
+        path : str or pathlib.Path
+            The database file. It is created if needed.
+        """
+        self.path = Path(path)
+
+        self.connection = sqlite3.connect(self.path, timeout=60)
+        self.connection.execute("PRAGMA foreign_keys = ON")
+        with self.connection:
+            # Readers do not block writers, and commits do not wait on the disk
+            self.connection.execute("PRAGMA journal_mode = WAL")
+            self.connection.execute("PRAGMA synchronous = NORMAL")
+            self.connection.executescript(schema)
+
+    def add(self, outcome, shot_id=None):
+        """Add, or replace, the features of a compact outcome
+
+        Parameters
+        ==========
+        outcome : dict
+            See get_outcome
+        shot_id : str or int, None
+            The id of the shot. If None, the id of the outcome is used.
+        """
+        self.add_many([outcome], [shot_id])
+
+    def add_many(self, outcomes, shot_ids=None):
+        """Add many outcomes in one transaction, which is much faster. See `add`"""
+        if shot_ids is None:
+            shot_ids = [None] * len(outcomes)
+
+        with self.connection:
+            for outcome, shot_id in zip(outcomes, shot_ids):
+                if shot_id is None:
+                    shot_id = outcome.get("id")
+                if shot_id is None:
+                    raise ConfigError("OutcomeIndex :: An outcome needs an id")
+
+                shot, balls = get_features(outcome)
+
+                self.connection.execute("DELETE FROM shots WHERE id = ?", (shot_id,))
+                self.connection.execute(
+                    f"INSERT INTO shots (id, {', '.join(shot)}) "
+                    f"VALUES (?, {', '.join('?' * len(shot))})",
+                    (shot_id, *shot.values()),
+                )
+                self.connection.executemany(
+                    f"INSERT INTO balls (shot_id, {', '.join(ball_columns)}, ball_id) "
+                    f"VALUES (?, {', '.join('?' * (len(ball_columns) + 1))})",
+                    [
+                        (
+                            shot_id,
+                            *[ball[name] for name in ball_columns],
+                            ball["ball_id"],
+                        )
+                        for ball in balls
+                    ],
+                )
+
+    def add_shot(self, shot, shot_id):
+        """Add the outcome of a simulated system"""
+        self.add(get_outcome(shot), shot_id)
+
+    def get_where(self, where=None, params=(), balls=None, **filters):
+        conditions, all_params = [], []
+
+        if where is not None:
+            conditions.append(f"({where})")
+            all_params.extend(params)
+
+        for column, value in filters.items():
+            if column not in shot_columns and column != "id":
+                raise ConfigError(f"OutcomeIndex :: Unknown shot feature '{column}'")
+
+            condition, condition_params = get_condition(column, value)
+            conditions.append(condition)
+            all_params.extend(condition_params)
+
+        for ball_id, ball_filters in (balls or {}).items():
+            ball_conditions, ball_params = ["ball_id = ?"], [str(ball_id)]
+            for column, value in ball_filters.items():
+                if column not in ball_columns:
+                    raise ConfigError(
+                        f"OutcomeIndex :: Unknown ball feature '{column}'"
+                    )
+
+                condition, condition_params = get_condition(column, value)
+                ball_conditions.append(condition)
+                ball_params.extend(condition_params)
+
+            conditions.append(
+                "id IN (SELECT shot_id FROM balls WHERE "
+                f"{' AND '.join(ball_conditions)})"
+            )
+            all_params.extend(ball_params)
+
+        return " AND ".join(conditions) or "1", all_params
+
+    def query(self, where=None, params=(), balls=None, limit=None, **filters):
+        """Returns the ids of the shots that match all the given conditions
+
+        Parameters
+        ==========
+        where : str, None
+            A SQL condition over the columns of the shots table
+        params : sequence, ()
+            The parameters of the placeholders in `where`
+        balls : dict, None
+            Filters on the features of balls, keyed by ball id. E.g. {'8':
+            dict(pocketed=1)} matches shots where the 8-ball was pocketed.
+        limit : int, None
+            Return at most this many ids
+        filters : **kwargs
+            Filters on the features of shots. See get_condition for the values.
+
+        Returns
+        =======
+        output : list
+            The ids of the matching shots, in the order they were added. Load them with
+            e.g. ShotDataset.get.
+        """
+        where, params = self.get_where(where, params, balls, **filters)
+
+        sql = f"SELECT id FROM shots WHERE {where} ORDER BY rowid"
+        if limit is not None:
+            sql += f" LIMIT {int(limit)}"
+
+        return [row[0] for row in self.connection.execute(sql, params)]
+
+    def count(self, where=None, params=(), balls=None, **filters):
+        """Returns the number of shots that match the given conditions. See `query`"""
+        where, params = self.get_where(where, params, balls, **filters)
+        return self.connection.execute(
+            f"SELECT COUNT(*) FROM shots WHERE {where}", params
+        ).fetchone()[0]
+
+    def get(self, shot_id):
+        """Returns the features of a shot: a dict of its shot features and its balls"""
+        self.connection.row_factory = sqlite3.Row
+        try:
+            shot = self.connection.execute(
+                "SELECT * FROM shots WHERE id = ?", (shot_id,)
+            ).fetchone()
+            if shot is None:
+                raise KeyError(shot_id)
+
+            balls = self.connection.execute(
+                "SELECT * FROM balls WHERE shot_id = ?", (shot_id,)
+            ).fetchall()
+        finally:
+            self.connection.row_factory = None
+
+        features = dict(shot)
+        features["balls"] = {
+            ball["ball_id"]: {name: ball[name] for name in ball_columns}
+            for ball in balls
+        }
+
+        return features
+
+    def __len__(self):
+        return self.connection.execute("SELECT COUNT(*) FROM shots").fetchone()[0]
+
+    def __contains__(self, shot_id):
+        return (
+            self.connection.execute(
+                "SELECT 1 FROM shots WHERE id = ?", (shot_id,)
+            ).fetchone()
+            is not None
+        )
+
+    def close(self):
+        self.connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
@@ -0,0 +1,648 @@
+#! /usr/bin/env python
+"""A pool of pre-warmed worker processes
+
+Starting a worker process that simulates shots is expensive: it imports pooltool
+(including Panda3D) and loads or compiles every just-in-time compiled function (see
+pooltool.warmup). A WorkerPool pays this cost once, in a template process. The workers
+are forked from the template, so they start with pooltool imported, the compiled code
+loaded, and the table geometries built, all shared copy-on-write.
+
+The template also supervises the workers. A worker that has run `max_tasks` tasks, or
+whose memory usage exceeds `max_memory`, exits after finishing its task and is replaced
+by a fresh fork of the template. Workers are replaced until they have taken the
+sentinels queued by WorkerPool.close, so closing a pool still runs every submitted task.
+
+Examples
+========
+>>> with pt.WorkerPool(processes=8, max_tasks=1000) as pool:
+>>>     futures = [pool.simulate(shot) for shot in shots]
+>>>     shots = [future.result() for future in futures]
+"""
+
+import atexit
+import multiprocessing
+import multiprocessing.connection
+import os
+import queue
+import signal
+import sys
+import threading
+from concurrent.futures import CancelledError, Future
+from multiprocessing.reduction import ForkingPickler
+
+from pooltool.error import ConfigError, WorkerError
+
+__all__ = ["WorkerPool", "load_simulated_shot", "simulate_shot"]
+
+# The exit code of a worker that retires after `max_tasks` tasks or `max_memory` bytes.
+# A worker that takes a sentinel exits with 0.
+retired_exit_code = 75
+
+
+def simulate_shot(d, **kwargs):
+    """Simulate a system stored as a dictionary
+
+    Systems are exchanged with workers as dictionaries (see System.as_dict).
+
+    Parameters
+    ==========
+    d : dict
+        A system, as returned by System.as_dict
+    kwargs : **kwargs
+        Passed to System.simulate
+
+    Returns
+    =======
+    output : dict
+        The simulated system (`system`), as returned by System.as_dict, and its
+        SimulationHalt (`halt`), as returned by SimulationHalt.as_dict, or None if the
+        simulation was not halted. See load_simulated_shot
+    """
+    from pooltool.system import System
+
+    shot = System(d=d)
+    halt = shot.simulate(quiet=True, **kwargs)
+
+    return dict(
+        system=shot.as_dict(),
+        halt=None if halt is None else halt.as_dict(shot.events),
+    )
+
+
+def load_simulated_shot(shot, result):
+    """Load the result of simulate_shot into a system
+
+    Returns
+    =======
+    output : SimulationHalt or None
+        The halt of the simulation, which is also stored as `shot.halt`
+    """
+    from pooltool.evolution import halt_from_dict
+
+    shot.load_from_dict(result["system"])
+    halt = result["halt"]
+    shot.halt = None if halt is None else halt_from_dict(halt, shot.events)
+
+    return shot.halt
+
+
+def get_memory_usage():
+    """Returns the resident memory of this process, in bytes
+
+    Where /proc is not available, the peak resident memory is returned instead
+    """
+    try:
+        with open("/proc/self/statm") as statm:
+            return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        import resource
+
+        max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+        # ru_maxrss is in kilobytes on Linux, but in bytes on macOS
+        return max_rss if sys.platform == "darwin" else max_rss * 1024
+
+
+class _Channel(object):
+    """Messages from the template and workers to the pool, like a SimpleQueue
+
+    Unlike a SimpleQueue, its reader can be waited on along with other connections
+    (see WorkerPool.terminate).
+    """
+
+    def __init__(self, ctx):
+        self.reader, self.writer = ctx.Pipe(duplex=False)
+        self.lock = ctx.Lock()
+
+    def put(self, message):
+        data = ForkingPickler.dumps(message)
+        with self.lock:
+            self.writer.send_bytes(data)
+
+    def get(self):
+        return ForkingPickler.loads(self.reader.recv_bytes())
+
+
+class TaskCancelled(BaseException):
+    """Raised in a worker when its task is cancelled (see WorkerPool.cancel)
+
+    Like KeyboardInterrupt, it is not an Exception, so that it is not caught by the
+    task.
+    """
+
+    pass
+
+
+# The task a worker is running, and the shared array in which the pool writes, at the
+# worker's slot, the id of the task it cancels (see WorkerPool.cancel)
+_worker_state = dict(task_id=None, slot=None, cancel_requests=None)
+
+
+def _cancel_task(signum, frame):
+    # A signal sent to cancel a task that has since finished, and that is delivered
+    # while the worker runs a later task, is ignored
+    cancel_requests, slot = _worker_state["cancel_requests"], _worker_state["slot"]
+    if cancel_requests[slot] == _worker_state["task_id"]:
+        raise TaskCancelled()
+
+
+def _put(results, message):
+    # A worker may be interrupted while it is writing to the queue, which would leave
+    # the queue locked. The cancel signal is deferred until the message is written.
+    signal.pthread_sigmask(signal.SIG_BLOCK, [signal.SIGUSR1])
+    try:
+        results.put(message)
+    except Exception as e:
+        # The result or exception cannot be pickled
+        results.put(("error", message[1], WorkerError(f"{e.__class__.__name__}: {e}")))
+
+
+def _worker(tasks, results, cancel_requests, slot, max_tasks, max_memory):
+    pid = os.getpid()
+    num_tasks = 0
+
+    _worker_state.update(slot=slot, cancel_requests=cancel_requests)
+
+    signal.signal(signal.SIGUSR1, signal.SIG_IGN)
+
+    while True:
+        task = tasks.get()
+        if task is None:
+            break
+
+        task_id, func, args, kwargs = task
+        _worker_state["task_id"] = task_id
+        _put(results, ("started", task_id, (pid, slot)))
+
+        signal.signal(signal.SIGUSR1, _cancel_task)
+        try:
+            # A cancel signal received since the task started is delivered here
+            signal.pthread_sigmask(signal.SIG_UNBLOCK, [signal.SIGUSR1])
+            result = ("done", task_id, func(*args, **kwargs))
+        except Exception as e:
+            result = ("error", task_id, e)
+        except TaskCancelled:
+            result = ("cancelled", task_id, None)
+        finally:
+            signal.signal(signal.SIGUSR1, signal.SIG_IGN)
+
+        _put(results, result)
+
+        num_tasks += 1
+        if max_tasks is not None and num_tasks >= max_tasks:
+            sys.exit(retired_exit_code)
+        if max_memory is not None and get_memory_usage() > max_memory:
+            sys.exit(retired_exit_code)
+
+
+def _template(
+    tasks,
+    results,
+    cancel_requests,
+    stop,
+    processes,
+    max_tasks,
+    max_memory,
+    warmup,
+    tables,
+    initializer,
+    initargs,
+):
+    import pooltool  # noqa: F401
+
+    if warmup:
+        from pooltool.warmup import warmup as warmup_all
+
+        warmup_all()
+
+    for table in tables:
+        table.get_geometry()
+
+    if initializer is not None:
+        initializer(*initargs)
+
+    fork = multiprocessing.get_context(
+        "fork" if "fork" in multiprocessing.get_all_start_methods() else "spawn"
+    )
+
+    def start(slot):
+        worker = fork.Process(
+            target=_worker,
+            args=(tasks, results, cancel_requests, slot, max_tasks, max_memory),
+            daemon=True,
+        )
+        worker.start()
+        results.put(("started_worker", worker.pid, slot))
+        return worker
+
+    # Each worker has a slot, which its replacement inherits
+    workers = {slot: start(slot) for slot in range(processes)}
+    results.put(("ready", None, None))
+
+    parent = multiprocessing.parent_process()
+    while workers:
+        multiprocessing.connection.wait(
+            [parent.sentinel] + [worker.sentinel for worker in workers.values()]
+        )
+
+        if not parent.is_alive():
+            # Nobody is left to submit tasks or close the pool
+            for worker in workers.values():
+                worker.kill()
+            return
+
+        for slot, worker in list(workers.items()):
+            if worker.is_alive():
+                continue
+
+            worker.join()
+            del workers[slot]
+
+            results.put(("exited", worker.pid, worker.exitcode))
+
+            # A worker that took a sentinel is done. Any other worker is replaced,
+            # even once the pool is closing, since tasks may be queued before the
+            # sentinels. Only terminating the pool stops the replacements.
+            if worker.exitcode != 0 and not stop.is_set():
+                workers[slot] = start(slot)
+
+    results.put(("closed", None, None))
+
+
+class WorkerPool(object):
+    def __init__(
+        self,
+        processes=None,
+        max_tasks=None,
+        max_memory=None,
+        warmup=True,
+        tables=None,
+        start_method=None,
+        initializer=None,
+        initargs=(),
+    ):
+        """A pool of worker processes forked from a pre-warmed template process
+
+        Parameters
+        ==========
+        processes : int, None
+            The number of workers. If None, the number of CPUs is used.
+        max_tasks : int, None
+            Each worker is replaced after running this many tasks. If None, workers are
+            never replaced for this reason.
+        max_memory : int, None
+            A worker is replaced after a task if its resident memory exceeds this many
+            bytes (see get_memory_usage). If None, workers are never replaced for this
+            reason.
+        warmup : bool, True
+            If True, every just-in-time compiled function is loaded (or compiled) in the
+            template process, so that workers never compile. See pooltool.warmup.
+        tables : list of pooltool.objects.table.Table, None
+            The geometries of these tables are built in the template process, and
+            shared with the workers.
+        start_method : str, None
+            How the template process is started. By default, 'forkserver' if available,
+            otherwise 'spawn'. The workers are always forked from the template where
+            possible.
+        initializer : callable, None
+            If not None, initializer(*initargs) is called in the template process
+            after the warmup. Whatever it loads is shared with the workers.
+        initargs : tuple, ()
+            See `initializer`
+        """
+        if start_method is None:
+            methods = multiprocessing.get_all_start_methods()
+            start_method = "forkserver" if "forkserver" in methods else "spawn"
+
+        self.processes = processes or os.cpu_count() or 1
+        self.ctx = multiprocessing.get_context(start_method)
+
+        self._tasks = self.ctx.SimpleQueue()
+        self._results = _Channel(self.ctx)
+
+        # Wakes up the collector when the pool is terminated
+        self._wakeup_reader, self._wakeup_writer = multiprocessing.Pipe(duplex=False)
+        self._stop = self.ctx.Event()
+
+        # The id of the task last cancelled in each worker slot (see cancel)
+        self._cancel_requests = self.ctx.Array("q", [-1] * self.processes, lock=False)
+        self._slots = {}
+
+        self._futures = {}
+        self._running = {}
+        self._next_id = 0
+        self._lock = threading.Lock()
+        self._closed = False
+        self._ready = threading.Event()
+        self.worker_pids = set()
+
+        # Tasks are fed to the workers from a thread, so that submit never blocks
+        self._pending = queue.Queue()
+
+        self._template = self.ctx.Process(
+            target=_template,
+            args=(
+                self._tasks,
+                self._results,
+                self._cancel_requests,
+                self._stop,
+                self.processes,
+                max_tasks,
+                max_memory,
+                warmup,
+                list(tables or []),
+                initializer,
+                initargs,
+            ),
+        )
+        self._template.start()
+
+        # The template is not a daemon, since it has children. It is stopped at exit,
+        # unless the pool was closed. Closing unregisters this, so that the pool can be
+        # garbage collected.
+        atexit.register(self._terminate_at_exit)
+
+        self._collector = threading.Thread(target=self._collect, daemon=True)
+        self._collector.start()
+        self._feeder = threading.Thread(target=self._feed, daemon=True)
+        self._feeder.start()
+
+    def _feed(self):
+        num_sentinels = 0
+        while num_sentinels < self.processes:
+            task = self._pending.get()
+            self._tasks.put(task)
+            if task is None:
+                num_sentinels += 1
+
+    def _collect(self):
+        """Dispatch the messages of the template and workers to the futures"""
+        while True:
+            ready = multiprocessing.connection.wait(
+                [self._results.reader, self._wakeup_reader]
+            )
+
+            try:
+                if self._wakeup_reader in ready:
+                    raise EOFError()
+                kind, key, value = self._results.get()
+            except (EOFError, OSError):
+                kind, key, value = "closed", None, None
+
+            with self._lock:
+                if kind == "ready":
+                    self._ready.set()
+                elif kind == "started_worker":
+                    self.worker_pids.add(key)
+                    self._slots[key] = value
+                elif kind == "started":
+                    pid, slot = value
+                    self._slots[pid] = slot
+                    self._running[pid] = key
+                    future = self._futures.get(key)
+                    if future is None or not future.set_running_or_notify_cancel():
+                        # The task was cancelled before it started. Stop it
+                        self._futures.pop(key, None)
+                        self._interrupt(pid, key)
+                elif kind in ("done", "error", "cancelled"):
+                    future = self._futures.pop(key, None)
+                    self._running = {
+                        pid: task_id
+                        for pid, task_id in self._running.items()
+                        if task_id != key
+                    }
+                    if future is None or future.cancelled():
+                        continue
+                    if kind == "done":
+                        future.set_result(value)
+                    elif kind == "error":
+                        future.set_exception(value)
+                    else:
+                        future.set_exception(
+                            WorkerError(f"Task {key} was interrupted by a cancellation")
+                        )
+                elif kind == "exited":
+                    self.worker_pids.discard(key)
+                    self._slots.pop(key, None)
+                    task_id = self._running.pop(key, None)
+                    future = self._futures.pop(task_id, None)
+                    if future is not None and not future.done():
+                        future.set_exception(
+                            WorkerError(
+                                f"The worker running task {task_id} died with exit "
+                                f"code {value}"
+                            )
+                        )
+                elif kind == "closed":
+                    for future in self._futures.values():
+                        if not future.done():
+                            future.cancel()
+                    self._futures = {}
+                    self._ready.set()
+                    return
+
+    def wait_until_ready(self, timeout=None):
+        """Block until the template has warmed up and started the workers
+
+        Returns
+        =======
+        output : bool
+            False if the timeout expired, otherwise True
+        """
+        return self._ready.wait(timeout)
+
+    def submit(self, func, *args, **kwargs):
+        """Run func(*args, **kwargs) in a worker
+
+        `func` and its arguments must be picklable, e.g. `func` must be defined at the
+        top level of a module.
+
+        Returns
+        =======
+        output : concurrent.futures.Future
+            The future of the result. If the worker raises an exception, or dies while
+            running the task, the exception is set on the future.
+        """
+        if self._closed:
+            raise ConfigError("WorkerPool.submit :: The pool is closed")
+
+        future = Future()
+        with self._lock:
+            task_id = self._next_id
+            self._next_id += 1
+            self._futures[task_id] = future
+
+        future.task_id = task_id
+
+        self._pending.put((task_id, func, args, kwargs))
+
+        return future
+
+    def cancel(self, future):
+        """Cancel a task, even if it is running
+
+        Unlike Future.cancel, which only cancels tasks that have not started, this
+        also stops running tasks. The worker running the task is sent SIGUSR1, which
+        raises TaskCancelled in the task at the next Python instruction (compiled
+        functions are not interrupted). The worker then moves on to the next task.
+
+        Parameters
+        ==========
+        future : concurrent.futures.Future
+            A future returned by `submit` or `simulate`
+
+        Returns
+        =======
+        output : bool
+            False if the task had already finished, otherwise True
+        """
+        task_id = future.task_id
+        with self._lock:
+            # The future of the task itself, which differs from `future` if `future`
+            # was returned by `simulate`
+            remote = self._futures.pop(task_id, None)
+            if remote is None:
+                return False
+
+            pids = [pid for pid, key in self._running.items() if key == task_id]
+
+        if not remote.cancel():
+            # The task is running. A running future cannot be cancelled, so it is
+            # resolved with a CancelledError instead
+            remote.set_exception(CancelledError())
+
+        for pid in pids:
+            self._interrupt(pid, task_id)
+
+        return True
+
+    def _interrupt(self, pid, task_id):
+        """Cancel a task in a worker. The worker ignores it if it runs another task"""
+        slot = self._slots.get(pid)
+        if slot is None:
+            return
+
+        self._cancel_requests[slot] = task_id
+        try:
+            os.kill(pid, signal.SIGUSR1)
+        except OSError:
+            pass
+
+    def _kill(self, pid):
+        try:
+            os.kill(pid, signal.SIGKILL)
+        except OSError:
+            pass
+
+    def map(self, func, *iterables):
+        """Like the builtin map, but func is run in the workers
+
+        Results are yielded in order as they become available.
+        """
+        futures = [self.submit(func, *args) for args in zip(*iterables)]
+        for future in futures:
+            yield future.result()
+
+    def simulate(self, shot, **kwargs):
+        """Simulate a system in a worker
+
+        Parameters
+        ==========
+        shot : pooltool.system.System
+            The system. It is not modified.
+        kwargs : **kwargs
+            Passed to System.simulate
+
+        Returns
+        =======
+        output : concurrent.futures.Future
+            The future of the simulated system, including its `halt`. It can be
+            cancelled with `cancel`.
+        """
+        from pooltool.system import System
+
+        future = Future()
+
+        def done(remote):
+            if remote.cancelled():
+                future.cancel()
+            elif remote.exception() is not None:
+                future.set_exception(remote.exception())
+            else:
+                shot = System()
+                load_simulated_shot(shot, remote.result())
+                future.set_result(shot)
+
+        remote = self.submit(simulate_shot, shot.as_dict(), **kwargs)
+        future.task_id = remote.task_id
+        remote.add_done_callback(done)
+
+        return future
+
+    def close(self, wait=True):
+        """Stop the workers once they have finished the submitted tasks
+
+        Parameters
+        ==========
+        wait : bool, True
+            If True, block until the template and all workers have exited
+        """
+        if self._closed:
+            return
+
+        self._closed = True
+        atexit.unregister(self._terminate_at_exit)
+
+        # Each worker exits upon taking a sentinel, after the tasks queued before it.
+        # Workers that retire before taking one are replaced (see _template)
+        for _ in range(self.processes):
+            self._pending.put(None)
+
+        if wait:
+            self._template.join()
+            self._collector.join()
+            self._feeder.join()
+
+    def terminate(self):
+        """Stop the template and workers immediately, cancelling pending tasks"""
+        if not self._closed:
+            # Drop the tasks not yet fed to the workers, and let the feeder exit
+            while True:
+                try:
+                    self._pending.get_nowait()
+                except queue.Empty:
+                    break
+            for _ in range(self.processes):
+                self._pending.put(None)
+
+        self._closed = True
+        atexit.unregister(self._terminate_at_exit)
+        self._stop.set()
+
+        with self._lock:
+            pids = list(self.worker_pids)
+
+        for pid in pids:
+            self._kill(pid)
+
+        self._template.kill()
+        self._template.join()
+
+        # The template or a worker may have been killed while holding the lock of
+        # the results channel, so the collector is woken up through another pipe
+        self._wakeup_writer.send_bytes(b"")
+        self._collector.join()
+
+        # The feeder exits upon taking the sentinels, unless it is blocked feeding a
+        # task that no worker will take
+        self._feeder.join(timeout=1)
+
+    def _terminate_at_exit(self):
+        if not self._closed:
+            self.terminate()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
@@ -66,6 +66,69 @@ def resolve_ball_ball_collision(rvw1, rvw2):
     return rvw1, rvw2
 
 
+@jit(nopython=True, cache=const.numba_cache)
+def resolve_ball_ball_collision_fast(rvw1, rvw2):
+    """FIXME Instantaneous, elastic, equal mass collision (just-in-time compiled)
+
+    Notes
+    =====
+    - Unlike resolve_ball_ball_collision, the passed states are not modified. New
+      states are returned.
+    - Speed comparison in pooltool/tests/speed/resolve_ball_ball_collision.py
+    """
+    rvw1_f = rvw1.astype(np.float64)
+    rvw2_f = rvw2.astype(np.float64)
+
+    vx, vy = rvw1[1, 0] - rvw2[1, 0], rvw1[1, 1] - rvw2[1, 1]
+    v_mag = math.sqrt(vx**2 + vy**2 + (rvw1[1, 2] - rvw2[1, 2]) ** 2)
+
+    nx, ny, nz = (
+        rvw2[0, 0] - rvw1[0, 0],
+        rvw2[0, 1] - rvw1[0, 1],
+        rvw2[0, 2] - rvw1[0, 2],
+    )
+    n_mag = math.sqrt(nx**2 + ny**2 + nz**2)
+    nx, ny, nz = nx / n_mag, ny / n_mag, nz / n_mag
+
+    # The angle between the relative velocity and the line of centers
+    beta = math.atan2(vy, vx) - math.atan2(ny, nx)
+    v_t = v_mag * math.sin(beta)
+    v_n = v_mag * math.cos(beta)
+
+    # The tangent (n rotated by 90 degrees) gets the tangential component, the normal
+    # gets the normal component
+    rvw1_f[1, 0] = -ny * v_t + rvw2[1, 0]
+    rvw1_f[1, 1] = nx * v_t + rvw2[1, 1]
+    rvw1_f[1, 2] = nz * v_t + rvw2[1, 2]
+    rvw2_f[1, 0] = nx * v_n + rvw2[1, 0]
+    rvw2_f[1, 1] = ny * v_n + rvw2[1, 1]
+    rvw2_f[1, 2] = nz * v_n + rvw2[1, 2]
+
+    return rvw1_f, rvw2_f
+
+
+@jit(nopython=True, cache=const.numba_cache)
+def resolve_ball_ball_collision_batch(rvw1, rvw2):
+    """Resolve many ball-ball collisions (just-in-time compiled)
+
+    Parameters
+    ==========
+    rvw1, rvw2 : array, shape (n, 3, 3)
+        The states of the colliding pairs of balls
+
+    Returns
+    =======
+    output : tuple of arrays, shape (n, 3, 3)
+        The states after the collisions. The passed states are not modified.
+    """
+    rvw1_f = np.empty_like(rvw1)
+    rvw2_f = np.empty_like(rvw2)
+    for i in range(rvw1.shape[0]):
+        rvw1_f[i], rvw2_f[i] = resolve_ball_ball_collision_fast(rvw1[i], rvw2[i])
+
+    return rvw1_f, rvw2_f
+
+
 def resolve_ball_cushion_collision(rvw, normal, R, m, h, e_c, f_c):
     """Inhwan Han (2005) 'Dynamics in Carom and Three Cushion Billiards'"""
 
@@ -136,6 +199,116 @@ def resolve_ball_cushion_collision(rvw, normal, R, m, h, e_c, f_c):
     return rvw
 
 
+@jit(nopython=True, cache=const.numba_cache)
+def resolve_ball_cushion_collision_fast(rvw, normal, R, m, h, e_c, f_c):
+    """Inhwan Han (2005) 'Dynamics in Carom and Three Cushion Billiards'
+
+    (just-in-time compiled)
+
+    Notes
+    =====
+    - The cushion frame rotations are done component-wise, so no intermediate arrays
+      are allocated. The returned state is a new array.
+    - Speed comparison in pooltool/tests/speed/resolve_ball_cushion_collision.py
+    """
+    # orient the normal so it points away from playing surface
+    sign = 1.0
+    if normal[0] * rvw[1, 0] + normal[1] * rvw[1, 1] + normal[2] * rvw[1, 2] <= 0:
+        sign = -1.0
+
+    # Change from the table frame to the cushion frame. The cushion frame is defined by
+    # the normal vector is parallel with <1,0,0>.
+    psi = math.atan2(sign * normal[1], sign * normal[0])
+    cos_psi, sin_psi = math.cos(psi), math.sin(psi)
+
+    rvw_R = np.empty((3, 3), dtype=np.float64)
+    for i in range(3):
+        rvw_R[i, 0] = cos_psi * rvw[i, 0] + sin_psi * rvw[i, 1]
+        rvw_R[i, 1] = -sin_psi * rvw[i, 0] + cos_psi * rvw[i, 1]
+        rvw_R[i, 2] = rvw[i, 2]
+
+    # The incidence angle--called theta_0 in paper
+    phi = math.atan2(rvw_R[1, 1], rvw_R[1, 0]) % (2 * np.pi)
+
+    # See get_ball_cushion_restitution and get_ball_cushion_friction
+    e = e_c
+    mu = f_c
+
+    # Depends on height of cushion relative to ball
+    theta_a = math.asin(h / R - 1)
+    sin_a, cos_a = math.sin(theta_a), math.cos(theta_a)
+
+    # Eqs 14
+    sx = rvw_R[1, 0] * sin_a - rvw_R[1, 2] * cos_a + R * rvw_R[2, 1]
+    sy = -rvw_R[1, 1] - R * rvw_R[2, 2] * cos_a + R * rvw_R[2, 0] * sin_a
+    c = rvw_R[1, 0] * cos_a  # 2D assumption
+
+    # Eqs 16
+    I = 2 / 5 * m * R**2
+    A = 7 / 2 / m
+    B = 1 / m
+
+    # Eqs 17 & 20
+    PzE = (1 + e) * c / B
+    PzS = math.sqrt(sx**2 + sy**2) / A
+
+    if PzS <= PzE:
+        # Sliding and sticking case
+        PX = -sx / A * sin_a - (1 + e) * c / B * cos_a
+        PY = sy / A
+        PZ = sx / A * cos_a - (1 + e) * c / B * sin_a
+    else:
+        # Forward sliding case
+        PX = -mu * (1 + e) * c / B * math.cos(phi) * sin_a - (1 + e) * c / B * cos_a
+        PY = mu * (1 + e) * c / B * math.sin(phi)
+        PZ = mu * (1 + e) * c / B * math.cos(phi) * cos_a - (1 + e) * c / B * sin_a
+
+    # Update velocity
+    rvw_R[1, 0] += PX / m
+    rvw_R[1, 1] += PY / m
+
+    # Update angular velocity
+    rvw_R[2, 0] += -R / I * PY * sin_a
+    rvw_R[2, 1] += R / I * (PX * sin_a - PZ * cos_a)
+    rvw_R[2, 2] += R / I * PY * cos_a
+
+    # Change back to table reference frame
+    rvw_T = np.empty((3, 3), dtype=np.float64)
+    for i in range(3):
+        rvw_T[i, 0] = cos_psi * rvw_R[i, 0] - sin_psi * rvw_R[i, 1]
+        rvw_T[i, 1] = sin_psi * rvw_R[i, 0] + cos_psi * rvw_R[i, 1]
+        rvw_T[i, 2] = rvw_R[i, 2]
+
+    return rvw_T
+
+
+@jit(nopython=True, cache=const.numba_cache)
+def resolve_ball_cushion_collision_batch(rvw, normal, R, m, h, e_c, f_c):
+    """Resolve many ball-cushion collisions (just-in-time compiled)
+
+    Parameters
+    ==========
+    rvw : array, shape (n, 3, 3)
+        The ball states
+    normal : array, shape (n, 3)
+        The cushion normals at the points of contact
+    R, m, h, e_c, f_c : array, shape (n,)
+        The ball and cushion parameters
+
+    Returns
+    =======
+    output : array, shape (n, 3, 3)
+        The ball states after the collisions. The passed states are not modified.
+    """
+    rvw_f = np.empty_like(rvw)
+    for i in range(rvw.shape[0]):
+        rvw_f[i] = resolve_ball_cushion_collision_fast(
+            rvw[i], normal[i], R[i], m[i], h[i], e_c[i], f_c[i]
+        )
+
+    return rvw_f
+
+
 def get_ball_cushion_restitution(rvw, e_c):
     """Get restitution coefficient dependent on ball state
 
@@ -374,6 +547,72 @@ def get_ball_ball_collision_coeffs_fast(
     return a, b, c, d, e
 
 
+@jit(nopython=True, cache=const.numba_cache)
+def get_ball_ball_collision_coeffs_array(
+    rvw, s, mu, m, g, R, active, is_active, coeffs, agents
+):
+    """Get the quartic coeffs of every pair of balls that may collide
+
+    (just-in-time compiled)
+
+    Only pairs with at least one active (translating) ball are considered, so the cost
+    is proportional to the number of active balls. Pairs with a pocketed ball are
+    skipped.
+
+    Parameters
+    ==========
+    rvw : array, shape (n, 3, 3)
+        The ball states
+    s, mu, m, g, R : array, shape (n,)
+        The ball motion states and parameters. mu is the coefficient of friction of
+        each ball's current motion state
+    active : array
+        The indices of the active balls
+    is_active : array, shape (n,)
+        Whether each ball is active
+    coeffs : array, shape (>= n*(n-1)/2, 5)
+        Preallocated array that the coefficients are written to
+    agents : array, shape (>= n*(n-1)/2, 2)
+        Preallocated array that the ball indices of each pair are written to, the lower
+        index first
+
+    Returns
+    =======
+    output : int
+        The number of rows of `coeffs` and `agents` that were written
+    """
+    k = 0
+    for i in active:
+        for j in range(len(s)):
+            if j == i or s[j] == const.pocketed:
+                continue
+
+            if is_active[j] and j < i:
+                # This pair is considered when ball j is
+                continue
+
+            i1, i2 = (i, j) if i < j else (j, i)
+            a, b, c, d, e = get_ball_ball_collision_coeffs_fast(
+                rvw[i1],
+                rvw[i2],
+                s[i1],
+                s[i2],
+                mu[i1],
+                mu[i2],
+                m[i1],
+                m[i2],
+                g[i1],
+                g[i2],
+                R[i1],
+            )
+            coeffs[k, 0], coeffs[k, 1], coeffs[k, 2] = a, b, c
+            coeffs[k, 3], coeffs[k, 4] = d, e
+            agents[k, 0], agents[k, 1] = i1, i2
+            k += 1
+
+    return k
+
+
 def get_ball_ball_collision_time(rvw1, rvw2, s1, s2, mu1, mu2, m1, m2, g1, g2, R):
     """Get the time until collision between 2 balls
 
@@ -559,6 +798,42 @@ def get_ball_linear_cushion_collision_time_fast(
     return min_time
 
 
+@jit(nopython=True, cache=const.numba_cache)
+def get_min_ball_linear_cushion_collision_time_array(
+    rvw, s, mu, m, g, R, lx, ly, l0, p1, p2, direction, indices
+):
+    """Get the time until a ball first collides with one of several linear segments
+
+    (just-in-time compiled)
+
+    Parameters
+    ==========
+    rvw, s, mu, m, g, R
+        The state and parameters of the ball
+    lx, ly, l0, direction : array, shape (n,)
+        The line coefficients and directions of all linear cushion segments
+    p1, p2 : array, shape (n, 3)
+        The end points of all linear cushion segments
+    indices : array
+        The indices of the segments to consider
+
+    Returns
+    =======
+    output : (float, int)
+        The time until the first collision, and the index of the segment. If there is
+        no collision, (np.inf, -1)
+    """
+    dtau_E_min, index = np.inf, -1
+    for j in indices:
+        dtau_E = get_ball_linear_cushion_collision_time_fast(
+            rvw, s, lx[j], ly[j], l0[j], p1[j], p2[j], direction[j], mu, m, g, R
+        )
+        if dtau_E < dtau_E_min:
+            dtau_E_min, index = dtau_E, j
+
+    return dtau_E_min, index
+
+
 def get_ball_circular_cushion_collision_coeffs(rvw, s, a, b, r, mu, m, g, R):
     """Get quartic coeffs required to determine the ball-circular-cushion collision time
 
@@ -650,6 +925,43 @@ def get_ball_circular_cushion_collision_coeffs_fast(rvw, s, a, b, r, mu, m, g, R
     return A, B, C, D, E
 
 
+@jit(nopython=True, cache=const.numba_cache)
+def get_ball_circular_cushion_collision_coeffs_array(
+    rvw, s, mu, m, g, R, a, b, r, indices, i, coeffs, agents, k
+):
+    """Get the quartic coeffs of a ball and several circular cushion segments
+
+    (just-in-time compiled)
+
+    Parameters
+    ==========
+    rvw, s, mu, m, g, R
+        The state and parameters of ball i
+    a, b, r : array, shape (n,)
+        The centers and radii of all circular cushion segments
+    indices : array
+        The indices of the segments to consider
+    coeffs, agents : array
+        Preallocated arrays that the coefficients and (ball index, segment index) pairs
+        are written to, starting at row k
+
+    Returns
+    =======
+    output : int
+        The number of rows written in total, i.e. k plus the number of segments
+    """
+    for j in indices:
+        a_j, b_j, c_j, d_j, e_j = get_ball_circular_cushion_collision_coeffs_fast(
+            rvw, s, a[j], b[j], r[j], mu, m, g, R
+        )
+        coeffs[k, 0], coeffs[k, 1], coeffs[k, 2] = a_j, b_j, c_j
+        coeffs[k, 3], coeffs[k, 4] = d_j, e_j
+        agents[k, 0], agents[k, 1] = i, j
+        k += 1
+
+    return k
+
+
 def get_ball_circular_cushion_collision_time(rvw, s, a, b, r, mu, m, g, R):
     """Get the time until collision between ball and circular cushion segment
 
@@ -769,6 +1081,43 @@ def get_ball_pocket_collision_coeffs_fast(rvw, s, a, b, r, mu, m, g, R):
     return A, B, C, D, E
 
 
+@jit(nopython=True, cache=const.numba_cache)
+def get_ball_pocket_collision_coeffs_array(
+    rvw, s, mu, m, g, R, active, a, b, r, coeffs, agents
+):
+    """Get the quartic coeffs of every active ball and every pocket
+
+    (just-in-time compiled)
+
+    Parameters
+    ==========
+    rvw, s, mu, m, g, R, active
+        See get_ball_ball_collision_coeffs_array
+    a, b, r : array, shape (p,)
+        The centers and radii of the pockets
+    coeffs, agents : array, shape (>= n*p, 5) and (>= n*p, 2)
+        Preallocated arrays that the coefficients and (ball index, pocket index) pairs
+        are written to
+
+    Returns
+    =======
+    output : int
+        The number of rows written
+    """
+    k = 0
+    for i in active:
+        for j in range(len(a)):
+            a_j, b_j, c_j, d_j, e_j = get_ball_pocket_collision_coeffs_fast(
+                rvw[i], s[i], a[j], b[j], r[j], mu[i], m[i], g[i], R[i]
+            )
+            coeffs[k, 0], coeffs[k, 1], coeffs[k, 2] = a_j, b_j, c_j
+            coeffs[k, 3], coeffs[k, 4] = d_j, e_j
+            agents[k, 0], agents[k, 1] = i, j
+            k += 1
+
+    return k
+
+
 def get_ball_pocket_collision_time(rvw, s, a, b, r, mu, m, g, R):
     """Get the time until collision between ball and pocket
 
@@ -843,6 +1192,32 @@ def get_ball_energy(rvw, R, m):
     return LKE + RKE
 
 
+@jit(nopython=True, cache=const.numba_cache)
+def get_ball_energy_fast(rvw, R, m):
+    """Get the energy of a ball (just-in-time compiled)"""
+    v2 = rvw[1, 0] ** 2 + rvw[1, 1] ** 2 + rvw[1, 2] ** 2
+    w2 = rvw[2, 0] ** 2 + rvw[2, 1] ** 2 + rvw[2, 2] ** 2
+    return m * v2 / 2 + 2 / 5 * m * R**2 * w2 / 2
+
+
+@jit(nopython=True, cache=const.numba_cache)
+def get_ball_energy_batch(rvw, R, m):
+    """Get the energies of many balls (just-in-time compiled)
+
+    Parameters
+    ==========
+    rvw : array, shape (n, 3, 3)
+        The ball states
+    R, m : array, shape (n,)
+        The ball radii and masses
+    """
+    energy = np.empty(rvw.shape[0], dtype=np.float64)
+    for i in range(rvw.shape[0]):
+        energy[i] = get_ball_energy_fast(rvw[i], R[i], m[i])
+
+    return energy
+
+
 @jit(nopython=True, cache=const.numba_cache)
 def evolve_ball_motion(state, rvw, R, m, u_s, u_sp, u_r, g, t):
     if state == const.stationary or state == const.pocketed:
@@ -880,6 +1255,29 @@ def evolve_ball_motion(state, rvw, R, m, u_s, u_sp, u_r, g, t):
             return evolve_perpendicular_spin_state(rvw, R, u_sp, g, t), const.spinning
 
 
+@jit(nopython=True, cache=const.numba_cache)
+def evolve_ball_motion_array(s, rvw, R, m, u_s, u_sp, u_r, g, t):
+    """Evolve the motion of many balls an amount of time t, in place
+
+    (just-in-time compiled)
+
+    Parameters
+    ==========
+    s : array, shape (n,)
+        The motion states of the balls
+    rvw : array, shape (n, 3, 3)
+        The rvw states of the balls
+    R, m, u_s, u_sp, u_r, g : array, shape (n,)
+        The ball parameters
+    """
+    for i in range(len(s)):
+        rvw_i, s_i = evolve_ball_motion(
+            s[i], rvw[i], R[i], m[i], u_s[i], u_sp[i], u_r[i], g[i], t
+        )
+        rvw[i] = rvw_i
+        s[i] = s_i
+
+
 @jit(nopython=True, cache=const.numba_cache)
 def evolve_state_motion(state, rvw, R, m, u_s, u_sp, u_r, g, t):
     """Variant of evolve_ball_motion that does not respect motion transition events"""
@@ -1083,5 +1481,85 @@ def cue_strike(m, M, R, V0, phi, theta, a, b):
     return v_T, w_T
 
 
+@jit(nopython=True, cache=const.numba_cache)
+def cue_strike_fast(m, M, R, V0, phi, theta, a, b):
+    """Strike a ball (just-in-time compiled)
+
+    See cue_strike for a description of the parameters.
+
+    Notes
+    =====
+    - Speed comparison in pooltool/tests/speed/cue_strike.py
+    """
+    a *= R * const.english_fraction
+    b *= R * const.english_fraction
+
+    phi *= np.pi / 180
+    theta *= np.pi / 180
+
+    I = 2 / 5 * m * R**2
+
+    c = math.sqrt(R**2 - a**2 - b**2)
+    cos_theta, sin_theta = math.cos(theta), math.sin(theta)
+
+    # Calculate impact force F. See cue_strike
+    numerator = 2 * M * V0
+    temp = (
+        a**2
+        + (b * cos_theta) ** 2
+        + (c * cos_theta) ** 2
+        - 2 * b * c * cos_theta * sin_theta
+    )
+    denominator = 1 + m / M + 5 / 2 / R**2 * temp
+    F = numerator / denominator
+
+    # Velocity and angular velocity in the ball frame. 3D FIXME
+    v_By = -F / m * cos_theta
+    w_Bx = F / I * (-c * sin_theta + b * cos_theta)
+    w_By = F / I * a * sin_theta
+    w_Bz = F / I * -a * cos_theta
+
+    # Rotate to table reference
+    rot_angle = phi + np.pi / 2
+    cos_rot, sin_rot = math.cos(rot_angle), math.sin(rot_angle)
+
+    v_T = np.empty(3, dtype=np.float64)
+    v_T[0] = -sin_rot * v_By
+    v_T[1] = cos_rot * v_By
+    v_T[2] = 0
+
+    w_T = np.empty(3, dtype=np.float64)
+    w_T[0] = cos_rot * w_Bx - sin_rot * w_By
+    w_T[1] = sin_rot * w_Bx + cos_rot * w_By
+    w_T[2] = w_Bz
+
+    return v_T, w_T
+
+
+@jit(nopython=True, cache=const.numba_cache)
+def cue_strike_batch(m, M, R, V0, phi, theta, a, b):
+    """Strike a ball with many different cue strikes (just-in-time compiled)
+
+    Parameters
+    ==========
+    m, M, R : float
+        The ball mass, cue mass, and ball radius
+    V0, phi, theta, a, b : array, shape (n,)
+        The cue strike parameters. See cue_strike
+
+    Returns
+    =======
+    output : tuple of arrays, shape (n, 3)
+        The initial velocities and angular velocities of the ball
+    """
+    n = V0.shape[0]
+    v = np.empty((n, 3), dtype=np.float64)
+    w = np.empty((n, 3), dtype=np.float64)
+    for i in range(n):
+        v[i], w[i] = cue_strike_fast(m, M, R, V0[i], phi[i], theta[i], a[i], b[i])
+
+    return v, w
+
+
 def is_overlapping(rvw1, rvw2, R1, R2):
     return np.linalg.norm(rvw1[0] - rvw2[0]) < (R1 + R2)
@@ -0,0 +1,476 @@
+#! /usr/bin/env python
+"""A local simulation server
+
+The server simulates batches of compact shot specifications in a WorkerPool, whose
+workers keep pooltool warmed up and the table geometries built. Clients connect over a
+TCP socket (`host:port`) or a Unix socket (`unix:/path/to/socket`).
+
+Protocol
+========
+Messages are framed by a 5 byte header: the length of the payload (4 byte unsigned
+big-endian integer), then the codec of the payload (1 byte, see `codecs`), either JSON
+or msgpack. A response is encoded with the codec of its request.
+
+A request is a map with an "op" key:
+
+- {"op": "ping"} is answered with {"op": "pong"}
+- {"op": "simulate", "id": ..., "shots": [...], "trajectories": false, "options": {}}
+  is answered with {"id": ..., "results": [...]}, with one result per shot, in order.
+  "options" are passed to System.simulate (see `simulate_options`).
+
+Invalid requests are answered with {"id": ..., "error": "..."}. Requests on one
+connection are answered in the order they were sent. A frame whose payload is larger
+than the `max_frame_size` of the server is answered with an error, and the connection is
+closed.
+
+Shot specifications and their results are described in pooltool.specs.
+
+Examples
+========
+$ pooltool serve --address unix:/tmp/pooltool.sock --workers 8
+$ pooltool loadgen --address unix:/tmp/pooltool.sock --requests 1000 --batch-size 16
+
+Or from Python:
+
+>>> with pt.Client("unix:/tmp/pooltool.sock") as client:
+>>>     results = client.simulate([spec_from_system(shot)])
+"""
+
+import asyncio
+import json
+import socket
+import struct
+import threading
+import time
+
+import numpy as np
+
+import pooltool.terminal as terminal
+from pooltool.error import ConfigError, SimulateError
+from pooltool.specs import describe_error, get_break_specs, load_tables, simulate_specs
+
+__all__ = ["Client", "serve"]
+
+header = struct.Struct(">IB")
+
+codec_json = 0
+codec_msgpack = 1
+codecs = {"json": codec_json, "msgpack": codec_msgpack}
+
+# The keyword arguments of System.simulate that requests may set
+simulate_options = {
+    "algorithm",
+    "t_final",
+    "continuize",
+    "dt",
+    "max_events",
+    "max_sim_time",
+    "max_wall_time",
+    "max_zeno_repeats",
+}
+
+
+def _get_msgpack():
+    try:
+        import msgpack
+    except ImportError:
+        raise ConfigError("The msgpack codec requires msgpack (pip install msgpack)")
+
+    return msgpack
+
+
+def encode(message, codec):
+    """Returns a framed message. See the module docstring"""
+    if codec == codec_json:
+        payload = json.dumps(message, separators=(",", ":")).encode()
+    elif codec == codec_msgpack:
+        payload = _get_msgpack().packb(message, use_bin_type=True)
+    else:
+        raise ConfigError(f"encode :: Unknown codec {codec}")
+
+    return header.pack(len(payload), codec) + payload
+
+
+def decode(payload, codec):
+    if codec == codec_json:
+        return json.loads(payload)
+    elif codec == codec_msgpack:
+        return _get_msgpack().unpackb(payload, raw=False)
+    else:
+        raise ConfigError(f"decode :: Unknown codec {codec}")
+
+
+def parse_address(address):
+    """Returns ('unix', path) or ('tcp', (host, port)) for an address string"""
+    if address.startswith("unix:"):
+        return "unix", address[len("unix:") :]
+
+    host, _, port = address.rpartition(":")
+    if not host or not port.isdigit():
+        raise ConfigError(
+            f"parse_address :: Expected 'host:port' or 'unix:path', got '{address}'"
+        )
+
+    return "tcp", (host, int(port))
+
+
+# ------------------------------------------------------------------------------------
+# Server
+# ------------------------------------------------------------------------------------
+
+
+class SimulationServer(object):
+    def __init__(self, pool, chunk_size=8, max_pending=None, max_frame_size=2**26):
+        """Serves simulation requests with a WorkerPool
+
+        Parameters
+        ==========
+        pool : pooltool.parallel.WorkerPool
+            The workers. Their template should have loaded the tables (see load_tables)
+        chunk_size : int, 8
+            Batches are split into chunks of at most this many shots, each simulated by
+            one worker. Larger chunks have less overhead, smaller chunks spread a batch
+            over more workers.
+        max_pending : int, None
+            At most this many chunks are submitted to the workers at once. Requests
+            beyond that wait, so that a flood of requests does not pile up in memory.
+            If None, 4 chunks per worker.
+        max_frame_size : int, 2**26
+            The largest request payload, in bytes, that is read
+        """
+        self.pool = pool
+        self.max_frame_size = max_frame_size
+        self.chunk_size = chunk_size
+        self.max_pending = max_pending or 4 * pool.processes
+        self.num_shots = 0
+        self.num_requests = 0
+
+    async def simulate(self, specs, trajectories=False, **kwargs):
+        chunks = [
+            specs[i : i + self.chunk_size]
+            for i in range(0, len(specs), self.chunk_size)
+        ]
+
+        async def simulate_chunk(chunk):
+            async with self._pending:
+                return await asyncio.wrap_future(
+                    self.pool.submit(simulate_specs, chunk, trajectories, **kwargs)
+                )
+
+        results = await asyncio.gather(*[simulate_chunk(chunk) for chunk in chunks])
+        self.num_shots += len(specs)
+
+        return [result for chunk_results in results for result in chunk_results]
+
+    async def respond(self, request):
+        """Returns the response to a request"""
+        if not isinstance(request, dict):
+            return dict(error="A request must be a map")
+
+        op = request.get("op")
+        request_id = request.get("id")
+
+        if op == "ping":
+            return dict(id=request_id, op="pong")
+
+        if op != "simulate":
+            return dict(id=request_id, error=f"Unknown op '{op}'")
+
+        shots = request.get("shots")
+        options = request.get("options") or {}
+        if not isinstance(shots, list) or not isinstance(options, dict):
+            return dict(id=request_id, error="'shots' must be a list of shots")
+        if not set(options) <= simulate_options:
+            unknown = sorted(set(options) - simulate_options)
+            return dict(id=request_id, error=f"Unknown options {unknown}")
+
+        self.num_requests += 1
+        results = await self.simulate(
+            shots, trajectories=bool(request.get("trajectories")), **options
+        )
+
+        return dict(id=request_id, results=results)
+
+    async def handle(self, reader, writer):
+        """Answer the requests of one connection"""
+        try:
+            while True:
+                try:
+                    size, codec = header.unpack(await reader.readexactly(header.size))
+                    if size > self.max_frame_size:
+                        # The payload is not read, so the connection cannot be resumed
+                        codec = codec if codec in codecs.values() else codec_json
+                        response = dict(
+                            error=f"The request is {size} bytes, over the limit of "
+                            f"{self.max_frame_size} bytes"
+                        )
+                        writer.write(encode(response, codec))
+                        await writer.drain()
+                        break
+
+                    payload = await reader.readexactly(size)
+                except asyncio.IncompleteReadError:
+                    break
+
+                try:
+                    request = decode(payload, codec)
+                except Exception as e:
+                    # An unknown codec cannot be answered in kind
+                    codec = codec if codec in codecs.values() else codec_json
+                    response = dict(error=f"Invalid request: {describe_error(e)}")
+                else:
+                    try:
+                        response = await self.respond(request)
+                    except Exception as e:
+                        # E.g. a worker died (see WorkerPool)
+                        response = dict(id=request.get("id"), error=describe_error(e))
+
+                writer.write(encode(response, codec))
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def start(self, address):
+        """Start listening at an address
+
+        Returns
+        =======
+        output : asyncio.Server
+            The server, which serves requests as long as the event loop runs
+        """
+        self._pending = asyncio.Semaphore(self.max_pending)
+
+        kind, where = parse_address(address)
+        if kind == "unix":
+            return await asyncio.start_unix_server(self.handle, path=where)
+        else:
+            return await asyncio.start_server(self.handle, *where)
+
+    async def serve(self, address, run=None):
+        """Serve requests at an address until cancelled"""
+        server = await self.start(address)
+
+        if run is not None:
+            run.info("Listening on", address)
+
+        async with server:
+            await server.serve_forever()
+
+
+def serve(
+    address,
+    workers=None,
+    tables=("7_foot",),
+    chunk_size=8,
+    max_frame_size=2**26,
+    max_tasks=None,
+    max_memory=None,
+    warmup=True,
+    run=terminal.Run(),
+):
+    """Run a simulation server until interrupted
+
+    Parameters
+    ==========
+    address : str
+        'host:port' or 'unix:/path/to/socket'
+    workers : int, None
+        The number of worker processes. If None, the number of CPUs is used.
+    tables : iterable of str, ("7_foot",)
+        The preset tables whose geometries are built before forking the workers. Other
+        preset tables are built by each worker upon first use.
+    chunk_size, max_frame_size
+        See SimulationServer
+    max_tasks, max_memory, warmup
+        See WorkerPool
+    """
+    from pooltool.parallel import WorkerPool
+
+    pool = WorkerPool(
+        processes=workers,
+        max_tasks=max_tasks,
+        max_memory=max_memory,
+        warmup=warmup,
+        initializer=load_tables,
+        initargs=(list(tables),),
+    )
+
+    try:
+        pool.wait_until_ready()
+        run.info("Workers", pool.processes)
+
+        server = SimulationServer(
+            pool, chunk_size=chunk_size, max_frame_size=max_frame_size
+        )
+        asyncio.run(server.serve(address, run=run))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        pool.terminate()
+
+
+# ------------------------------------------------------------------------------------
+# Client
+# ------------------------------------------------------------------------------------
+
+
+class Client(object):
+    def __init__(self, address, codec="json", timeout=None):
+        """A blocking client of a simulation server
+
+        Parameters
+        ==========
+        address : str
+            'host:port' or 'unix:/path/to/socket'
+        codec : str, 'json'
+            'json' or 'msgpack'
+        timeout : float, None
+            The socket timeout, in seconds
+        """
+        if codec not in codecs:
+            raise ConfigError(f"Client :: codec must be one of {list(codecs)}")
+
+        self.codec = codecs[codec]
+        self.next_id = 0
+
+        kind, where = parse_address(address)
+        family = socket.AF_UNIX if kind == "unix" else socket.AF_INET
+        self.sock = socket.socket(family, socket.SOCK_STREAM)
+        self.sock.settimeout(timeout)
+        self.sock.connect(where)
+        if kind == "tcp":
+            self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+        self.file = self.sock.makefile("rb")
+
+    def request(self, request):
+        """Send a request and return its response"""
+        self.sock.sendall(encode(request, self.codec))
+
+        head = self.file.read(header.size)
+        if len(head) < header.size:
+            raise ConnectionError("Client.request :: The server closed the connection")
+
+        size, codec = header.unpack(head)
+        response = decode(self.file.read(size), codec)
+
+        if "error" in response:
+            raise SimulateError(f"Client.request :: {response['error']}")
+
+        return response
+
+    def ping(self):
+        return self.request(dict(op="ping"))["op"] == "pong"
+
+    def simulate(self, shots, trajectories=False, **options):
+        """Simulate a batch of shot specifications
+
+        Parameters
+        ==========
+        shots : list of dict
+            Shot specifications, see pooltool.specs
+        trajectories : bool, False
+            If True, the history of each ball is included in the results
+        options : **kwargs
+            Passed to System.simulate, see `simulate_options`
+
+        Returns
+        =======
+        output : list of dict
+            The result of each shot, in order
+        """
+        self.next_id += 1
+        response = self.request(
+            dict(
+                op="simulate",
+                id=self.next_id,
+                shots=shots,
+                trajectories=trajectories,
+                options=options,
+            )
+        )
+
+        return response["results"]
+
+    def close(self):
+        self.file.close()
+        self.sock.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+def load_test(
+    address,
+    num_requests=100,
+    batch_size=16,
+    concurrency=4,
+    codec="json",
+    trajectories=False,
+    **options,
+):
+    """Send requests of nine-ball breaks to a server from several connections
+
+    Returns
+    =======
+    report : dict
+        The number of requests and shots, the wall time (`time`), the throughput
+        (`requests_per_s`, `shots_per_s`), the latency of requests in seconds
+        (`latency_p50`, `latency_p95`, `latency_p99`), and the number of failed
+        shots (`errors`)
+    """
+    specs = get_break_specs(batch_size, seed=42)
+    latencies = []
+    errors = []
+    lock = threading.Lock()
+    counts = iter(range(num_requests))
+
+    failures = []
+
+    def connection():
+        try:
+            with Client(address, codec=codec) as client:
+                while True:
+                    with lock:
+                        if next(counts, None) is None or failures:
+                            return
+
+                    start = time.perf_counter()
+                    results = client.simulate(
+                        specs, trajectories=trajectories, **options
+                    )
+                    latency = time.perf_counter() - start
+
+                    with lock:
+                        latencies.append(latency)
+                        errors.extend(r for r in results if "error" in r)
+        except Exception as e:
+            failures.append(e)
+
+    start = time.perf_counter()
+    threads = [threading.Thread(target=connection) for _ in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    duration = time.perf_counter() - start
+
+    if failures:
+        raise failures[0]
+
+    return dict(
+        requests=len(latencies),
+        shots=len(latencies) * batch_size,
+        time=duration,
+        requests_per_s=len(latencies) / duration,
+        shots_per_s=len(latencies) * batch_size / duration,
+        latency_p50=float(np.percentile(latencies, 50)),
+        latency_p95=float(np.percentile(latencies, 95)),
+        latency_p99=float(np.percentile(latencies, 99)),
+        errors=len(errors),
+    )
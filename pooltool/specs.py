@@ -0,0 +1,170 @@
+#! /usr/bin/env python
+"""Compact shot specifications
+
+Shot specifications describe unsimulated shots in a few plain values, so that they can
+be sent to a simulation server (see pooltool.server) or stored in JSON lines files (see
+pooltool.batch). The table geometries are built once per process (see load_tables).
+
+A shot specification is a map:
+
+- "id": any value, returned with the result (optional)
+- "table": the name of a preset table, see pooltool/config/tables (default "7_foot")
+- "balls": a map from ball ids to [x, y] positions
+- "cue": a map of the cue parameters V0, phi, theta, a, b and cueing_ball (default
+  "cue"). Missing parameters take the defaults of Cue.
+
+Its result is a map with the id, the number of events, the final time, the halt reason
+(see Watchdog), the ids of the balls hit first by the cue ball, the pocketed balls, the
+final [x, y, s] of each ball, and features of the events such as cushion counts (see
+pooltool.outcomes.get_outcome). With "trajectories", the result also holds the history
+of each ball (see pooltool.outcomes.get_trajectories). If a shot fails, its result
+holds an "error" instead.
+"""
+
+import numpy as np
+
+import pooltool.constants as c
+from pooltool.error import ConfigError, PoolToolError
+from pooltool.outcomes import get_outcome, get_trajectories
+
+
+def describe_error(e):
+    """Returns a one line description of an exception"""
+    message = e.clear_text() if isinstance(e, PoolToolError) else str(e)
+    return f"{e.__class__.__name__}: {message}"
+
+
+def get_table(table_id):
+    """Returns a new preset table named table_id, without rendering
+
+    Each shot gets its own table, since pockets hold state (the balls they contain).
+    Only the immutable geometry is shared, as it is built once per process (see
+    Table.get_geometry).
+    """
+    from pooltool.objects.table import get_table_preset, physics_table_types
+
+    try:
+        table_type = get_table_preset(table_id)["type"]
+    except KeyError:
+        raise ConfigError(f"get_table :: Unknown table '{table_id}'")
+
+    return physics_table_types[table_type](model_name=table_id)
+
+
+def load_tables(table_ids):
+    """Build the table geometries in the template process of the WorkerPool"""
+    for table_id in table_ids:
+        get_table(table_id)
+
+
+def build_system(spec):
+    """Returns a System, with the cue struck, from a shot specification
+
+    The system is made of physics-only objects, which cannot be rendered.
+    """
+    from pooltool.objects.ball import PhysicsBall
+    from pooltool.objects.cue import PhysicsCue
+    from pooltool.system import System
+
+    table = get_table(spec.get("table", "7_foot"))
+
+    balls = {}
+    for ball_id, (x, y) in spec["balls"].items():
+        balls[ball_id] = PhysicsBall(ball_id, xyz=(x, y, c.R))
+
+    cue_params = dict(spec.get("cue", {}))
+    cueing_ball = cue_params.pop("cueing_ball", "cue")
+    if cueing_ball not in balls:
+        raise ConfigError(f"build_system :: No cueing ball '{cueing_ball}'")
+
+    cue = PhysicsCue(cueing_ball=balls[cueing_ball])
+    cue.strike(**cue_params)
+
+    return System(cue=cue, table=table, balls=balls)
+
+
+def spec_from_system(shot, shot_id=None):
+    """Returns the shot specification of an unsimulated system
+
+    The table must be a preset table, and the balls must be at rest on the table.
+    """
+    return dict(
+        id=shot_id,
+        table=shot.table.model_name,
+        balls={
+            str(ball_id): [float(x) for x in ball.rvw[0, :2]]
+            for ball_id, ball in shot.balls.items()
+        },
+        cue=dict(
+            V0=float(shot.cue.V0),
+            phi=float(shot.cue.phi),
+            theta=float(shot.cue.theta),
+            a=float(shot.cue.a),
+            b=float(shot.cue.b),
+            cueing_ball=str(shot.cue.cueing_ball.id),
+        ),
+    )
+
+
+def simulate_specs(specs, trajectories=False, **kwargs):
+    """Simulate shot specifications, returning the result of each
+
+    A shot that fails does not fail the others. Its result holds the error instead.
+    """
+    results = []
+    for spec in specs:
+        try:
+            if not isinstance(spec, dict):
+                raise ConfigError("A shot must be a map")
+
+            shot = build_system(spec)
+            shot.simulate(quiet=True, raise_simulate_error=True, **kwargs)
+            result = get_outcome(shot)
+            if trajectories:
+                result["trajectories"] = get_trajectories(shot)
+        except Exception as e:
+            result = dict(error=describe_error(e))
+
+        result["id"] = spec.get("id") if isinstance(spec, dict) else None
+        results.append(result)
+
+    return results
+
+
+def get_break_specs(n, seed=None):
+    """Returns n nine-ball break specifications with random cue parameters"""
+    import pooltool as pt
+
+    rng = np.random.default_rng(seed)
+    table = pt.PocketTable(model_name="7_foot")
+
+    # The rack is built without its random gaps, which are then drawn from `rng`
+    # rather than np.random, so that the specifications depend on the seed only. See
+    # NineBallRack.arrange
+    spacer = 1e-3 * c.R
+    scale = (c.R + spacer + c.tol) / (c.R + c.tol)
+
+    specs = []
+    for i in range(n):
+        balls = pt.get_nine_ball_rack(table, spacing_factor=0, ordered=True)
+        apex = np.copy(balls["1"].rvw[0, :2])
+        for ball_id, ball in balls.items():
+            if ball_id == "cue":
+                continue
+
+            angle = 2 * np.pi * rng.random()
+            radius = spacer * rng.random()
+            ball.rvw[0, :2] = apex + scale * (ball.rvw[0, :2] - apex)
+            ball.rvw[0, :2] += radius * np.array([np.cos(angle), np.sin(angle)])
+
+        cue = pt.Cue(cueing_ball=balls["cue"])
+        cue.aim_at_ball(balls["1"])
+        cue.set_state(
+            V0=rng.uniform(4, 8),
+            phi=cue.phi + rng.uniform(-1, 1),
+            a=rng.uniform(-0.3, 0.3),
+            b=rng.uniform(-0.3, 0.3),
+        )
+        specs.append(spec_from_system(pt.System(cue=cue, table=table, balls=balls), i))
+
+    return specs
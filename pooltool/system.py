@@ -1,8 +1,13 @@
 #! /usr/bin/env python
 
+import collections
+import copy
+import itertools
 import tempfile
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
+import numpy as np
 from direct.interval.IntervalGlobal import Func, Parallel, Sequence, Wait
 from panda3d.direct import HideInterval, ShowInterval
 
@@ -10,6 +15,7 @@ import pooltool.ani as ani
 import pooltool.constants as c
 import pooltool.physics as physics
 import pooltool.utils as utils
+from pooltool.ani.playback import BallPlayback
 from pooltool.error import ConfigError, SimulateError
 from pooltool.events import (
     Events,
@@ -23,18 +29,143 @@ from pooltool.events import (
     type_ball_pocket,
     type_stick_ball,
 )
-from pooltool.evolution import EvolveShotEventBased
-from pooltool.objects.ball import BallHistory, ball_from_dict
+from pooltool.evolution import EvolveShotCompiled, EvolveShotHybrid
+from pooltool.objects.ball import (
+    Ball,
+    BallHistory,
+    ball_from_dict,
+    history_as_dict,
+    history_from_dict,
+)
 from pooltool.objects.cue import cue_from_dict
 from pooltool.objects.table import table_from_dict
 
 
+def events_from_dict(event_dicts, balls, table, cue):
+    """Build Events from a list of event dictionaries, with agents bound to objects
+
+    Parameters
+    ==========
+    event_dicts : list of dict
+        For dictionary form see return value of pooltool.events.Events.as_dict
+    balls : dict of pooltool.objects.ball.Ball
+        The balls that should be agents of the events, keyed by ball id
+    table : pooltool.objects.table.Table
+        The table whose cushion segments and pockets should be agents of the events
+    cue : pooltool.objects.cue.Cue
+        The cue that should be the agent of stick-ball events
+    """
+    cushions = {
+        cushion.id: cushion
+        for segments in table.cushion_segments.values()
+        for cushion in segments.values()
+    }
+
+    events = Events()
+    for event_dict in event_dicts:
+        event = event_from_dict(event_dict)
+
+        # The agents of this event are NonObjects, since they came from a pickleable
+        # dictionary.  We attempt to change that by associating the proper agents
+        # based on object IDs. So if the NonObject agent has an id 'cue', We replace
+        # this agent with a proper instantiation of 'cue', i.e. balls['cue']
+        if event.event_type == type_ball_ball:
+            agent1, agent2 = event.agents
+            event.agents = (balls[agent1.id], balls[agent2.id])
+
+        elif event.event_type == type_ball_cushion:
+            agent1, agent2 = event.agents
+            event.agents = (balls[agent1.id], cushions[agent2.id])
+
+        elif event.event_type == type_ball_pocket:
+            agent1, agent2 = event.agents
+            event.agents = (balls[agent1.id], table.pockets[agent2.id])
+
+        elif event.event_type == type_stick_ball:
+            agent1, agent2 = event.agents
+            event.agents = (cue, balls[agent2.id])
+
+        elif event.event_class == class_transition:
+            agent = event.agents[0]
+            event.agents = (balls[agent.id],)
+
+        # The event now has no NonObject agents, so it is not longer 'partial'. For
+        # example, event.resolve may not be called
+        event.partial = False
+        events.append(event)
+
+    return events
+
+
+class PendingEvents(Events):
+    """The events of a system, or of one of its balls, that is pending a replay
+
+    The system was loaded from a recipe (see System.as_recipe). Accessing the events
+    replays the simulation (see System.replay), then reads the replayed events.
+    """
+
+    def __init__(self, system, ball_id=None):
+        self.system = system
+        self.ball_id = ball_id
+
+    def get_events(self):
+        self.system.replay()
+
+        if self.ball_id is None:
+            return self.system.events
+        return self.system.balls[self.ball_id].events
+
+    @property
+    def _list(self):
+        return self.get_events()._list
+
+    @_list.setter
+    def _list(self, value):
+        self.get_events()._list = value
+
+
+def _forward_to_history(attr):
+    def get(self):
+        return getattr(self.get_history(), attr)
+
+    def set(self, value):
+        setattr(self.get_history(), attr, value)
+
+    return property(get, set)
+
+
+class PendingHistory(BallHistory):
+    """The history of a ball of a system that is pending a replay. See PendingEvents"""
+
+    __slots__ = ("system", "ball_id", "cts")
+
+    def __init__(self, system, ball_id, cts=False):
+        self.system = system
+        self.ball_id = ball_id
+        self.cts = cts
+
+    def get_history(self):
+        self.system.replay()
+
+        ball = self.system.balls[self.ball_id]
+        return ball.history_cts if self.cts else ball.history
+
+    rvw = _forward_to_history("rvw")
+    s = _forward_to_history("s")
+    t = _forward_to_history("t")
+    vectorized = _forward_to_history("vectorized")
+
+
 class SystemHistory(object):
     def __init__(self):
         self.t = None
         self.events = Events()
         self.continuized = False
 
+        # Set while the system, loaded from a recipe, has not been replayed
+        self.recipe = None
+        self.verify_replay = False
+
     def init_history(self):
         """Add an initializing NonEvent"""
         event = NonEvent(t=0)
@@ -55,6 +186,10 @@ class SystemHistory(object):
     def reset_history(self):
         """Remove all events, histories, and reset timer"""
 
+        # Resetting the placeholders would replay the simulation
+        if self.recipe is not None:
+            self.drop_recipe()
+
         self.t = 0
         self.continuized = False
 
@@ -66,6 +201,143 @@ class SystemHistory(object):
 
         self.events.reset()
 
+    def results_as_dict(self, compress=False):
+        """Return a pickleable dictionary of the simulation results
+
+        This contains the events, ball histories, and final ball states, but not the
+        balls, table, or cue themselves. Restore with `load_results_from_dict`.
+
+        Parameters
+        ==========
+        compress : bool, False
+            If True, the ball histories are losslessly compressed (see
+            pooltool.objects.ball.history_as_dict)
+        """
+        return dict(
+            t=self.t,
+            continuized=self.continuized,
+            events=self.events.as_dict(),
+            balls={
+                ball.id: dict(
+                    rvw=np.copy(ball.rvw),
+                    s=ball.s,
+                    t=ball.t,
+                    history=history_as_dict(ball.history, compress=compress),
+                    history_cts=history_as_dict(ball.history_cts, compress=compress),
+                )
+                for ball in self.balls.values()
+            },
+        )
+
+    def load_results_from_dict(self, d):
+        """Restore simulation results stored with `results_as_dict`
+
+        Unlike `load_from_dict`, the existing ball, table, and cue objects are kept, and
+        the restored events are bound to them.
+        """
+        self.t = d["t"]
+        self.continuized = d["continuized"]
+        self.events = events_from_dict(d["events"], self.balls, self.table, self.cue)
+
+        for ball_id, ball_dict in d["balls"].items():
+            ball = self.balls[ball_id]
+            ball.set(np.copy(ball_dict["rvw"]), s=ball_dict["s"], t=ball_dict["t"])
+            ball.attach_history(history_from_dict(ball_dict["history"]))
+            ball.attach_history_cts(history_from_dict(ball_dict["history_cts"]))
+            ball.events = Events()
+            for event in self.events:
+                ball.events.append(event)
+
+    def set_recipe(self, recipe, verify=False):
+        """Make the history pending a replay of a recipe (see System.as_recipe)
+
+        The events and ball histories are replaced by placeholders, which replay the
+        simulation when they are first accessed.
+        """
+        self.recipe = recipe
+        self.verify_replay = verify
+        self.include = dict(recipe["include"])
+
+        self.events = PendingEvents(self)
+        for ball_id, ball in self.balls.items():
+            ball.events = PendingEvents(self, ball_id)
+            ball.attach_history(PendingHistory(self, ball_id))
+            ball.attach_history_cts(PendingHistory(self, ball_id, cts=True))
+
+    def drop_recipe(self):
+        """Replace the placeholders of a system pending a replay by empty histories
+
+        The recipe is discarded without replaying it. The balls are left in their
+        initial states.
+        """
+        self.recipe = None
+        self.events = Events()
+        for ball in self.balls.values():
+            ball.events = Events()
+            ball.attach_history(BallHistory())
+            ball.attach_history_cts(BallHistory())
+
+    def replay(self, verify=None):
+        """Simulate a system loaded from a recipe
+
+        This happens automatically when the events or ball histories of the system are
+        first accessed. If the system is not pending a replay, nothing is done.
+
+        Parameters
+        ==========
+        verify : bool, None
+            If True, a SimulateError is raised if the results differ from those of the
+            original simulation (see pooltool.cache.get_history_checksum), e.g. because
+            the recipe was made by another version of pooltool. If None, the `verify`
+            argument the system was loaded with is used.
+        """
+        if self.recipe is None:
+            return
+
+        from pooltool.cache import get_history_checksum
+
+        recipe = self.recipe
+        if verify is None:
+            verify = self.verify_replay
+
+        # The placeholders are replaced before simulating, so that accessing them
+        # during the simulation does not replay again
+        self.drop_recipe()
+
+        self.simulate(
+            quiet=True, raise_simulate_error=True, **recipe["simulate_kwargs"]
+        )
+
+        if verify and get_history_checksum(self) != recipe["checksum"]:
+            raise SimulateError(
+                f"System.replay :: The replayed simulation differs from the original "
+                f"one, which was made with pooltool {recipe['version']}"
+            )
+
+    def reset_history_cts(self):
+        """Remove the continuized histories, e.g. after the history has changed"""
+
+        self.continuized = False
+
+        for ball in self.balls.values():
+            ball.history_cts.reset()
+
+    def truncate_history(self, n):
+        """Keep only the first n events and the corresponding ball histories
+
+        The ball states are left untouched.
+        """
+
+        num_removed = len(self.events) - n
+        if num_removed <= 0:
+            return
+
+        for ball in self.balls.values():
+            ball.history.truncate(n)
+            ball.events._list = ball.events[: len(ball.events) - num_removed]
+
+        self.events._list = self.events[:n]
+
     def set_from_history(self, i):
         """Set the ball states according to a history index"""
         for ball in self.balls.values():
@@ -95,6 +367,27 @@ class SystemHistory(object):
 
         self.events.append(event)
 
+    def update_history_batch(self, events):
+        """Updates the history of each ball for a batch of simultaneous events
+
+        Each event is appended to the system events, and each ball history gains one
+        entry per event, so that history indices stay aligned with event indices.
+        However, the state of each ball is copied only once per batch, and the history
+        and events of each ball are extended in one step per batch.
+
+        Parameters
+        ==========
+        events : list of class with base events.Event
+            Events that all share the same time
+        """
+        self.t = events[0].time
+
+        for ball in self.balls.values():
+            ball.history.add_repeated(np.copy(ball.rvw), ball.s, self.t, len(events))
+            ball.events.extend(events)
+
+        self.events.extend(events)
+
     def continuize(self, dt=0.01):
         """Create BallHistory for each ball with timepoints _inbetween_ events
 
@@ -226,13 +519,13 @@ class SystemRender(object):
                 )
 
         if self.ball_animations is None:
-            # This takes ~90% of this method's execution time
-            self.ball_animations = Parallel()
+            # One interval plays back the sampled trajectories of all balls
             for ball in self.balls.values():
                 if not ball.rendered:
                     ball.render()
-                ball.set_playback_sequence(playback_speed=self.playback_speed)
-                self.ball_animations.append(ball.playback_sequence)
+            self.ball_animations = Parallel(
+                BallPlayback(self.balls.values(), playback_speed=self.playback_speed)
+            )
 
         if self.user_stroke and animate_stroke:
             # There exists a stroke trajectory, and animating the stroke has been
@@ -321,11 +614,11 @@ class SystemRender(object):
         self.cue.init_focus(self.cue.cueing_ball)
 
 
-class System(SystemHistory, SystemRender, EvolveShotEventBased):
+class System(SystemHistory, SystemRender, EvolveShotHybrid, EvolveShotCompiled):
     def __init__(self, path=None, cue=None, table=None, balls=None, d=None):
         SystemHistory.__init__(self)
         SystemRender.__init__(self)
-        EvolveShotEventBased.__init__(self)
+        EvolveShotHybrid.__init__(self)
 
         if path and (cue or table or balls):
             raise ConfigError(
@@ -382,12 +675,16 @@ class System(SystemHistory, SystemRender, EvolveShotEventBased):
     def get_system_energy(self):
         energy = 0
         for ball in self.balls.values():
-            energy += physics.get_ball_energy(ball.rvw, ball.R, ball.m)
+            energy += physics.get_ball_energy_fast(ball.rvw, ball.R, ball.m)
 
         return energy
 
     def reset_balls(self):
         """Reset balls to their initial states, i.e. ball.history.*[0]"""
+        if self.recipe is not None:
+            # The balls of a system pending a replay are in their initial states
+            return
+
         for ball in self.balls.values():
             try:
                 ball.set_from_history(0)
@@ -395,9 +692,13 @@ class System(SystemHistory, SystemRender, EvolveShotEventBased):
                 pass
 
     def is_balls_overlapping(self):
+        """Returns True if any two balls on the table overlap
+
+        Pocketed balls are ignored, since balls in the same pocket share a position.
+        """
         for ball1 in self.balls.values():
             for ball2 in self.balls.values():
-                if ball1 is ball2:
+                if ball1 is ball2 or c.pocketed in (ball1.s, ball2.s):
                     continue
 
                 if physics.is_overlapping(ball1.rvw, ball2.rvw, ball1.R, ball2.R):
@@ -410,13 +711,36 @@ class System(SystemHistory, SystemRender, EvolveShotEventBased):
             "set_system_state FIXME. What should this take as input?"
         )
 
-    def as_dict(self):
+    def as_dict(self, history_cts=True, compress=False):
+        """Return a pickleable dictionary of the system
+
+        Each event is stored once, in the events of the system. The balls refer to their
+        events by index.
+
+        Parameters
+        ==========
+        history_cts : bool, True
+            If False, the continuous ball histories are not stored. They can be rebuilt
+            with `continuize`, which animating a system does automatically.
+        compress : bool, False
+            If True, the ball histories are losslessly compressed. This makes the
+            dictionary several times smaller, at a small cost in speed.
+        """
         d = {}
 
         if self.balls:
+            # Events of a ball that are not events of the system (which should not
+            # happen) are stored in full
+            positions = {id(event): i for i, event in enumerate(self.events)}
+
             d["balls"] = {}
             for ball in self.balls.values():
-                d["balls"][ball.id] = ball.as_dict()
+                indices = [positions.get(id(event)) for event in ball.events]
+                d["balls"][ball.id] = ball.as_dict(
+                    event_indices=None if None in indices else indices,
+                    history_cts=history_cts,
+                    compress=compress,
+                )
 
         if self.cue:
             d["cue"] = self.cue.as_dict()
@@ -450,48 +774,116 @@ class System(SystemHistory, SystemRender, EvolveShotEventBased):
         else:
             table = None
 
-        events = Events()
-        for event_dict in d["events"]:
-            event = event_from_dict(event_dict)
-
-            # The agents of this event are NonObjects, since they came from a pickleable
-            # dictionary.  We attempt to change that by associating the proper agents
-            # based on object IDs. So if the NonObject agent has an id 'cue', We replace
-            # this agent with a proper instantiation of 'cue', i.e. balls['cue']
-            if event.event_type == type_ball_ball:
-                agent1, agent2 = event.agents
-                event.agents = (balls[agent1.id], balls[agent2.id])
-
-            elif event.event_type == type_ball_cushion:
-                agent1, agent2 = event.agents
-                if agent2.id.endswith("edge"):
-                    cushion = table.cushion_segments["linear"][agent2.id.split("_")[0]]
-                else:
-                    cushion = table.cushion_segments["circular"][agent2.id]
-                event.agents = (balls[agent1.id], cushion)
+        events = events_from_dict(d["events"], balls, table, cue)
 
-            elif event.event_type == type_ball_pocket:
-                agent1, agent2 = event.agents
-                event.agents = (balls[agent1.id], table.pockets[agent2.id])
+        for ball_id, ball_dict in d.get("balls", {}).items():
+            if "event_indices" in ball_dict:
+                for i in ball_dict["event_indices"]:
+                    balls[ball_id].events.append(events[i])
 
-            elif event.event_type == type_stick_ball:
-                agent1, agent2 = event.agents
-                event.agents = (cue, balls[agent2.id])
+        meta = d["meta"]
 
-            elif event.event_class == class_transition:
-                agent = event.agents[0]
-                event.agents = (balls[agent.id],)
+        return balls, table, cue, events, meta
 
-            # The event now has no NonObject agents, so it is not longer 'partial'. For
-            # example, event.resolve may not be called
-            event.partial = False
-            events.append(event)
+    def as_recipe(self, simulate_kwargs=None):
+        """Return a pickleable dictionary from which the system can be re-simulated
 
-        meta = d["meta"]
+        Simulating is deterministic, so only the inputs of the simulation are stored:
+        the initial states of the balls, the cue, the table, and the keyword arguments
+        of `simulate`, along with the pooltool version and a checksum of the results
+        (see pooltool.cache.get_history_checksum). When the system is loaded, its events
+        and ball histories are rebuilt by replaying the simulation the first time they
+        are accessed (see `replay`). A recipe is typically 100 times smaller than
+        `as_dict`. A system that was not simulated is stored with `as_dict`, and a
+        system pending a replay is stored with the recipe it was loaded from.
 
-        return balls, table, cue, events, meta
+        Parameters
+        ==========
+        simulate_kwargs : dict, None
+            The keyword arguments the system was simulated with. If None, those of the
+            last call to `simulate` are used. They must be given for systems whose
+            history was not made by `simulate`, e.g. loaded, forked or resumed systems.
+        """
+        from pooltool import __version__
+        from pooltool.cache import get_history_checksum
+
+        if self.recipe is not None and simulate_kwargs is None:
+            return self.pending_as_recipe()
+
+        if not len(self.events):
+            return self.as_dict()
+
+        if simulate_kwargs is None:
+            simulate_kwargs = self.simulate_kwargs
 
-    def save(self, path, set_to_initial=True):
+        if simulate_kwargs is None:
+            raise ConfigError(
+                "System.as_recipe :: The history of this system was not made by "
+                "`simulate`, so `simulate_kwargs` must be given"
+            )
+
+        if simulate_kwargs.get("stop_when") is not None or (
+            self.halt is not None and self.halt.reason in ("max_wall_time", "cancelled")
+        ):
+            raise ConfigError(
+                "System.as_recipe :: Simulations stopped by `stop_when`, "
+                "`max_wall_time` or a cancellation cannot be replayed"
+            )
+
+        balls = {}
+        for ball in self.balls.values():
+            ball_dict = ball.as_dict(event_indices=[], history_cts=False)
+            rvw, s, t = ball.history.get_state(0)
+            ball_dict.update(
+                rvw=np.copy(rvw), s=s, t=t, history=history_as_dict(BallHistory())
+            )
+            balls[ball.id] = ball_dict
+
+        return dict(
+            balls=balls,
+            cue=self.cue.as_dict(),
+            table=self.table.as_dict(),
+            events=[],
+            meta=self.meta,
+            recipe=dict(
+                version=__version__,
+                simulate_kwargs=dict(simulate_kwargs),
+                include=dict(self.include),
+                checksum=get_history_checksum(self),
+            ),
+        )
+
+    def pending_as_recipe(self):
+        """Return the recipe of a system pending a replay, without replaying it"""
+        recipe = self.recipe
+
+        # The placeholders are set aside, so that storing the balls does not replay
+        self.drop_recipe()
+        try:
+            balls = {
+                ball.id: ball.as_dict(event_indices=[], history_cts=False)
+                for ball in self.balls.values()
+            }
+        finally:
+            self.set_recipe(recipe, verify=self.verify_replay)
+
+        return dict(
+            balls=balls,
+            cue=self.cue.as_dict(),
+            table=self.table.as_dict(),
+            events=[],
+            meta=self.meta,
+            recipe=dict(recipe),
+        )
+
+    def save(
+        self,
+        path,
+        set_to_initial=True,
+        history_cts=True,
+        compress=False,
+        recipe=False,
+    ):
         """Save the system state as a pickle
 
         Parameters
@@ -500,21 +892,41 @@ class System(SystemHistory, SystemRender, EvolveShotEventBased):
             Prior to saving, this method sets the ball states the initial states in the
             history.  However, this can be prevented by setting this to False, causing
             the ball states to be saved as is.
+        history_cts, compress
+            See `as_dict`
+        recipe : bool, False
+            If True, only what is needed to replay the simulation is saved. See
+            `as_recipe`
         """
         if set_to_initial:
             self.reset_balls()
-        utils.save_pickle(self.as_dict(), path)
 
-    def load(self, path):
-        """Load a pickle-stored system state"""
-        self.balls, self.table, self.cue, self.events, self.meta = self.from_dict(
-            utils.load_pickle(path)
-        )
+        if recipe:
+            d = self.as_recipe()
+        else:
+            d = self.as_dict(history_cts=history_cts, compress=compress)
+
+        utils.save_pickle(d, path)
+
+    def load(self, path, verify=False):
+        """Load a pickle-stored system state. See `load_from_dict`"""
+        self.load_from_dict(utils.load_pickle(path), verify=verify)
 
-    def load_from_dict(self, d):
-        """Load a dictionary-stored system state"""
+    def load_from_dict(self, d, verify=False):
+        """Load a dictionary-stored system state
+
+        Parameters
+        ==========
+        verify : bool, False
+            For systems stored as recipes (see `as_recipe`), whether to check that the
+            replayed simulation matches the original one. See `replay`
+        """
         self.balls, self.table, self.cue, self.events, self.meta = self.from_dict(d)
 
+        self.recipe = None
+        if "recipe" in d:
+            self.set_recipe(d["recipe"], verify=verify)
+
     def copy(self, set_to_initial=True):
         """Make a fresh copy of this system state
 
@@ -534,6 +946,92 @@ class System(SystemHistory, SystemRender, EvolveShotEventBased):
         system = self.__class__(balls=balls, table=table, cue=cue)
         system.events = events
         system.meta = meta
+        system.simulate_kwargs = self.simulate_kwargs
+        return system
+
+    def fork(self, at_event=-1):
+        """Branch off a new system at the moment just after an event
+
+        The branch shares its history prefix (events and ball histories up to and
+        including `at_event`) with this system. No states are copied: the branch
+        references the same event states and history arrays, which are treated as
+        immutable, and only the containers holding them are new. This makes forking
+        far cheaper than `copy`.
+
+        The balls of the branch are set to their states just after `at_event`. They
+        can be modified before calling `resume` on the branch, which simulates forward
+        from that point without re-simulating the prefix.
+
+        Parameters
+        ==========
+        at_event : int, -1
+            The index of the event in `self.events` to branch off from. Negative
+            indexing is supported.
+
+        Returns
+        =======
+        output : System
+            The branch. It shares the table with this system.
+        """
+        if not len(self.events):
+            raise ConfigError("System.fork :: There is no history to fork from")
+
+        i = at_event % len(self.events)
+
+        balls = {}
+        for ball_id, ball in self.balls.items():
+            branch_ball = Ball(
+                ball_id,
+                m=ball.m,
+                R=ball.R,
+                u_s=ball.u_s,
+                u_r=ball.u_r,
+                u_sp=ball.u_sp,
+                g=ball.g,
+                e_c=ball.e_c,
+                f_c=ball.f_c,
+                rel_model_path=ball.rel_model_path,
+            )
+            branch_ball.initial_orientation = ball.initial_orientation
+
+            history = BallHistory()
+            history.rvw = list(ball.history.rvw[: i + 1])
+            history.s = list(ball.history.s[: i + 1])
+            history.t = list(ball.history.t[: i + 1])
+            branch_ball.attach_history(history)
+
+            rvw, s, t = ball.history.get_state(i)
+            branch_ball.set(np.copy(rvw), s=s, t=t)
+
+            balls[ball_id] = branch_ball
+
+        if self.cue is not None:
+            cue = cue_from_dict(self.cue.as_dict())
+            if cue.cueing_ball_id in balls:
+                cue.set_state(cueing_ball=balls[cue.cueing_ball_id])
+        else:
+            cue = None
+
+        def rebind(agent):
+            if agent.object_type == "ball":
+                return balls[agent.id]
+            elif agent.object_type == "cue_stick":
+                return cue
+            return agent
+
+        events = Events()
+        for event in self.events[: i + 1]:
+            branch_event = copy.copy(event)
+            branch_event.agents = tuple(rebind(agent) for agent in event.agents)
+            events.append(branch_event)
+
+        for ball in balls.values():
+            ball.events._list = list(events)
+
+        system = self.__class__(balls=balls, table=self.table, cue=cue)
+        system.events = events
+        system.meta = self.meta
+        system.t = events[-1].time
         return system
 
 
@@ -552,14 +1050,15 @@ class SystemCollectionRender(object):
             # `max_dur` is the shot duration of the longest shot in the collection. All
             # shots beside this one will have a buffer appended where the balls stay in
             # their final state until the last shot finishes.
-            max_dur = max([shot.events[-1].time for shot in self])
+            shots = self.get_parallel_systems()
+            max_dur = max([shot.events[-1].time for shot in shots])
 
             # FIXME `leading_buffer` should be utilized here to sync up all shots that
             # have cue trajectories such that the ball animations all start at the
             # moment of the stick-ball collision
             pass
 
-            for shot in self:
+            for shot in shots:
                 shot_dur = shot.events[-1].time
                 shot.init_shot_animation(
                     trailing_buffer=max_dur - shot_dur,
@@ -587,7 +1086,7 @@ class SystemCollectionRender(object):
 
     def clear_animation(self):
         if self.parallel:
-            for shot in self:
+            for shot in self.get_parallel_systems():
                 shot.clear_animation()
         else:
             self.active.clear_animation()
@@ -601,14 +1100,14 @@ class SystemCollectionRender(object):
         self.clear_animation()
 
         if self.parallel:
-            for shot in self:
+            for shot in self.get_parallel_systems():
                 shot.teardown()
             self.active.buildup()
             self.parallel = False
             self.set_animation()
         else:
             self.active.teardown()
-            for shot in self:
+            for shot in self.get_parallel_systems():
                 shot.buildup()
             self.parallel = True
             self.set_animation()
@@ -640,7 +1139,7 @@ class SystemCollectionRender(object):
         # FIXME This messes up the syncing of shots when self.parallel is True. One
         # clear issue is that trailing_buffer times do not respect self.playback_speed.
         self.playback_speed *= factor
-        for shot in self:
+        for shot in self.get_loaded_systems():
             shot.playback_speed *= factor
             shot.continuized = False
 
@@ -666,12 +1165,14 @@ class SystemCollectionRender(object):
         self.shot_animation.set_t(new_t)
 
     def highlight_system(self, i):
-        for system in self:
+        shots = self.get_parallel_systems()
+        for system in shots:
             for ball in system.balls.values():
-                ball.set_alpha(1 / len(self))
+                ball.set_alpha(1 / len(shots))
 
-        for ball in self[i].balls.values():
-            ball.set_alpha(1.0)
+        if any(system is self[i] for system in shots):
+            for ball in self[i].balls.values():
+                ball.set_alpha(1.0)
 
 
 class SystemCollection(utils.ListLike, SystemCollectionRender):
@@ -689,8 +1190,10 @@ class SystemCollection(utils.ListLike, SystemCollectionRender):
     def append(self, system):
         if len(self):
             # In order to append a system, the table must be damn-near identical to
-            # existing systems in this collection. Otherwise we raise an error
-            if system.table.as_dict() != self[0].table.as_dict():
+            # existing systems in this collection. Otherwise we raise an error. Tables
+            # with equal parameters share a memoized geometry, so this is usually an
+            # identity check
+            if system.table.geometry != self[0].table.geometry:
                 raise ConfigError(
                     f"Cannot append System '{system}', which has a different table "
                     f"than the rest of the SystemCollection"
@@ -761,13 +1264,31 @@ class SystemCollection(utils.ListLike, SystemCollectionRender):
 
         self.active_index = i
 
-    def as_pickleable_object(self):
-        return [system.as_dict() for system in self]
+    def get_parallel_systems(self):
+        """Returns the systems shown at once when viewing in parallel"""
+        return list(self)
+
+    def get_loaded_systems(self):
+        """Returns the systems held in memory"""
+        return list(self)
+
+    def as_pickleable_object(self, recipe=False, **kwargs):
+        """See System.as_dict and System.as_recipe"""
+        if recipe:
+            return [system.as_recipe() for system in self]
 
-    def save(self, path):
+        return [system.as_dict(**kwargs) for system in self]
+
+    def save(self, path, history_cts=True, compress=False, recipe=False):
+        """Save the systems as a pickle. See System.save for the arguments"""
         for system in self:
             system.reset_balls()
-        utils.save_pickle(self.as_pickleable_object(), path)
+        utils.save_pickle(
+            self.as_pickleable_object(
+                recipe=recipe, history_cts=history_cts, compress=compress
+            ),
+            path,
+        )
 
     def load(self, path):
         obj = utils.load_pickle(path)
@@ -777,3 +1298,204 @@ class SystemCollection(utils.ListLike, SystemCollectionRender):
     def clear(self):
         self.active = None
         self._list = []
+
+
+class LazySystemCollection(SystemCollection):
+    def __init__(self, dataset, ids=None, cache_size=32, prefetch=8, parallel_size=16):
+        """A SystemCollection that loads its systems from a ShotDataset on access
+
+        The collection only holds references to the systems in the dataset. A system is
+        built when it is accessed, and the `cache_size` most recently accessed systems
+        are kept in memory. The active system, and the systems viewed in parallel, are
+        always kept. Systems appended to the collection (e.g. with
+        append_copy_of_active) are held in memory, and are not written to the dataset.
+
+        Parameters
+        ==========
+        dataset : pooltool.dataset.ShotDataset or str or pathlib.Path
+            The dataset holding the systems, or its directory
+        ids : iterable, None
+            The ids of the systems of the collection, in order, e.g. the result of an
+            OutcomeIndex query. If None, all the systems of the dataset, in the order of
+            its index.
+        cache_size : int, 32
+            The number of recently accessed systems kept in memory
+        prefetch : int, 8
+            While iterating, up to this many of the next systems are loaded ahead, in a
+            background thread
+        parallel_size : int, 16
+            Viewing in parallel shows at most this many systems around the active one
+        """
+        from pooltool.dataset import ShotDataset, kind_system
+
+        SystemCollection.__init__(self)
+
+        if not isinstance(dataset, ShotDataset):
+            dataset = ShotDataset(dataset)
+
+        self.dataset = dataset
+        self.cache_size = cache_size
+        self.prefetch = prefetch
+        self.parallel_size = parallel_size
+
+        if ids is None:
+            entries = [entry for entry in dataset.index if entry["kind"] == kind_system]
+        else:
+            entries = [dataset.get_entry(shot_id) for shot_id in ids]
+            for entry in entries:
+                if entry["kind"] != kind_system:
+                    raise ConfigError(
+                        f"LazySystemCollection :: Shot '{entry['id']}' is an outcome, "
+                        f"not a system"
+                    )
+
+        self._list = entries
+        self._cache = collections.OrderedDict()
+        self._pinned = {}
+        self._parallel = None
+
+    def _get_loaded(self, key):
+        if key in self._pinned:
+            return self._pinned[key]
+
+        if key in self._cache:
+            self._cache.move_to_end(key)
+            return self._cache[key]
+
+        return None
+
+    def _add_to_cache(self, key, system):
+        self._cache[key] = system
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
+    def _build(self, entry):
+        system = self.dataset.load(entry)
+        system.playback_speed = self.playback_speed
+        return system
+
+    def _load(self, ref):
+        """Returns the system of a reference, which is a System or an index entry"""
+        if isinstance(ref, System):
+            return ref
+
+        system = self._get_loaded(ref["id"])
+        if system is None:
+            system = self._build(ref)
+            self._add_to_cache(ref["id"], system)
+
+        return system
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self._load(ref) for ref in self._list[index]]
+
+        return self._load(self._list[index])
+
+    def __iter__(self):
+        refs = iter(list(self._list))
+        executor = ThreadPoolExecutor(max_workers=1)
+
+        def submit(ref):
+            if isinstance(ref, System) or self._get_loaded(ref["id"]) is not None:
+                return None
+            return executor.submit(self._build, ref)
+
+        pending = collections.deque(
+            (ref, submit(ref)) for ref in itertools.islice(refs, self.prefetch + 1)
+        )
+
+        try:
+            while pending:
+                ref, future = pending.popleft()
+                for next_ref in itertools.islice(refs, 1):
+                    pending.append((next_ref, submit(next_ref)))
+
+                if future is None:
+                    yield self._load(ref)
+                    continue
+
+                # The system may have been loaded meanwhile, e.g. by the caller
+                system = self._get_loaded(ref["id"])
+                if system is None:
+                    system = future.result()
+                    self._add_to_cache(ref["id"], system)
+
+                yield system
+        finally:
+            executor.shutdown(wait=True, cancel_futures=True)
+
+    def _update_pinned(self):
+        pinned = {}
+        for key, system in self._parallel or []:
+            if key is not None:
+                pinned[key] = system
+
+        if self.active is not None:
+            ref = self._list[self.active_index]
+            if not isinstance(ref, System):
+                pinned[ref["id"]] = self.active
+
+        # Systems that are no longer pinned are cached, as the most recently accessed
+        for key, system in self._pinned.items():
+            if key not in pinned:
+                self._add_to_cache(key, system)
+
+        for key in pinned:
+            self._cache.pop(key, None)
+
+        self._pinned = pinned
+
+    def set_active(self, i):
+        SystemCollection.set_active(self, i)
+        self._update_pinned()
+
+    def get_parallel_systems(self):
+        """Returns the systems viewed in parallel
+
+        These are up to `parallel_size` systems around the active system, chosen when
+        parallel viewing starts.
+        """
+        if self._parallel is None:
+            index = self.active_index or 0
+            start = max(
+                0, min(index - self.parallel_size // 2, len(self) - self.parallel_size)
+            )
+
+            # Systems held in memory need no pinning, and have no key
+            self._parallel = [
+                (None if isinstance(ref, System) else ref["id"], self._load(ref))
+                for ref in self._list[start : start + self.parallel_size]
+            ]
+            self._update_pinned()
+
+        return [system for _, system in self._parallel]
+
+    def toggle_parallel(self):
+        SystemCollection.toggle_parallel(self)
+
+        if not self.parallel:
+            self._parallel = None
+            self._update_pinned()
+
+    def get_loaded_systems(self):
+        systems = {}
+        for system in itertools.chain(
+            self._pinned.values(),
+            self._cache.values(),
+            (ref for ref in self._list if isinstance(ref, System)),
+        ):
+            systems[id(system)] = system
+
+        return list(systems.values())
+
+    def load(self, path):
+        raise ConfigError(
+            "LazySystemCollection :: Systems are loaded from its ShotDataset"
+        )
+
+    def clear(self):
+        SystemCollection.clear(self)
+        self._cache.clear()
+        self._pinned = {}
+        self._parallel = None
@@ -1,5 +1,5 @@
 #! /usr/bin/env python
-"""For some reason, `numba_cache` in pooltool/constants.py must be set to False prior to running this script"""
+"""For some reason, caching must be disabled (POOLTOOL_NUMBA_CACHE=0) when running this script"""
 
 from pathlib import Path
 
@@ -30,7 +30,7 @@ if __name__ == "__main__":
     import argparse
 
     ap = argparse.ArgumentParser(
-        description="For some reason, `numba_cache` in pooltool/constants.py must be set to False prior to running this script"
+        description="For some reason, caching must be disabled (POOLTOOL_NUMBA_CACHE=0) when running this script"
     )
     ap.add_argument("--type", choices=["time", "profile"], required=True)
     ap.add_argument("--path", default="cachegrind.out.benchmark")
@@ -0,0 +1,48 @@
+#! /usr/bin/env python
+"""Times a batch of shots simulated with the compiled algorithm on 1 and N threads
+
+Since the compiled kernel releases the GIL, the batch should complete faster with more
+threads, up to the number of cores. On a single thread, the kernel is slower than the
+Python event-based algorithm (compare the 'event' timing), so the compiled algorithm
+pays off only when several threads can run at once.
+"""
+
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import IPython
+
+import pooltool as pt
+
+system = pt.System(path="benchmark_short.pkl")
+shots = [system.copy() for _ in range(16)]
+
+# Run once to compile all numba functions. By doing this,
+# compilation times will be excluded in the timing.
+system.copy().simulate(algorithm="compiled", quiet=True)
+system.copy().simulate(quiet=True)
+
+
+def simulate(shot, algorithm="compiled"):
+    shot.copy().simulate(algorithm=algorithm, quiet=True)
+
+
+def run_event():
+    for shot in shots:
+        simulate(shot, algorithm="event")
+
+
+def run_threads(num_threads):
+    with ThreadPoolExecutor(max_workers=num_threads) as executor:
+        list(executor.map(simulate, shots))
+
+
+num_threads = os.cpu_count()
+
+ipython = IPython.get_ipython()
+print("event, 1 thread")
+ipython.magic("timeit run_event()")
+print("compiled, 1 thread")
+ipython.magic("timeit run_threads(1)")
+print(f"compiled, {num_threads} threads")
+ipython.magic("timeit run_threads(num_threads)")
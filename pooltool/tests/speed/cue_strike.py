@@ -0,0 +1,39 @@
+#! /usr/bin/env python
+
+import IPython
+import numpy as np
+
+import pooltool as pt
+
+ipython = IPython.get_ipython()
+
+
+def get_args():
+    return (
+        0.170097,
+        0.567,
+        0.028575,
+        *np.random.rand(1) * 3,
+        *np.random.rand(1) * 360,
+        *np.random.rand(1) * 45,
+        *np.random.rand(2) - 0.5,
+    )
+
+
+def old():
+    pt.physics.cue_strike(*get_args())
+
+
+def new():
+    pt.physics.cue_strike_fast(*get_args())
+
+
+new()
+
+ipython.magic("timeit old()")
+ipython.magic("timeit new()")
+
+args = get_args()
+output1 = pt.physics.cue_strike(*args)
+output2 = pt.physics.cue_strike_fast(*args)
+np.testing.assert_allclose(output1, output2)
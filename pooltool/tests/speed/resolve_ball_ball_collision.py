@@ -0,0 +1,34 @@
+#! /usr/bin/env python
+
+import IPython
+import numpy as np
+
+import pooltool as pt
+
+ipython = IPython.get_ipython()
+
+
+def get_args():
+    return (
+        np.random.rand(9).reshape((3, 3)),
+        np.random.rand(9).reshape((3, 3)),
+    )
+
+
+def old():
+    pt.physics.resolve_ball_ball_collision(*get_args())
+
+
+def new():
+    pt.physics.resolve_ball_ball_collision_fast(*get_args())
+
+
+new()
+
+ipython.magic("timeit old()")
+ipython.magic("timeit new()")
+
+args = get_args()
+output2 = pt.physics.resolve_ball_ball_collision_fast(*args)
+output1 = pt.physics.resolve_ball_ball_collision(*args)
+np.testing.assert_allclose(output1, output2)
@@ -0,0 +1,39 @@
+#! /usr/bin/env python
+
+import IPython
+import numpy as np
+
+import pooltool as pt
+
+ipython = IPython.get_ipython()
+
+
+def get_args():
+    return (
+        np.random.rand(9).reshape((3, 3)),
+        np.array([1, 0, 0], dtype=np.float64),
+        0.028575,
+        0.170097,
+        0.036,
+        0.85,
+        0.2,
+    )
+
+
+def old():
+    pt.physics.resolve_ball_cushion_collision(*get_args())
+
+
+def new():
+    pt.physics.resolve_ball_cushion_collision_fast(*get_args())
+
+
+new()
+
+ipython.magic("timeit old()")
+ipython.magic("timeit new()")
+
+args = get_args()
+output1 = pt.physics.resolve_ball_cushion_collision(*args)
+output2 = pt.physics.resolve_ball_cushion_collision_fast(*args)
+np.testing.assert_allclose(output1, output2)
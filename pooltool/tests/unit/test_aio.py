@@ -0,0 +1,149 @@
+#! /usr/bin/env python
+
+import asyncio
+import threading
+import time
+
+import pytest
+
+import pooltool as pt
+from pooltool.tests import ref, trial
+
+
+def slow_stop_when(delay):
+    def stop_when(event):
+        time.sleep(delay)
+        return False
+
+    return stop_when
+
+
+def test_asimulate(ref, trial):
+    async def main():
+        return await pt.asimulate(ref, t_final=1.0)
+
+    assert asyncio.run(main()) is None
+    assert ref.events[-1].time >= 1.0
+    assert len(ref.events) < len(trial.events)
+
+
+def test_asimulate_many(ref, trial):
+    shots = [ref.copy() for _ in range(4)]
+
+    async def main():
+        return await pt.asimulate_many(shots, algorithm="compiled")
+
+    assert asyncio.run(main()) == [None] * 4
+    for shot in shots:
+        assert [e.time for e in shot.events] == pytest.approx(
+            [e.time for e in trial.events], abs=1e-6
+        )
+
+
+def test_timeout_stops_simulation(ref, trial):
+    simulator = pt.AsyncSimulator(max_concurrency=1)
+
+    async def main():
+        with pytest.raises(asyncio.TimeoutError):
+            await simulator.simulate(ref, timeout=0.2, stop_when=slow_stop_when(0.05))
+
+        # The slot is freed once the simulation has stopped
+        start = time.perf_counter()
+        await simulator.simulate(ref.copy(), t_final=0.1)
+        return time.perf_counter() - start
+
+    assert asyncio.run(main()) < 1.0
+    assert len(ref.events) < len(trial.events)
+    simulator.shutdown()
+
+
+def test_cancel_and_priority(ref):
+    simulator = pt.AsyncSimulator(max_concurrency=1)
+    order = []
+
+    def record(name):
+        def stop_when(event):
+            if name not in order:
+                order.append(name)
+            return False
+
+        return stop_when
+
+    async def main():
+        blocker = asyncio.ensure_future(
+            simulator.simulate(ref, stop_when=slow_stop_when(0.05))
+        )
+        await asyncio.sleep(0.1)
+
+        tasks = [
+            asyncio.ensure_future(
+                simulator.simulate(ref.copy(), priority=priority, stop_when=record(p))
+            )
+            for priority, p in [(2, "low"), (0, "high"), (1, "mid")]
+        ]
+        await asyncio.sleep(0.1)
+
+        blocker.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await blocker
+
+        await asyncio.gather(*tasks)
+
+    asyncio.run(main())
+    assert order == ["high", "mid", "low"]
+    simulator.shutdown()
+
+
+def test_pool(ref, trial):
+    async def main(simulator):
+        # The simulation is interrupted, while it is still compiling
+        with pytest.raises(asyncio.TimeoutError):
+            await simulator.simulate(ref.copy(), timeout=0.01)
+
+        return await simulator.simulate(ref)
+
+    with pt.WorkerPool(processes=1, warmup=False) as pool:
+        assert asyncio.run(main(pt.AsyncSimulator(pool=pool))) is None
+
+    assert [e.event_type for e in ref.events] == [e.event_type for e in trial.events]
+
+
+def test_pool_halt(ref):
+    ref.halt = "stale"
+
+    async def main(simulator):
+        return await simulator.simulate(ref, max_events=5)
+
+    with pt.WorkerPool(processes=1, warmup=False) as pool:
+        halt = asyncio.run(main(pt.AsyncSimulator(pool=pool)))
+
+    assert halt is ref.halt
+    assert halt.reason == "max_events"
+    assert ref.events[-2] is halt.last_events[-1]
+
+
+def test_recipe_and_cleanup(ref):
+    # Threads of the default simulator are shut down with the loop
+    num_threads = threading.active_count()
+    asyncio.run(pt.asimulate(ref))
+    assert threading.active_count() == num_threads
+
+    # The cancellation mechanism is not recorded, so the shot can be stored as a recipe
+    assert ref.simulate_kwargs == {}
+    shot = pt.System(d=ref.as_recipe())
+    assert len(shot.events) == len(ref.events)
+
+
+def test_cancelled_halt(ref):
+    simulator = pt.AsyncSimulator(max_concurrency=1)
+
+    async def main():
+        with pytest.raises(asyncio.TimeoutError):
+            await simulator.simulate(ref, timeout=0.2, stop_when=slow_stop_when(0.05))
+
+    asyncio.run(main())
+    simulator.shutdown()
+
+    assert ref.halt.reason == "cancelled"
+    with pytest.raises(pt.error.ConfigError):
+        ref.as_recipe()
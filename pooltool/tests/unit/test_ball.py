@@ -4,8 +4,10 @@ import tempfile
 
 import numpy as np
 import pytest
+from panda3d.core import NodePath
 
 import pooltool as pt
+from pooltool.ani.playback import BallPlayback, interpolate_state
 from pooltool.error import ConfigError
 from pooltool.objects.ball import Ball
 from pooltool.tests import ref, trial
@@ -31,3 +33,60 @@ def test_save(trial):
         np.testing.assert_allclose(ball.history_cts.rvw, pickle_ball.history_cts.rvw)
         np.testing.assert_allclose(ball.history_cts.s, pickle_ball.history_cts.s)
         np.testing.assert_allclose(ball.history_cts.t, pickle_ball.history_cts.t)
+
+
+def test_interpolate_state():
+    times = np.array([0, 1, 3])
+    xyzs = np.array([[0, 0, 0], [1, 0, 0], [1, 2, 0]], dtype=float)
+    quats = np.array([[1, 0, 0, 0], [0, 1, 0, 0], [0, 1, 0, 0]], dtype=float)
+
+    i, xyz, quat = interpolate_state(0.5, times, xyzs, quats)
+    assert i == 0
+    np.testing.assert_allclose(xyz, [0.5, 0, 0])
+    np.testing.assert_allclose(quat, [np.sqrt(0.5), np.sqrt(0.5), 0, 0])
+
+    i, xyz, _ = interpolate_state(2, times, xyzs, quats)
+    assert i == 1
+    np.testing.assert_allclose(xyz, [1, 1, 0])
+
+    # Times outside of the trajectory are clamped
+    np.testing.assert_allclose(interpolate_state(-1, times, xyzs, quats)[1], xyzs[0])
+    np.testing.assert_allclose(interpolate_state(10, times, xyzs, quats)[1], xyzs[-1])
+
+    # The shortest arc is taken between antipodal representations
+    _, _, quat = interpolate_state(0.5, times[:2], quats[:2, :3], -quats[[0, 0]])
+    np.testing.assert_allclose(quat, [-1, 0, 0, 0])
+
+
+def test_playback(trial):
+    shot = trial.copy()
+    for ball in shot.balls.values():
+        ball.nodes = {"pos": NodePath("pos"), "shadow": NodePath("shadow")}
+
+    playback = BallPlayback(shot.balls.values(), playback_speed=2)
+    assert playback.getDuration() == pytest.approx(shot.events[-1].time / 2)
+
+    moving = [trajectory[0] for trajectory in playback.trajectories]
+    assert len(moving)
+
+    playback.privStep(0)
+    for ball in moving:
+        np.testing.assert_allclose(
+            ball.nodes["pos"].getPos(), ball.history_cts.rvw[0, 0]
+        )
+
+    # A sample is reached at the time it was continuized to
+    history = moving[0].history_cts
+    i = len(history.t) // 2
+    playback.privStep(history.t[i + 1] / 2)
+    np.testing.assert_allclose(moving[0].nodes["pos"].getPos(), history.rvw[i, 0])
+    np.testing.assert_allclose(
+        moving[0].nodes["pos"].getQuat(), moving[0].quats[i], atol=1e-6
+    )
+
+    playback.privStep(playback.getDuration())
+    for ball in moving:
+        np.testing.assert_allclose(
+            ball.nodes["pos"].getPos(), ball.history_cts.rvw[-1, 0], atol=1e-6
+        )
+        assert ball.nodes["shadow"].getZ() <= 0
@@ -0,0 +1,68 @@
+#! /usr/bin/env python
+
+import json
+
+from pooltool.batch import get_shard_paths, read_completed_ids, simulate_file
+from pooltool.cli import get_parser, simulate
+from pooltool.specs import get_break_specs, simulate_specs
+
+
+def write_specs(path, specs):
+    with open(path, "w") as f:
+        for spec in specs:
+            f.write(json.dumps(spec) + "\n")
+
+
+def read_results(directory):
+    results = []
+    for path in get_shard_paths(directory):
+        with open(path) as f:
+            results.extend(json.loads(line) for line in f)
+
+    return results
+
+
+def test_simulate_file(tmp_path):
+    specs = get_break_specs(8, seed=0)
+    for spec in specs[4:]:
+        del spec["id"]
+
+    input_path = tmp_path / "shots.jsonl"
+    output_dir = tmp_path / "results"
+    write_specs(input_path, specs[:5])
+
+    kwargs = dict(workers=1, chunk_size=2, warmup=False, quiet=True, t_final=0.2)
+    report = simulate_file(input_path, output_dir, shard_size=2, **kwargs)
+
+    assert report["shots"] == 5
+    assert report["skipped"] == 0
+    assert len(get_shard_paths(output_dir)) == 3
+
+    results = read_results(output_dir)
+    assert [result["id"] for result in results] == [0, 1, 2, 3, 4]
+    assert results == simulate_specs(
+        [dict(spec, id=i) for i, spec in enumerate(specs[:5])], t_final=0.2
+    )
+
+    # A run killed while writing leaves a partial line, which is removed on resume
+    last_shard = get_shard_paths(output_dir)[-1]
+    with open(last_shard, "a") as f:
+        f.write('{"id":')
+    assert read_completed_ids(output_dir) == {0, 1, 2, 3, 4}
+
+    write_specs(input_path, specs)
+    report = simulate_file(input_path, output_dir, shard_size=2, **kwargs)
+
+    assert report["shots"] == 3
+    assert report["skipped"] == 5
+    assert len(get_shard_paths(output_dir)) == 5
+    assert sorted(result["id"] for result in read_results(output_dir)) == list(range(8))
+
+
+def test_cli():
+    args = get_parser().parse_args(
+        ["simulate", "--input", "a.jsonl", "--output", "b", "--t-final", "5"]
+    )
+    assert args.func is simulate
+    assert args.t_final == 5
+    assert args.shard_size == 10000
@@ -0,0 +1,84 @@
+#! /usr/bin/env python
+
+import numpy as np
+
+import pooltool as pt
+from pooltool.tests import ref
+
+
+def assert_same_simulation(shot1, shot2):
+    assert len(shot1.events) == len(shot2.events)
+    for event1, event2 in zip(shot1.events, shot2.events):
+        assert event1.event_type == event2.event_type
+        assert event1.time == event2.time
+
+    for ball in shot1.balls.values():
+        other = shot2.balls[ball.id]
+        np.testing.assert_array_equal(ball.rvw, other.rvw)
+        np.testing.assert_array_equal(ball.history.t, other.history.t)
+        np.testing.assert_array_equal(ball.history.rvw, other.history.rvw)
+        np.testing.assert_array_equal(ball.history_cts.rvw, other.history_cts.rvw)
+
+
+def test_cache_hit(ref):
+    cache = pt.ShotCache()
+    shot = ref.copy()
+
+    ref.simulate(quiet=True, continuize=True, dt=0.01, cache=cache)
+    assert (cache.hits, cache.misses) == (0, 1)
+
+    shot.simulate(quiet=True, continuize=True, dt=0.01, cache=cache)
+    assert (cache.hits, cache.misses) == (1, 1)
+
+    assert_same_simulation(ref, shot)
+    assert pt.get_history_checksum(shot) == pt.get_history_checksum(ref)
+
+    # Restored events are bound to the system's own objects
+    for event in shot.events.filter_type("ball-ball"):
+        assert all(agent is shot.balls[agent.id] for agent in event.agents)
+
+
+def test_results_as_dict(ref):
+    ref.simulate(quiet=True, continuize=True, dt=0.01)
+
+    for compress in (False, True):
+        shot = ref.copy()
+        shot.reset_history()
+        shot.load_results_from_dict(ref.results_as_dict(compress=compress))
+
+        assert_same_simulation(ref, shot)
+        assert pt.get_history_checksum(shot) == pt.get_history_checksum(ref)
+
+
+def test_cache_key(ref):
+    key = pt.get_shot_key(ref, continuize=False)
+
+    assert pt.get_shot_key(ref.copy(), continuize=False) == key
+    assert pt.get_shot_key(ref, continuize=True) != key
+
+    ref.cue.V0 += 0.01
+    assert pt.get_shot_key(ref, continuize=False) != key
+
+
+def test_cache_disk(ref, tmp_path):
+    shot = ref.copy()
+
+    ref.simulate(quiet=True, cache=pt.ShotCache(path=tmp_path))
+
+    # A new cache backed by the same directory (e.g. a new session) hits
+    cache = pt.ShotCache(path=tmp_path)
+    shot.simulate(quiet=True, cache=cache)
+    assert (cache.hits, cache.misses) == (1, 0)
+
+    assert_same_simulation(ref, shot)
+
+
+def test_cache_lru(ref):
+    cache = pt.ShotCache(max_size=2)
+    for key in ("a", "b", "c"):
+        cache.put(key, {})
+
+    assert "a" not in cache
+    assert cache.get("b") is not None
+    assert cache.get("a") is None
+    assert (cache.hits, cache.misses) == (1, 1)
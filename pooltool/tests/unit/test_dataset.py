@@ -0,0 +1,97 @@
+#! /usr/bin/env python
+
+import multiprocessing
+
+import numpy as np
+import pytest
+
+import pooltool as pt
+from pooltool.specs import get_break_specs, simulate_specs
+from pooltool.tests import ref, trial
+
+
+def write_outcomes(path, outcomes):
+    with pt.ShotDataset(path, shard_size=300) as dataset:
+        for outcome in outcomes:
+            dataset.append_outcome(outcome, cue=dict(V0=1.0))
+
+
+def test_concurrent_writers(tmp_path):
+    outcomes = simulate_specs(get_break_specs(6, seed=0), t_final=0.2)
+
+    fork = multiprocessing.get_context("fork")
+    writers = [
+        fork.Process(target=write_outcomes, args=(tmp_path, outcomes[i::2]))
+        for i in range(2)
+    ]
+    for writer in writers:
+        writer.start()
+    for writer in writers:
+        writer.join()
+        assert writer.exitcode == 0
+
+    dataset = pt.ShotDataset(tmp_path)
+    assert len(dataset) == 6
+    assert sorted(dataset.ids()) == list(range(6))
+
+    # Small shards are rotated
+    assert len(list((tmp_path / "shards").iterdir())) > 2
+
+    for outcome in outcomes:
+        assert dataset.get(outcome["id"]) == outcome
+
+    entry = dataset.index[0]
+    assert entry["cue"] == dict(V0=1.0)
+    assert entry["outcome"]["num_events"] == dataset[0]["num_events"]
+    assert "balls" not in entry["outcome"]
+
+    # Streaming reads yield every shot once
+    streamed = sorted(list(dataset), key=lambda outcome: outcome["id"])
+    assert streamed == outcomes
+
+
+def test_systems(tmp_path, ref, trial):
+    dataset = pt.ShotDataset(tmp_path)
+    entry = dataset.append(trial, shot_id="trial")
+    dataset.append(ref)
+    dataset.close()
+
+    assert entry["outcome"]["num_events"] == len(trial.events)
+    assert entry["cue"]["V0"] == trial.cue.V0
+
+    # The balls of the trial are reset, the outcome holds their final states
+    assert entry["outcome"]["pocketed"] == [
+        ball_id
+        for ball_id, ball in trial.balls.items()
+        if ball.history.s[-1] == pt.pocketed
+    ]
+    for ball_id, features in dataset.outcomes.get("trial")["balls"].items():
+        rvw = trial.balls[ball_id].history.rvw[-1]
+        assert [features["x"], features["y"]] == [rvw[0, 0], rvw[0, 1]]
+
+    dataset = pt.ShotDataset(tmp_path)
+    assert "trial" in dataset
+    shot = dataset.get("trial")
+    assert len(shot.events) == len(trial.events)
+    for ball_id, ball in trial.balls.items():
+        np.testing.assert_array_equal(shot.balls[ball_id].history.rvw, ball.history.rvw)
+
+    with pytest.raises(KeyError):
+        dataset.get("missing")
+
+
+def test_torn_index(tmp_path):
+    dataset = pt.ShotDataset(tmp_path)
+    dataset.append_outcome(dict(id="a", num_events=1))
+    dataset.close()
+
+    # A writer killed while writing an index entry
+    index_file = next((tmp_path / "index").iterdir())
+    with open(index_file, "a") as f:
+        f.write('{"id":"b","kind"')
+
+    dataset = pt.ShotDataset(tmp_path)
+    assert dataset.ids() == ["a"]
+    dataset.append_outcome(dict(id="c", num_events=1))
+    dataset.reload()
+    assert sorted(dataset.ids()) == ["a", "c"]
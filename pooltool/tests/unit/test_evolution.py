@@ -0,0 +1,320 @@
+#! /usr/bin/env python
+
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pytest
+
+import pooltool as pt
+import pooltool.constants as c
+from pooltool.error import ConfigError
+from pooltool.tests import ref, trial
+
+
+def test_batch_tol_zero(ref, trial):
+    # With no tolerance, only exactly simultaneous events can be batched, so the
+    # event times and final states should be identical to the non-batched simulation
+    ref.simulate(quiet=True, batch_tol=0)
+
+    assert len(ref.events) == len(trial.events)
+    for ball in ref.balls.values():
+        ball_trial = trial.balls[ball.id]
+        np.testing.assert_allclose(ball.history.t, ball_trial.history.t)
+        np.testing.assert_allclose(ball.history.s[-1], ball_trial.history.s[-1])
+        np.testing.assert_allclose(
+            ball.history.rvw[-1], ball_trial.history.rvw[-1], atol=1e-12
+        )
+
+
+def test_batch_history_alignment(ref):
+    ref.simulate(quiet=True, batch_tol=1e-6)
+
+    for ball in ref.balls.values():
+        assert len(ball.history.t) == len(ref.events)
+        for event, t in zip(ref.events, ball.history.t):
+            assert event.time == t
+
+    assert not ref.is_balls_overlapping()
+
+
+def test_batch_events_independent(ref):
+    ref.simulate(quiet=True, batch_tol=1e-3)
+
+    batches = {}
+    for event in ref.events:
+        batches.setdefault(event.time, []).append(event)
+    assert max(len(batch) for batch in batches.values()) > 1
+
+    for batch in batches.values():
+        ball_ids = [a.id for e in batch for a in e.agents if a.object_type == "ball"]
+        assert len(ball_ids) == len(set(ball_ids))
+
+    for ball in ref.balls.values():
+        assert len(ball.events) == len(ball.history.t) == len(ref.events)
+
+
+def test_watchdog_max_events(ref):
+    halt = ref.simulate(quiet=True, max_events=20)
+
+    assert halt is ref.halt
+    assert halt.reason == "max_events"
+    assert halt.num_events == 21
+    assert halt.last_events[-1] is ref.events[-2]
+
+    # The history is ended at the time of the halt
+    for ball in ref.balls.values():
+        assert len(ball.history.t) == len(ref.events)
+
+
+def test_watchdog_not_triggered(ref):
+    assert ref.simulate(quiet=True, max_events=10000, max_wall_time=60) is None
+
+
+def test_stop_when(ref, trial):
+    ref.simulate(quiet=True, stop_when=lambda event: event.event_type == "ball-ball")
+
+    first_hit = trial.events.filter_type("ball-ball")[0]
+    assert ref.events[-1].event_type == "ball-ball"
+    assert ref.events[-1].time == first_hit.time
+    assert len(ref.events) < len(trial.events)
+    for ball in ref.balls.values():
+        assert len(ball.history.t) == len(ref.events)
+
+
+def test_iter_events(ref, trial):
+    for i, event in enumerate(ref.iter_events()):
+        assert event is ref.events[-1]
+        assert event.time == trial.events[i + 1].time
+        if i == 10:
+            break
+
+    assert len(ref.events) == 12
+
+
+def test_resume(ref, trial):
+    ref.simulate(quiet=True, t_final=1.0)
+    assert len(ref.events) < len(trial.events)
+
+    ref.resume(quiet=True)
+
+    assert len(ref.events) == len(trial.events)
+    for ball in ref.balls.values():
+        ball_trial = trial.balls[ball.id]
+        np.testing.assert_allclose(ball.history.t, ball_trial.history.t)
+        np.testing.assert_allclose(
+            ball.history.rvw[-1], ball_trial.history.rvw[-1], atol=1e-12
+        )
+
+
+def test_fork(ref, trial):
+    ref.simulate(quiet=True)
+    branch = ref.fork(at_event=20)
+
+    assert len(branch.events) == 21
+    assert branch.events[10].agents[0] is not ref.events[10].agents[0]
+    assert branch.balls["1"].history.rvw[5] is ref.balls["1"].history.rvw[5]
+
+    branch.resume(quiet=True)
+
+    assert len(ref.events) == len(trial.events)
+    assert len(branch.events) == len(trial.events)
+    for ball in branch.balls.values():
+        np.testing.assert_allclose(
+            ball.history.rvw[-1], trial.balls[ball.id].history.rvw[-1], atol=1e-12
+        )
+
+
+def test_physics_only_objects(ref, trial):
+    table_params = {k: v for k, v in ref.table.as_dict().items() if k != "table_type"}
+    table = pt.PhysicsPocketTable(**table_params)
+    balls = {}
+    for ball in ref.balls.values():
+        balls[ball.id] = pt.PhysicsBall(
+            ball.id, m=ball.m, R=ball.R, u_s=ball.u_s, u_r=ball.u_r, u_sp=ball.u_sp
+        )
+        balls[ball.id].set(np.copy(ball.rvw), s=ball.s, t=ball.t)
+    cue = pt.PhysicsCue(cueing_ball=balls[ref.cue.cueing_ball.id])
+
+    assert not hasattr(balls["cue"], "__dict__")
+    assert (
+        table.cushion_segments["linear"]["3"]
+        is ref.table.cushion_segments["linear"]["3"]
+    )
+
+    shot = pt.System(cue=cue, table=table, balls=balls)
+    shot.simulate(quiet=True)
+
+    assert len(shot.events) == len(trial.events)
+    for ball in shot.balls.values():
+        np.testing.assert_allclose(
+            ball.history.rvw[-1], trial.balls[ball.id].history.rvw[-1], atol=1e-12
+        )
+
+
+def simple_shot():
+    table = pt.PocketTable(model_name="7_foot")
+    balls = {
+        "cue": pt.Ball("cue", xyz=(table.w / 2, table.l / 4, pt.R)),
+        "1": pt.Ball("1", xyz=(table.w / 2 + 0.05, table.l * 0.6, pt.R)),
+    }
+    cue = pt.Cue(cueing_ball=balls["cue"])
+    cue.aim_at_ball(balls["1"], cut=20)
+    cue.strike(V0=2)
+    return pt.System(cue=cue, table=table, balls=balls)
+
+
+@pytest.mark.parametrize("dt, adaptive", [(1e-4, False), (1e-2, True)])
+def test_discrete_matches_event(dt, adaptive):
+    event_shot = simple_shot()
+    discrete_shot = event_shot.copy()
+
+    event_shot.simulate(quiet=True, t_final=1.0)
+    discrete_shot.simulate(
+        quiet=True,
+        algorithm="discrete",
+        t_final=1.0,
+        dt=dt,
+        adaptive=adaptive,
+        continuize=True,
+    )
+
+    collisions = [
+        e for e in event_shot.events if e.event_class == "collision" and e.time < 1.0
+    ]
+    discrete_collisions = [
+        e for e in discrete_shot.events if e.event_class == "collision"
+    ]
+    assert [e.event_type for e in collisions] == [
+        e.event_type for e in discrete_collisions
+    ]
+    for event, discrete_event in zip(collisions, discrete_collisions):
+        assert abs(event.time - discrete_event.time) < 5e-3
+
+    # Only collisions and transitions are events. The dense trajectory of each ball
+    # is its continuous history
+    assert len(discrete_shot.events) < 20
+    for ball in discrete_shot.balls.values():
+        assert len(ball.history.t) == len(discrete_shot.events)
+        assert len(ball.history_cts.t) > 100
+
+    assert not discrete_shot.is_balls_overlapping()
+
+
+def test_hybrid_without_clusters(ref, trial):
+    # If ball-ball collisions are never dense, the hybrid algorithm is event-based
+    ref.simulate(quiet=True, algorithm="hybrid", dense_time=0)
+
+    assert len(ref.events) == len(trial.events)
+    for ball in ref.balls.values():
+        ball_trial = trial.balls[ball.id]
+        np.testing.assert_allclose(ball.history.t, ball_trial.history.t)
+        np.testing.assert_allclose(
+            ball.history.rvw[-1], ball_trial.history.rvw[-1], atol=1e-12
+        )
+
+
+def test_hybrid_break(ref, trial):
+    ref.simulate(
+        quiet=True, algorithm="hybrid", dense_events=5, dense_time=1e-2, t_final=2.0
+    )
+
+    assert ref.halt is None
+    for ball in ref.balls.values():
+        assert len(ball.history.t) == len(ref.events)
+        for event, t in zip(ref.events, ball.history.t):
+            assert event.time == t
+
+    assert not ref.is_balls_overlapping()
+
+
+def test_next_event_record(ref, trial):
+    ref.reset_history()
+    ref.init_history()
+    ref.balls["cue"].update_next_transition_event()
+
+    for expected in trial.events[1:6]:
+        t, kind, i, j = ref.get_next_event_record()
+        assert isinstance(kind, int)
+        assert t == expected.time
+
+        event = ref.event_from_record((t, kind, i, j))
+        assert event.event_type == expected.event_type
+        assert [agent.id for agent in event.agents] == [
+            agent.id for agent in expected.agents
+        ]
+
+        ref.evolve(event.time - ref.t)
+        event.resolve()
+        ref.update_history(event, update_all=True)
+
+
+def test_active_set(ref):
+    for i, event in enumerate(ref.iter_events()):
+        ref.get_next_event_record()
+
+        balls = ref._ball_list
+        active = {balls[j].id for j in ref._active}
+        assert active == {b.id for b in balls if b.s not in c.nontranslating}
+
+        t_transition = min(b.next_transition_event.time for b in balls)
+        assert ref.get_min_transition_event_time()[0] == t_transition
+
+        if i == 40:
+            break
+
+
+def test_compiled_matches_event(ref, trial):
+    ref.simulate(quiet=True, algorithm="compiled")
+
+    assert ref.halt is None
+    assert len(ref.events) == len(trial.events)
+    for event, event_trial in zip(ref.events, trial.events):
+        assert event.event_type == event_trial.event_type
+        assert [agent.id for agent in event.agents] == [
+            agent.id for agent in event_trial.agents
+        ]
+        assert event.time == pytest.approx(event_trial.time, abs=1e-6)
+
+    for ball in ref.balls.values():
+        ball_trial = trial.balls[ball.id]
+        assert len(ball.history.t) == len(ref.events)
+        assert ball.history.s[-1] == ball_trial.history.s[-1]
+        np.testing.assert_allclose(
+            ball.history.rvw[-1], ball_trial.history.rvw[-1], atol=1e-6
+        )
+
+
+def test_compiled_budgets(ref):
+    halt = ref.simulate(quiet=True, algorithm="compiled", max_events=20)
+
+    assert halt.reason == "max_events"
+    assert halt.num_events == 21
+    for ball in ref.balls.values():
+        assert len(ball.history.t) == len(ref.events)
+
+    ref.resume(quiet=True, algorithm="compiled", t_final=1.0)
+    assert ref.halt is None
+    assert ref.t >= 1.0
+
+
+def test_compiled_threads(ref):
+    def simulate(shot):
+        shot.simulate(quiet=True, algorithm="compiled")
+        return shot
+
+    serial = simulate(ref.copy())
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        shots = list(executor.map(simulate, [ref.copy() for _ in range(4)]))
+
+    for shot in shots:
+        assert [e.time for e in shot.events] == [e.time for e in serial.events]
+        for ball in shot.balls.values():
+            np.testing.assert_array_equal(
+                ball.history.rvw, serial.balls[ball.id].history.rvw
+            )
+
+
+def test_compiled_unsupported(ref):
+    for kwargs in (dict(max_wall_time=1), dict(batch_tol=1e-6)):
+        with pytest.raises(ConfigError, match=list(kwargs)[0]):
+            ref.simulate(quiet=True, algorithm="compiled", **kwargs)
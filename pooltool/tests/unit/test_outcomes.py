@@ -0,0 +1,120 @@
+#! /usr/bin/env python
+
+import pytest
+
+import pooltool as pt
+from pooltool.error import ConfigError
+from pooltool.outcomes import get_outcome
+from pooltool.specs import build_system, get_break_specs, simulate_specs
+from pooltool.tests import trial
+
+
+@pytest.fixture(scope="module")
+def outcomes():
+    return simulate_specs(get_break_specs(8, seed=3))
+
+
+def test_get_outcome(trial):
+    outcome = get_outcome(trial)
+
+    cushion_events = trial.events.filter_type("ball-cushion")
+    assert sum(outcome["cushions"].values()) == len(cushion_events)
+    assert outcome["events"]["ball-cushion"] == len(cushion_events)
+    assert sum(outcome["events"].values()) == len(trial.events)
+
+    for ball_id, ball in trial.balls.items():
+        events = ball.events
+        contacts = events.filter_type("ball-ball")
+        if len(contacts):
+            before = events.filter_type("ball-cushion")
+            before = [event for event in before if event.time < contacts[0].time]
+            assert outcome["cushions_before_contact"][ball_id] == len(before)
+
+    for event in trial.events.filter_type("ball-pocket"):
+        ball, pocket = event.agents
+        assert outcome["pockets"][ball.id] == pocket.id
+
+
+def test_saved_system(tmp_path, outcomes):
+    # The balls of saved and loaded systems are set to their initial states
+    spec = next(
+        spec
+        for spec, outcome in zip(get_break_specs(8, seed=3), outcomes)
+        if outcome["pocketed"]
+    )
+    shot = build_system(spec)
+    shot.simulate(quiet=True)
+    outcome = get_outcome(shot)
+
+    shot.save(tmp_path / "shot.pkl")
+    loaded = pt.System(path=tmp_path / "shot.pkl")
+    assert get_outcome(shot)["balls"] == outcome["balls"]
+    assert get_outcome(loaded)["balls"] == outcome["balls"]
+    assert get_outcome(loaded)["pocketed"] == outcome["pocketed"]
+
+    index = pt.OutcomeIndex(tmp_path / "outcomes.sqlite")
+    index.add_shot(loaded, "loaded")
+    for ball_id, features in index.get("loaded")["balls"].items():
+        assert features["pocketed"] == int(ball_id in outcome["pocketed"])
+        assert [features["x"], features["y"]] == outcome["balls"][ball_id][:2]
+
+
+def test_query(tmp_path, outcomes):
+    index = pt.OutcomeIndex(tmp_path / "outcomes.sqlite")
+    index.add_many(outcomes)
+    assert len(index) == len(outcomes)
+
+    def expected(condition):
+        return [outcome["id"] for outcome in outcomes if condition(outcome)]
+
+    assert index.query(num_pocketed=(1, None)) == expected(
+        lambda outcome: len(outcome["pocketed"]) >= 1
+    )
+    assert index.query(first_hit="1") == expected(
+        lambda outcome: outcome["first_hit"][:1] == ["1"]
+    )
+    assert index.query(
+        balls={"cue": dict(cushions=(2, None)), "1": dict(cushions=[0, 1])}
+    ) == expected(
+        lambda outcome: outcome["cushions"]["cue"] >= 2
+        and outcome["cushions"]["1"] in (0, 1)
+    )
+    assert (
+        index.query("duration > ?", (7,), limit=2)
+        == expected(lambda outcome: outcome["t"] > 7)[:2]
+    )
+    assert index.count(balls={"9": dict(pocketed=1)}) == len(
+        expected(lambda outcome: "9" in outcome["pocketed"])
+    )
+
+    # Shots are replaced, not duplicated
+    index.add(outcomes[0])
+    assert len(index) == len(outcomes)
+
+    features = index.get(outcomes[0]["id"])
+    assert features["num_events"] == outcomes[0]["num_events"]
+    assert features["balls"]["cue"]["x"] == outcomes[0]["balls"]["cue"][0]
+
+    with pytest.raises(ConfigError):
+        index.query(speed=1)
+    with pytest.raises(KeyError):
+        index.get("missing")
+
+
+def test_dataset(tmp_path, outcomes):
+    dataset = pt.ShotDataset(tmp_path)
+    for outcome in outcomes[:4]:
+        dataset.append_outcome(outcome)
+    dataset.close()
+
+    # Writing without indexing, then indexing afterwards
+    dataset = pt.ShotDataset(tmp_path, index_outcomes=False)
+    for outcome in outcomes[4:]:
+        dataset.append_outcome(outcome)
+    assert len(dataset.outcomes) == 4
+
+    assert dataset.build_outcome_index() == 4
+    assert dataset.build_outcome_index() == 0
+
+    for shot_id in dataset.outcomes.query(num_pocketed=(1, None)):
+        assert len(dataset.get(shot_id)["pocketed"]) >= 1
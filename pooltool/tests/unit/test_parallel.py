@@ -0,0 +1,111 @@
+#! /usr/bin/env python
+
+import gc
+import os
+import time
+import weakref
+from concurrent.futures import CancelledError
+
+import pytest
+
+import pooltool as pt
+from pooltool.error import WorkerError
+from pooltool.tests import ref
+
+
+@pytest.fixture(scope="module")
+def pool():
+    pool = pt.WorkerPool(processes=2, max_tasks=3, warmup=False)
+    yield pool
+    pool.close()
+
+
+def test_map_and_restart(pool):
+    assert list(pool.map(pow, range(10), [2] * 10)) == [x**2 for x in range(10)]
+
+    # Each worker is replaced after 3 tasks
+    pids = {future.result() for future in [pool.submit(os.getpid) for _ in range(9)]}
+    assert len(pids) >= 3
+
+
+def test_errors(pool):
+    with pytest.raises(ValueError):
+        pool.submit(int, "x").result()
+
+    with pytest.raises(WorkerError):
+        pool.submit(os._exit, 3).result()
+
+    # The pool recovers from the worker dying
+    assert pool.submit(pow, 2, 3).result() == 8
+
+
+def test_simulate(pool, ref):
+    num_events = len(ref.events)
+    shot = pool.simulate(ref, t_final=1.0).result()
+
+    assert len(ref.events) == num_events
+    assert shot.events[-1].time >= 1.0
+    assert len(shot.events) < num_events
+    assert shot.balls.keys() == ref.balls.keys()
+
+
+def test_simulate_halt(pool, ref):
+    shot = pool.simulate(ref, max_events=5).result()
+
+    assert shot.halt.reason == "max_events"
+    assert shot.halt.num_events == 6
+    assert all(event in shot.events for event in shot.halt.last_events)
+
+    assert pool.simulate(ref, t_final=1.0).result().halt is None
+
+
+def test_cancel(pool):
+    future = pool.submit(time.sleep, 60)
+    while not future.running():
+        time.sleep(0.01)
+
+    assert pool.cancel(future)
+    assert not pool.cancel(future)
+    with pytest.raises(CancelledError):
+        future.result()
+
+    # The worker moves on to the next task
+    assert pool.submit(pow, 2, 3).result(timeout=60) == 8
+
+
+def test_close_runs_submitted_tasks():
+    # Workers that retire while the pool is closing are replaced until every task ran
+    pool = pt.WorkerPool(processes=2, max_tasks=1, warmup=False)
+    futures = [pool.submit(pow, x, 2) for x in range(6)]
+    pool.close()
+
+    assert [future.result(timeout=0) for future in futures] == [x**2 for x in range(6)]
+
+
+def test_cancel_simulate(pool, ref):
+    future = pool.simulate(ref)
+    assert pool.cancel(future)
+    with pytest.raises(CancelledError):
+        future.result(timeout=60)
+
+
+def test_stale_cancel():
+    # A cancel signal that arrives after its task finished does not stop the next task
+    # of the worker
+    with pt.WorkerPool(processes=1, warmup=False) as pool:
+        future = pool.submit(os.getpid)
+        pool._interrupt(future.result(timeout=60), future.task_id)
+
+        assert pool.submit(time.sleep, 0.2).result(timeout=60) is None
+
+
+@pytest.mark.parametrize("stop", ["close", "terminate"])
+def test_collected(stop):
+    pool = pt.WorkerPool(processes=1, warmup=False)
+    assert pool.submit(pow, 2, 3).result() == 8
+    getattr(pool, stop)()
+
+    pool_ref = weakref.ref(pool)
+    del pool
+    gc.collect()
+    assert pool_ref() is None
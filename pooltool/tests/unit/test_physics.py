@@ -236,3 +236,75 @@ def test_evolve_ball_motion(ref):
 
             np.testing.assert_allclose(rvw, rvw_expected)
             np.testing.assert_allclose(s, s_expected)
+
+
+def test_cue_strike_batch():
+    n = 20
+    rng = np.random.default_rng(0)
+    V0 = rng.uniform(0.5, 5, n)
+    phi = rng.uniform(0, 360, n)
+    theta = rng.uniform(0, 45, n)
+    a = rng.uniform(-0.5, 0.5, n)
+    b = rng.uniform(-0.5, 0.5, n)
+
+    v, w = p.cue_strike_batch(0.17, 0.57, 0.028, V0, phi, theta, a, b)
+
+    for i in range(n):
+        v_i, w_i = p.cue_strike(0.17, 0.57, 0.028, V0[i], phi[i], theta[i], a[i], b[i])
+        np.testing.assert_allclose(v[i], v_i, atol=1e-12)
+        np.testing.assert_allclose(w[i], w_i, atol=1e-12)
+
+
+def test_resolve_collision_batches(ref):
+    ball_ball = ref.events.filter_type("ball-ball")
+    rvw1 = np.array([event.agent1_state_initial[0] for event in ball_ball])
+    rvw2 = np.array([event.agent2_state_initial[0] for event in ball_ball])
+
+    rvw1_f, rvw2_f = p.resolve_ball_ball_collision_batch(rvw1, rvw2)
+    for i, event in enumerate(ball_ball):
+        np.testing.assert_allclose(rvw1_f[i], event.agent1_state_final[0], atol=1e-12)
+        np.testing.assert_allclose(rvw2_f[i], event.agent2_state_final[0], atol=1e-12)
+
+    ball_cushion = ref.events.filter_type("ball-cushion")
+    rvw = np.array([event.agent1_state_initial[0] for event in ball_cushion])
+    normal = np.array(
+        [event.agents[1].get_normal(rvw[i]) for i, event in enumerate(ball_cushion)]
+    )
+    params = [
+        np.array([getattr(event.agents[0], attr) for event in ball_cushion])
+        for attr in ("R", "m")
+    ]
+    h = np.array([event.agents[1].height for event in ball_cushion])
+    e_c, f_c = (
+        np.array([getattr(event.agents[0], attr) for event in ball_cushion])
+        for attr in ("e_c", "f_c")
+    )
+
+    rvw_f = p.resolve_ball_cushion_collision_batch(rvw, normal, *params, h, e_c, f_c)
+    for i, event in enumerate(ball_cushion):
+        np.testing.assert_allclose(rvw_f[i], event.agent1_state_final[0], atol=1e-12)
+
+
+def test_resolved_states_are_copies(ref):
+    # The states stored by an event must not alias the arrays of its balls, which may
+    # be modified in place after the event is resolved
+    for event_type in ("ball-ball", "ball-cushion"):
+        event = ref.events.filter_type(event_type)[0]
+        balls = [agent for agent in event.agents if hasattr(agent, "rvw")]
+        states = [event.agent1_state_initial, event.agent2_state_initial][: len(balls)]
+
+        rvws = []
+        for ball, (rvw, s) in zip(balls, states):
+            ball.rvw, ball.s = np.copy(rvw), s
+            rvws.append(ball.rvw)
+
+        event.resolve()
+        expected = [np.copy(rvw) for rvw, _ in states]
+        for ball, rvw in zip(balls, rvws):
+            rvw[:] = np.nan
+            ball.rvw[:] = np.nan
+
+        for state, rvw in zip(
+            [event.agent1_state_initial, event.agent2_state_initial], expected
+        ):
+            np.testing.assert_array_equal(state[0], rvw)
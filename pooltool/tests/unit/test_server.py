@@ -0,0 +1,141 @@
+#! /usr/bin/env python
+
+import asyncio
+import threading
+
+import pytest
+
+import pooltool as pt
+from pooltool.cli import get_parser, loadgen, serve
+from pooltool.error import ConfigError, SimulateError
+from pooltool.server import (
+    SimulationServer,
+    codec_json,
+    decode,
+    encode,
+    header,
+    parse_address,
+)
+from pooltool.specs import build_system, get_break_specs, load_tables, simulate_specs
+
+
+def test_protocol():
+    message = dict(op="simulate", shots=[dict(balls={"cue": [0.5, 1.0]})])
+    frame = encode(message, codec_json)
+
+    size, codec = header.unpack(frame[: header.size])
+    assert size == len(frame) - header.size
+    assert decode(frame[header.size :], codec) == message
+
+    assert parse_address("unix:/tmp/pooltool.sock") == ("unix", "/tmp/pooltool.sock")
+    assert parse_address("127.0.0.1:8750") == ("tcp", ("127.0.0.1", 8750))
+    with pytest.raises(ConfigError):
+        parse_address("localhost")
+
+
+def test_simulate_specs():
+    spec = get_break_specs(1, seed=0)[0]
+
+    table = pt.PocketTable(model_name=spec["table"])
+    balls = {i: pt.Ball(i, xyz=(x, y, pt.R)) for i, (x, y) in spec["balls"].items()}
+    cue = pt.Cue(cueing_ball=balls["cue"])
+    cue.strike(**{k: v for k, v in spec["cue"].items() if k != "cueing_ball"})
+    shot = pt.System(cue=cue, table=table, balls=balls)
+    shot.simulate(quiet=True)
+
+    result, failed = simulate_specs([spec, dict(id="x", balls={})], trajectories=True)
+
+    assert result["id"] == 0
+    assert result["num_events"] == len(shot.events)
+    assert result["t"] == shot.t
+    for ball_id, ball in shot.balls.items():
+        assert result["balls"][ball_id] == [*ball.rvw[0, :2], ball.s]
+        assert result["trajectories"][ball_id]["t"] == list(ball.history.t)
+
+    assert failed["id"] == "x"
+    assert "error" in failed
+
+
+def test_physics_only():
+    # Shots are never rendered, so they are built without rendering objects
+    shot = build_system(get_break_specs(1, seed=0)[0])
+    assert not isinstance(shot.table, pt.PocketTable)
+    assert not isinstance(shot.cue, pt.Cue)
+    assert not any(isinstance(ball, pt.Ball) for ball in shot.balls.values())
+
+    shot.simulate(quiet=True)
+    assert len(shot.events)
+
+
+def test_pockets_not_shared():
+    # Shots simulated one after the other by a worker each get their own pockets, so
+    # the balls pocketed by one shot do not leak into the next
+    specs = get_break_specs(10, seed=0)
+
+    num_pocketing = 0
+    for spec in specs:
+        shot = build_system(spec)
+        shot.simulate(quiet=True)
+
+        contains = [pocket.contains for pocket in shot.table.pockets.values()]
+        pocketed = {ball.id for ball in shot.balls.values() if ball.s == pt.pocketed}
+        assert set().union(*contains) == pocketed
+        num_pocketing += bool(pocketed)
+
+    assert num_pocketing >= 2
+    assert simulate_specs(specs[::-1]) == simulate_specs(specs)[::-1]
+
+
+@pytest.fixture(scope="module")
+def address(tmp_path_factory):
+    address = f"unix:{tmp_path_factory.mktemp('server') / 'pooltool.sock'}"
+    pool = pt.WorkerPool(
+        processes=1, warmup=False, initializer=load_tables, initargs=(["7_foot"],)
+    )
+    server = SimulationServer(pool, chunk_size=2, max_frame_size=2**16)
+
+    loop = asyncio.new_event_loop()
+    listener = loop.run_until_complete(server.start(address))
+    thread = threading.Thread(target=loop.run_forever)
+    thread.start()
+
+    yield address
+
+    loop.call_soon_threadsafe(loop.stop)
+    thread.join()
+    listener.close()
+    loop.close()
+    pool.terminate()
+
+
+def test_client(address):
+    specs = get_break_specs(3, seed=0)
+
+    with pt.Client(address, timeout=120) as client:
+        assert client.ping()
+
+        results = client.simulate(specs, t_final=0.5)
+        assert [result["id"] for result in results] == [0, 1, 2]
+        assert all(result["t"] >= 0.5 for result in results)
+        assert results == simulate_specs(specs, t_final=0.5)
+
+        with pytest.raises(SimulateError):
+            client.simulate(specs, stop_when=None)
+
+        # A frame over the limit is answered with an error, and the connection closed
+        with pytest.raises(SimulateError, match="over the limit"):
+            client.simulate(get_break_specs(300, seed=0))
+
+
+def test_cli():
+    args = get_parser().parse_args(
+        ["serve", "--address", "unix:/tmp/x", "--workers", "2"]
+    )
+    assert args.func is serve
+    assert args.address == "unix:/tmp/x"
+    assert args.workers == 2
+    assert args.tables == ["7_foot"]
+
+    args = get_parser().parse_args(["loadgen", "--codec", "msgpack"])
+    assert args.func is loadgen
+    assert args.batch_size == 16
@@ -0,0 +1,213 @@
+#! /usr/bin/env python
+
+import pickle
+
+import numpy as np
+import pytest
+
+import pooltool as pt
+import pooltool.utils as utils
+from pooltool.error import ConfigError, SimulateError
+from pooltool.tests import ref, trial
+
+
+def test_compress_array():
+    for array in (np.random.rand(50, 3, 3), np.arange(7), np.zeros(0)):
+        d = pickle.loads(pickle.dumps(utils.compress_array(array)))
+        restored = utils.decompress_array(d)
+        assert restored.dtype == array.dtype
+        np.testing.assert_array_equal(restored, array)
+
+
+@pytest.mark.parametrize("compress", [False, True])
+def test_as_dict(trial, compress):
+    d = trial.as_dict(compress=compress)
+
+    # Each event is stored once
+    for ball_id, ball in trial.balls.items():
+        assert "events" not in d["balls"][ball_id]
+        assert len(d["balls"][ball_id]["event_indices"]) == len(ball.events)
+
+    shot = pt.System(d=pickle.loads(pickle.dumps(d)))
+    assert len(shot.events) == len(trial.events)
+
+    for ball_id, ball in trial.balls.items():
+        copy = shot.balls[ball_id]
+        assert copy.history.vectorized == ball.history.vectorized
+        np.testing.assert_array_equal(copy.history.rvw, ball.history.rvw)
+        assert copy.history.s == list(ball.history.s)
+        np.testing.assert_array_equal(copy.history_cts.t, ball.history_cts.t)
+
+        # The events of the balls are the events of the system
+        assert [event.time for event in copy.events] == [
+            event.time for event in ball.events
+        ]
+        for event in copy.events:
+            assert any(event is other for other in shot.events)
+
+    # The continuous histories can be left out, and rebuilt
+    shot = pt.System(d=trial.as_dict(history_cts=False, compress=compress))
+    assert not shot.balls["cue"].history_cts.is_populated()
+    shot.continuize(dt=0.01)
+    np.testing.assert_allclose(
+        shot.balls["cue"].history_cts.rvw, trial.balls["cue"].history_cts.rvw
+    )
+
+
+def test_recipe(trial, ref, tmp_path):
+    trial.save(tmp_path / "full.pkl")
+    trial.save(tmp_path / "recipe.pkl", recipe=True)
+    assert (tmp_path / "recipe.pkl").stat().st_size * 20 < (
+        tmp_path / "full.pkl"
+    ).stat().st_size
+
+    shot = pt.System(path=tmp_path / "recipe.pkl")
+    assert shot.recipe is not None
+
+    # Accessing a history replays the simulation
+    history = shot.balls["cue"].history
+    np.testing.assert_array_equal(history.rvw, trial.balls["cue"].history.rvw)
+    assert shot.recipe is None
+    assert len(shot.events) == len(trial.events)
+    assert pt.get_history_checksum(shot) == pt.get_history_checksum(trial)
+    np.testing.assert_array_equal(
+        shot.balls["cue"].history_cts.rvw, trial.balls["cue"].history_cts.rvw
+    )
+
+    # Replays are verified against the checksum of the original simulation
+    d = trial.as_recipe()
+    d["recipe"]["checksum"] = "0"
+    shot = pt.System()
+    shot.load_from_dict(d, verify=True)
+    with pytest.raises(SimulateError):
+        len(shot.events)
+
+    # Loaded systems do not know how they were simulated
+    ref.simulate(quiet=True)
+    loaded = pt.System(d=ref.as_dict())
+    with pytest.raises(ConfigError):
+        loaded.as_recipe()
+    shot = pt.System(d=loaded.as_recipe(simulate_kwargs={}))
+    shot.replay(verify=True)
+    assert len(shot.events) == len(ref.events)
+
+
+def test_recipe_not_replayed(trial, tmp_path):
+    trial.save(tmp_path / "recipe.pkl", recipe=True)
+    shot = pt.System(path=tmp_path / "recipe.pkl")
+
+    calls = []
+    simulate = shot.simulate
+
+    def count_simulate(**kwargs):
+        calls.append(kwargs)
+        return simulate(**kwargs)
+
+    shot.simulate = count_simulate
+
+    # Resetting and saving a system pending a replay do not replay it
+    shot.reset_balls()
+    shot.save(tmp_path / "again.pkl", recipe=True)
+    assert shot.recipe is not None
+    assert not calls
+
+    again = pt.System(path=tmp_path / "again.pkl")
+    again.replay(verify=True)
+    assert pt.get_history_checksum(again) == pt.get_history_checksum(trial)
+
+    # Simulating anew drops the recipe instead of replaying it first
+    shot.simulate(quiet=True, continuize=True, dt=0.01)
+    assert len(calls) == 1
+    assert shot.recipe is None
+    assert pt.get_history_checksum(shot) == pt.get_history_checksum(trial)
+
+
+@pytest.fixture
+def dataset(tmp_path, ref):
+    dataset = pt.ShotDataset(tmp_path)
+    for i in range(12):
+        dataset.append(ref, shot_id=i)
+    dataset.close()
+
+    return pt.ShotDataset(tmp_path)
+
+
+def test_lazy_collection(dataset, ref):
+    shots = pt.LazySystemCollection(dataset, cache_size=4, prefetch=2)
+    assert len(shots) == 12
+    assert len(shots.get_loaded_systems()) == 0
+
+    shot = shots[3]
+    assert isinstance(shot, pt.System)
+    assert len(shot.events) == len(ref.events)
+    assert shots[3] is shot
+
+    # Iterating keeps the number of systems in memory bounded
+    count = 0
+    for shot in shots:
+        assert len(shot.events) == len(ref.events)
+        count += 1
+    assert count == 12
+    assert len(shots.get_loaded_systems()) == 4
+    assert shots[-1] is shot
+
+    # The active system is never evicted
+    shots.set_active(0)
+    active = shots.active
+    for i in range(1, 12):
+        shots[i]
+    assert shots[0] is active
+    assert len(shots.get_loaded_systems()) == 5
+
+    shots.set_active(5)
+    assert shots.active_index == 5
+    assert shots[0] is active
+
+    # Copies are held in memory
+    shots.append_copy_of_active(state="initial", as_active=True)
+    assert len(shots) == 13
+    assert shots.active_index == 12
+    assert not len(shots.active.events)
+    assert shots[-1] is shots.active
+
+    parallel = shots.get_parallel_systems()
+    assert len(parallel) == 13
+    assert parallel[-1] is shots.active
+
+
+def test_lazy_collection_recipes(tmp_path, trial):
+    dataset = pt.ShotDataset(tmp_path, recipe=True)
+    dataset.append(trial, shot_id="trial")
+    dataset.close()
+
+    shots = pt.LazySystemCollection(tmp_path)
+    assert shots[0].recipe is not None
+    assert len(shots[0].events) == len(trial.events)
+
+
+def test_lazy_collection_ids(dataset):
+    shots = pt.LazySystemCollection(dataset, ids=[7, 2], parallel_size=4)
+    assert len(list(shots)) == 2
+    assert shots[0] is not shots[1]
+
+    shots.set_active(1)
+    parallel = shots.get_parallel_systems()
+    assert len(parallel) == 2
+    assert parallel[1] is shots.active
+
+    dataset.append_outcome(dict(id="outcome"))
+    dataset.reload()
+    with pytest.raises(ConfigError):
+        pt.LazySystemCollection(dataset, ids=["outcome"])
+
+
+def test_pocketed_balls_not_overlapping(ref):
+    ball1, ball2 = list(ref.balls.values())[:2]
+    assert not ref.is_balls_overlapping()
+
+    ball2.rvw = ball1.rvw.copy()
+    assert ref.is_balls_overlapping()
+
+    # Balls in the same pocket share a position
+    ball1.s = ball2.s = pt.constants.pocketed
+    assert not ref.is_balls_overlapping()
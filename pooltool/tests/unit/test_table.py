@@ -0,0 +1,137 @@
+#! /usr/bin/env python
+
+import numpy as np
+import pytest
+
+import pooltool as pt
+from pooltool.tests import ref
+
+
+def test_geometry_memoized():
+    table = pt.PocketTable(model_name="7_foot")
+
+    assert table.geometry is pt.PhysicsPocketTable(model_name="7_foot").geometry
+    assert table.geometry != pt.PocketTable(model_name="big").geometry
+
+    # Pockets hold per-table state, so they are not shared
+    other = pt.PocketTable(model_name="7_foot")
+    assert table.pockets["lb"] is not other.pockets["lb"]
+
+
+def test_geometry_arrays():
+    table = pt.PocketTable()
+    geometry = table.geometry
+
+    for i, cushion_id in enumerate(geometry.linear_ids):
+        cushion = table.cushion_segments["linear"][cushion_id.split("_")[0]]
+        assert geometry.linear_lx[i] == cushion.lx
+        assert geometry.linear_l0[i] == cushion.l0
+        assert geometry.linear_direction[i] == cushion.direction
+        np.testing.assert_array_equal(geometry.linear_p2[i], cushion.p2)
+
+    for i, cushion_id in enumerate(geometry.circular_ids):
+        cushion = table.cushion_segments["circular"][cushion_id]
+        np.testing.assert_array_equal(geometry.circular_center[i], cushion.center)
+        assert geometry.circular_radius[i] == cushion.radius
+
+    for i, pocket_id in enumerate(geometry.pocket_ids):
+        np.testing.assert_array_equal(
+            geometry.pocket_center[i], table.pockets[pocket_id].center
+        )
+
+
+def test_geometry_frozen():
+    geometry = pt.PocketTable().geometry
+
+    with pytest.raises(AttributeError):
+        geometry.linear_ids = ()
+
+    with pytest.raises(ValueError):
+        geometry.linear_lx[0] = 0
+
+
+def subdivided_rails(w, l, h, num):
+    """Rectangular rails, each split into num linear segments"""
+    corners = [(0, 0), (w, 0), (w, l), (0, l), (0, 0)]
+    segments = []
+    for side in range(4):
+        (x1, y1), (x2, y2) = corners[side], corners[side + 1]
+        for k in range(num):
+            p1 = (x1 + (x2 - x1) * k / num, y1 + (y2 - y1) * k / num, h)
+            p2 = (x1 + (x2 - x1) * (k + 1) / num, y1 + (y2 - y1) * (k + 1) / num, h)
+            segments.append(pt.LinearCushionSegment(f"{side}_{k}", p1, p2))
+
+    return segments
+
+
+class BruteForceTable(pt.PhysicsCustomTable):
+    def get_cushion_segment_indices_near(self, ball, dt):
+        return pt.objects.table.Table.get_cushion_segment_indices_near(self, ball, dt)
+
+
+def test_custom_table_broadphase(ref):
+    w, l = ref.table.w, ref.table.l
+    segments = subdivided_rails(w, l, ref.table.cushion_height, 50)
+    table = pt.CustomTable(linear_segments=segments)
+    brute = BruteForceTable(linear_segments=segments)
+
+    assert (table.w, table.l) == (w, l)
+
+    # Only the segments near a ball's path are returned
+    ball = ref.balls["cue"]
+    linear, circular = table.get_cushion_segment_indices_near(ball, 0.2)
+    assert 0 < len(linear) < 40
+    assert not len(circular)
+
+    shots = []
+    for t in (table, brute):
+        shot = ref.copy()
+        shot.table = t
+        shot.simulate(quiet=True)
+        shots.append(shot)
+
+    assert len(shots[0].events) == len(shots[1].events)
+    for event1, event2 in zip(shots[0].events, shots[1].events):
+        assert event1.time == event2.time
+        assert [agent.id for agent in event1.agents] == [
+            agent.id for agent in event2.agents
+        ]
+
+
+class CountingTable(pt.PhysicsCustomTable):
+    def get_cushion_segment_indices_near(self, ball, dt):
+        self.num_queries += 1
+        return pt.PhysicsCustomTable.get_cushion_segment_indices_near(self, ball, dt)
+
+
+def test_custom_table_queries_cached(ref):
+    segments = subdivided_rails(ref.table.w, ref.table.l, ref.table.cushion_height, 50)
+    table = CountingTable(linear_segments=segments)
+
+    for batch_tol in (None, 1e-6):
+        table.num_queries = 0
+        shot = ref.copy()
+        shot.table = table
+        shot.simulate(quiet=True, batch_tol=batch_tol)
+
+        # Each event changes the paths of at most two balls
+        assert 0 < table.num_queries <= len(shot.balls) + 2 * len(shot.events)
+
+
+def test_custom_table_from_dict(ref):
+    table = pt.CustomTable(
+        linear_segments=ref.table.cushion_segments["linear"].values(),
+        circular_segments=ref.table.cushion_segments["circular"].values(),
+        pockets=ref.table.pockets.values(),
+        w=ref.table.w,
+        l=ref.table.l,
+    )
+    table_copy = pt.table_from_dict(table.as_dict())
+
+    assert table_copy.geometry is table.geometry
+
+    shot = ref.copy()
+    shot.table = table
+    shot.simulate(quiet=True)
+    shot_copy = pt.System(d=shot.as_dict())
+    assert len(shot_copy.events) == len(shot.events)
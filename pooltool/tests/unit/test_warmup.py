@@ -0,0 +1,34 @@
+#! /usr/bin/env python
+
+import pooltool.kernel as kernel
+import pooltool.physics as physics
+from pooltool.cli import get_parser
+from pooltool.warmup import get_jit_functions, warmup
+
+
+def test_get_jit_functions():
+    functions = get_jit_functions()
+
+    assert functions["pooltool.kernel.evolve_event_based"] is kernel.evolve_event_based
+    assert functions["pooltool.physics.cue_strike_fast"] is physics.cue_strike_fast
+    assert "pooltool.physics.cue_strike" not in functions
+
+
+def test_warmup_report():
+    report = warmup()
+
+    for name in (
+        "pooltool.kernel.evolve_event_based",
+        "pooltool.physics.cue_strike_batch",
+        "pooltool.utils.query_grid_fast",
+    ):
+        info = report[name]
+        assert info["signatures"] >= 1
+        assert info["compile_time"] >= 0
+        assert info["cache_hits"] + info["cache_misses"] >= info["signatures"]
+
+
+def test_cli_warmup():
+    args = get_parser().parse_args(["warmup", "--cold-start"])
+    assert args.command == "warmup"
+    assert args.cold_start
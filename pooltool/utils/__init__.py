@@ -7,6 +7,7 @@ import os
 import pickle
 import tempfile
 import tracemalloc
+import zlib
 
 import numpy as np
 import pprofile
@@ -53,6 +54,39 @@ def is_pickleable(obj):
     return True
 
 
+def compress_array(array, level=6):
+    """Losslessly compress a numerical array
+
+    The bytes of the elements are shuffled (the first byte of every element, then the
+    second byte of every element, and so on) before zlib compression. Since neighbouring
+    floats share their sign, exponent and leading mantissa bytes, this compresses
+    floating point data far better than zlib alone.
+
+    Returns
+    =======
+    output : dict
+        A pickleable dictionary. See decompress_array
+    """
+    array = np.ascontiguousarray(array)
+    data = np.frombuffer(array.tobytes(), dtype=np.uint8)
+    shuffled = data.reshape(-1, array.itemsize).T.tobytes()
+
+    return dict(
+        codec="zlib-shuffle",
+        dtype=array.dtype.str,
+        shape=array.shape,
+        data=zlib.compress(shuffled, level),
+    )
+
+
+def decompress_array(d):
+    """Returns an array compressed with compress_array"""
+    dtype = np.dtype(d["dtype"])
+    data = np.frombuffer(zlib.decompress(d["data"]), dtype=np.uint8)
+
+    return data.reshape(dtype.itemsize, -1).T.copy().view(dtype).reshape(d["shape"])
+
+
 def panda_path(path):
     return str(Filename.fromOsSpecific(str(path)))
 
@@ -313,6 +347,29 @@ def min_real_root(p, tol=1e-12):
         specifies the index of the responsible polynomial. i.e. the polynomial with the
         root `time` is p[index]
     """
+    # now find the minimum time and the index of the responsible polynomial
+    times = min_real_roots(p, tol=tol)
+
+    return times.min(), times.argmin()
+
+
+def min_real_roots(p, tol=1e-12):
+    """Given an array of polynomial coefficients, find the minimum real root of each
+
+    Parameters
+    ==========
+    p : array
+        A mxn array of polynomial coefficients. See min_real_root
+    tol : float, 1e-12
+        Roots are considered if they have an imaginary component no larger than tol and
+        a real component larger than tol
+
+    Returns
+    =======
+    output : array
+        A length m array, where output[i] is the minimum real root of p[i]. If p[i] has
+        no such root, output[i] is np.inf
+    """
     # Get the roots for the polynomials
     times = roots(p)
 
@@ -320,10 +377,7 @@ def min_real_root(p, tol=1e-12):
     # If the root has a nonpositive real component, set to infinity
     times[(abs(times.imag) > tol) | (times.real <= tol)] = np.inf
 
-    # now find the minimum time and the index of the responsible polynomial
-    times = np.min(times.real, axis=1)
-
-    return times.min(), times.argmin()
+    return np.min(times.real, axis=1)
 
 
 @jit(nopython=True, cache=c.numba_cache)
@@ -477,6 +531,50 @@ def coordinate_rotation_fast(v, phi):
     return np.dot(rotation, v)
 
 
+@jit(nopython=True, cache=c.numba_cache)
+def query_grid_fast(lo, hi, cell_size, origin, shape, indptr, indices, num_items):
+    """Returns the items in the cells of a uniform grid that overlap any of some boxes
+
+    (just-in-time compiled)
+
+    Parameters
+    ==========
+    lo, hi : array, shape (k, 2)
+        The lower and upper corners of the boxes
+    cell_size : float
+        The side length of each (square) cell. Cell (i, j) spans [i, i+1)*cell_size in
+        x and [j, j+1)*cell_size in y
+    origin : array, shape (2,)
+        The integer coordinates of the first cell of the grid
+    shape : array, shape (2,)
+        The number of cells of the grid along x and y. Boxes are clipped to the grid
+    indptr, indices : array
+        The items of each cell, in compressed sparse row format. The items of the cell
+        `origin + (i, j)` are `indices[indptr[k]:indptr[k + 1]]`, where
+        `k = i*shape[1] + j`
+    num_items : int
+        The number of items
+
+    Returns
+    =======
+    output : array
+        The sorted indices of the items
+    """
+    mark = np.zeros(num_items, dtype=np.bool_)
+    for k in range(len(lo)):
+        i0 = max(int(np.floor(lo[k, 0] / cell_size)) - origin[0], 0)
+        i1 = min(int(np.floor(hi[k, 0] / cell_size)) - origin[0], shape[0] - 1)
+        j0 = max(int(np.floor(lo[k, 1] / cell_size)) - origin[1], 0)
+        j1 = min(int(np.floor(hi[k, 1] / cell_size)) - origin[1], shape[1] - 1)
+        for i in range(i0, i1 + 1):
+            for j in range(j0, j1 + 1):
+                cell = i * shape[1] + j
+                for p in range(indptr[cell], indptr[cell + 1]):
+                    mark[indices[p]] = True
+
+    return np.nonzero(mark)[0]
+
+
 class ListLike(collections.abc.MutableSequence):
     """This is a list-like object. It supports len, del, insert, [], and append"""
 
@@ -501,6 +599,9 @@ class ListLike(collections.abc.MutableSequence):
     def append(self, value):
         self.insert(len(self) + 1, value)
 
+    def extend(self, values):
+        self._list.extend(values)
+
     def __repr__(self):
         return self._list.__repr__()
 
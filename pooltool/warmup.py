@@ -0,0 +1,208 @@
+#! /usr/bin/env python
+"""Ahead-of-time compilation of the just-in-time compiled functions
+
+The first call of a just-in-time compiled function compiles it for the types of its
+arguments, which for a full simulation adds up to several seconds. With
+`numba_cache` (see pooltool.constants), compiled functions are cached on disk, so that
+later processes load them instead. By default, numba writes the cache next to the
+pooltool sources. If they are read-only (e.g. in a container image), set the
+environment variable NUMBA_CACHE_DIR to a writable directory, both when warming up and
+in the processes that later simulate. Caching is disabled with POOLTOOL_NUMBA_CACHE=0.
+
+Examples
+========
+In a container image build step:
+
+$ NUMBA_CACHE_DIR=/var/cache/pooltool pooltool warmup
+
+Or from Python:
+
+>>> from pooltool.warmup import print_report, warmup
+>>> print_report(warmup())
+"""
+
+import subprocess
+import sys
+import time
+
+import numpy as np
+from numba.core import event
+from numba.core.dispatcher import Dispatcher
+
+import pooltool.constants as c
+import pooltool.kernel as kernel
+import pooltool.physics as physics
+import pooltool.terminal as terminal
+import pooltool.utils as utils
+
+jit_modules = [utils, physics, kernel]
+
+
+def get_jit_functions():
+    """Returns the just-in-time compiled functions of pooltool, keyed by name"""
+    functions = {}
+    for module in jit_modules:
+        for name, obj in vars(module).items():
+            if isinstance(obj, Dispatcher) and obj.__module__ == module.__name__:
+                functions[f"{module.__name__}.{name}"] = obj
+
+    return functions
+
+
+class CompileTimer(event.Listener):
+    """Records the time spent compiling each function
+
+    Compiling a function also compiles the functions it calls. Their compile times are
+    not included in that of the caller.
+    """
+
+    def __init__(self):
+        self.times = {}
+        self.stack = []
+
+    def on_start(self, ev):
+        self.stack.append([ev.data["dispatcher"], time.perf_counter(), 0])
+
+    def on_end(self, ev):
+        dispatcher, start, children = self.stack.pop()
+        duration = time.perf_counter() - start
+
+        self.times[dispatcher] = self.times.get(dispatcher, 0) + duration - children
+        if self.stack:
+            self.stack[-1][2] += duration
+
+
+def run_workload():
+    """Call the compiled functions with the argument types used in simulations
+
+    A nine-ball break is simulated with each shot evolution algorithm and on a custom
+    table, and the batch functions of pooltool.physics are called on small arrays.
+    """
+    import pooltool as pt
+
+    table = pt.PocketTable(model_name="7_foot")
+    balls = pt.get_nine_ball_rack(table, ordered=True)
+    cue = pt.Cue(cueing_ball=balls["cue"])
+    cue.aim_at_ball(balls["1"])
+    cue.strike(V0=8, b=-0.2)
+    shot = pt.System(cue=cue, table=table, balls=balls)
+
+    for kwargs in (
+        dict(algorithm="event", continuize=True),
+        dict(algorithm="event", batch_tol=1e-6),
+        dict(algorithm="compiled"),
+        dict(algorithm="hybrid"),
+        dict(algorithm="discrete", t_final=0.5),
+    ):
+        shot.copy().simulate(quiet=True, **kwargs)
+
+    custom = shot.copy()
+    custom.table = pt.PhysicsCustomTable(
+        linear_segments=table.cushion_segments["linear"].values(),
+        circular_segments=table.cushion_segments["circular"].values(),
+        pockets=table.pockets.values(),
+        w=table.w,
+        l=table.l,
+    )
+    custom.simulate(quiet=True)
+
+    n = 2
+    ones = np.ones(n, dtype=np.float64)
+    rvw = np.stack([shot.balls["cue"].rvw, shot.balls["1"].rvw])
+    rvw[:, 1, 0] = 1
+    normal = np.tile(np.array([1, 0, 0], dtype=np.float64), (n, 1))
+
+    ball = shot.balls["cue"]
+    physics.cue_strike_batch(
+        ball.m, cue.M, ball.R, ones, ones * 90, ones * 5, ones * 0, ones * 0
+    )
+    physics.resolve_ball_ball_collision_batch(rvw, np.ascontiguousarray(rvw[::-1]))
+    physics.resolve_ball_cushion_collision_batch(
+        rvw, normal, ones * pt.R, ones, ones * 0.04, ones * 0.85, ones * 0.2
+    )
+    physics.get_ball_energy_batch(rvw, ones * pt.R, ones)
+    physics.evolve_ball_motion_array(
+        np.full(n, c.sliding, dtype=np.int64),
+        rvw,
+        ones * pt.R,
+        ones,
+        ones * 0.2,
+        ones * 0.044,
+        ones * 0.01,
+        ones * 9.8,
+        0.1,
+    )
+
+
+def warmup():
+    """Compile (or load from cache) every function used in simulations
+
+    Returns
+    =======
+    report : dict
+        For each just-in-time compiled function that was used, keyed by name, a dict
+        with the time spent compiling it (`compile_time`), the number of compiled
+        signatures (`signatures`), how many of them were loaded from the cache
+        (`cache_hits`) or compiled (`cache_misses`), and the cache directory
+        (`cache_path`, None if caching is disabled)
+    """
+    timer = CompileTimer()
+    with event.install_listener("numba:compile", timer):
+        run_workload()
+
+    report = {}
+    for name, dispatcher in get_jit_functions().items():
+        if not dispatcher.signatures:
+            continue
+
+        stats = dispatcher.stats
+        report[name] = dict(
+            compile_time=timer.times.get(dispatcher, 0.0),
+            signatures=len(dispatcher.signatures),
+            cache_hits=sum(stats.cache_hits.values()),
+            cache_misses=sum(stats.cache_misses.values()),
+            cache_path=stats.cache_path if c.numba_cache else None,
+        )
+
+    return report
+
+
+def measure_cold_start():
+    """Returns the time a new process spends in its first simulation, in seconds
+
+    The time to import pooltool is not included. After a warmup, this is the time to
+    load the compiled functions from the cache.
+    """
+    code = (
+        "import time\n"
+        "import pooltool as pt\n"
+        "table = pt.PocketTable(model_name='7_foot')\n"
+        "balls = pt.get_nine_ball_rack(table, ordered=True)\n"
+        "cue = pt.Cue(cueing_ball=balls['cue'])\n"
+        "cue.aim_at_ball(balls['1'])\n"
+        "cue.strike(V0=8)\n"
+        "shot = pt.System(cue=cue, table=table, balls=balls)\n"
+        "start = time.perf_counter()\n"
+        "shot.simulate(quiet=True)\n"
+        "print(time.perf_counter() - start)\n"
+    )
+    output = subprocess.run(
+        [sys.executable, "-c", code], check=True, capture_output=True, text=True
+    )
+
+    return float(output.stdout.strip().splitlines()[-1])
+
+
+def print_report(report, run=terminal.Run()):
+    """Print a report returned by warmup, slowest functions first"""
+    for name, info in sorted(report.items(), key=lambda x: -x[1]["compile_time"]):
+        run.info(
+            name,
+            f"{info['compile_time']:.3f}s, {info['signatures']} signature(s), "
+            f"{info['cache_hits']} loaded from cache",
+        )
+
+    cache_paths = {info["cache_path"] for info in report.values()}
+    run.info("Functions", len(report), nl_before=1)
+    run.info("Compile time", f"{sum(x['compile_time'] for x in report.values()):.3f}s")
+    run.info("Cache directory", ", ".join(sorted(str(x) for x in cache_paths)))
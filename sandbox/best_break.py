@@ -1,8 +1,7 @@
 #! /usr/bin/env python
 """This illustrates how shots can be visualized multiple times in a single script"""
 
-import multiprocessing
-from collections import Counter
+from collections import Counter, deque
 from pathlib import Path
 
 import numpy as np
@@ -77,36 +76,30 @@ def process_shots(shots, stats, break_count, session_best, best_break, interface
     return stats, break_count, session_best, best_break
 
 
-def worker(output_queue):
-    while True:
-        # setup table, cue, and cue ball
-        table = pt.PocketTable(model_name="7_foot")
-        balls = pt.get_nine_ball_rack(
-            table, spacing_factor=spacing_factor, ordered=True
-        )
-        balls["cue"].rvw[0] = get_cue_pos(balls["cue"], table)
-        cue = pt.Cue(cueing_ball=balls["cue"])
-
-        # Aim at the head ball then strike the cue ball
-        cue.aim_at_ball(balls["1"])
-        cue.strike(V0=8)
+def simulate_break(seed):
+    np.random.seed(seed)
 
-        # Evolve the shot
-        shot = pt.System(cue=cue, table=table, balls=balls)
-        try:
-            shot.simulate(continuize=False, quiet=True)
-        except Exception as e:
-            continue
+    # setup table, cue, and cue ball. Workers never render, so physics-only
+    # objects are used
+    table = pt.PhysicsPocketTable(model_name="7_foot")
+    balls = pt.get_nine_ball_rack(
+        table,
+        spacing_factor=spacing_factor,
+        ordered=True,
+        ball_class=pt.PhysicsBall,
+    )
+    balls["cue"].rvw[0] = get_cue_pos(balls["cue"], table)
+    cue = pt.PhysicsCue(cueing_ball=balls["cue"])
 
-        if len(shot.events.filter_ball(balls["cue"]).filter_type("ball-pocket")):
-            # Cue ball was potted. Illegal shot
-            output_queue.put(shot.as_dict())
-            continue
+    # Aim at the head ball then strike the cue ball
+    cue.aim_at_ball(balls["1"])
+    cue.strike(V0=8)
 
-        output_queue.put(shot.as_dict())
+    # Evolve the shot
+    shot = pt.System(cue=cue, table=table, balls=balls)
+    shot.simulate(continuize=False, quiet=True)
 
-    # Code never reaches here because worker is terminated by main thread
-    return
+    return shot.as_dict()
 
 
 def print_stats(stats, run):
@@ -144,19 +137,22 @@ def main(args):
     buffer_size = 200
     queue_size = args.threads * 5
 
-    manager = multiprocessing.Manager()
-    output_queue = manager.Queue(queue_size)
-
-    processes = []
-    for _ in range(args.threads):
-        processes.append(multiprocessing.Process(target=worker, args=(output_queue,)))
-
-    for proc in processes:
-        proc.start()
+    # The workers are forked from a process that has already imported pooltool and
+    # loaded the compiled physics functions
+    pool = pt.WorkerPool(processes=args.threads, max_tasks=10000)
+    seeds = iter(np.random.SeedSequence().generate_state(2**20))
+    futures = deque(pool.submit(simulate_break, next(seeds)) for _ in range(queue_size))
 
     while True:
         try:
-            shot = output_queue.get()
+            future = futures.popleft()
+            futures.append(pool.submit(simulate_break, next(seeds)))
+
+            try:
+                shot = future.result()
+            except pt.error.SimulateError:
+                continue
+
             shots.append(shot)
 
             if buffer_size > 0 and len(shots) % buffer_size == 0:
@@ -171,13 +167,10 @@ def main(args):
             break
 
         except Exception as worker_error:
-            for proc in processes:
-                proc.terminate()
-            run.info_single("Thread interrupted. Ending...", nl_before=1, nl_after=1)
+            run.info_single("Worker interrupted. Ending...", nl_before=1, nl_after=1)
             break
 
-    for proc in processes:
-        proc.terminate()
+    pool.terminate()
 
     shots = []
 
@@ -7,6 +7,7 @@ setup(
     version="0.1",
     packages=find_packages(),
     scripts=["run_pooltool"],
+    entry_points={"console_scripts": ["pooltool=pooltool.cli:main"]},
     author_email="kiefl.evan@gmail.com",
     author="Evan Kiefl",
     url="https://github.com/ekiefl/pooltool",